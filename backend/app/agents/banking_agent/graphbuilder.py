@@ -1,7 +1,7 @@
 from langgraph.graph import START, StateGraph, END
 from langgraph.prebuilt import ToolNode, tools_condition
-from langgraph.checkpoint.memory import MemorySaver
 
+from app.infra.checkpointer import build_memory_checkpointer
 from .state import BankingState
 from .nodes import BankingNode
 
@@ -11,16 +11,19 @@ class BankingAgentGraphBuilder:
     This class builds the graph used to execute banking queries based on the user's query.
     """
 
-    def __init__(self, llm, tools):
+    def __init__(self, llm, tools, checkpointer=None, summarizer_llm=None):
         self.llm = llm
+        self.summarizer_llm = summarizer_llm
         self.tools = tools
+        # Falls back to the bounded in-process tier when no backend is injected.
+        self.checkpointer = checkpointer
         self.graph = StateGraph(BankingState)
 
     def build_graph(self):
         """
         Builds the graph used to execute banking queries based on the user's query.
         """
-        banking_node = BankingNode(self.llm, self.tools)
+        banking_node = BankingNode(self.llm, self.tools, self.summarizer_llm)
 
         # ToolNode needs access to all tools the LLM can call.
         tool_node = ToolNode(self.tools, handle_tool_errors=True)
@@ -45,4 +48,5 @@ class BankingAgentGraphBuilder:
         )
         self.graph.add_edge("tools", "answer_user_query")
 
-        return self.graph.compile(checkpointer=MemorySaver())
\ No newline at end of file
+        checkpointer = self.checkpointer if self.checkpointer is not None else build_memory_checkpointer()
+        return self.graph.compile(checkpointer=checkpointer)
@@ -1,10 +1,26 @@
+import asyncio
 import json
-from typing import List, Any
+import logging
+import time
+from typing import List, Any, Optional
 
 from .state import BankingState, SummarizedMessages
-from app.routes.utils import get_app_logger, get_error_logger, log_node_entry
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, ToolMessage
-from .prompts import MESSAGE_SUMMARY_PROMPT, EXECUTE_QUERY_PROMPT
+from app.routes.utils import get_app_logger, get_error_logger, log_node_entry, preview
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, ToolMessage, RemoveMessage
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+from langchain_core.runnables import RunnableConfig
+from app.agents.history import dumps_compact, fold_into_digest, project_messages, split_recent_window
+from app.core.config import settings
+from app.core.metrics import AGENT_BUDGET_EXHAUSTED, AGENT_TOOL_ITERATIONS, time_stage
+from app.core.prompt_cache import assemble_prompt
+from app.infra.mcp_supabase import get_schema_digest
+from .prompts import (
+    MESSAGE_SUMMARY_PROMPT,
+    EXECUTE_QUERY_PROMPT,
+    SCHEMA_DIGEST_PROMPT,
+    TOOL_BUDGET_EXHAUSTED_PROMPT,
+    TOOL_BUDGET_TIMEOUT_MESSAGE,
+)
 
 
 def serialize_summarized_history(summarized_conversation_history: list[SummarizedMessages]) -> str:
@@ -14,67 +30,159 @@ def serialize_summarized_history(summarized_conversation_history: list[Summarize
     )
 
 
+def exhausted_tool_budget(tool_iterations: int, turn_tokens: int, turn_started_at: float) -> Optional[str]:
+    """Name of the per-turn limit that has run out ("time", "iterations", "tokens"), or None."""
+    if settings.agent_turn_timeout_seconds and time.time() - turn_started_at >= settings.agent_turn_timeout_seconds:
+        return "time"
+    if settings.agent_max_tool_iterations and tool_iterations >= settings.agent_max_tool_iterations:
+        return "iterations"
+    if settings.agent_turn_max_tokens and turn_tokens >= settings.agent_turn_max_tokens:
+        return "tokens"
+    return None
+
+
+def current_turn_messages(messages: List[Any], tool_iterations: int) -> List[Any]:
+    """
+    The trailing tool loop of the current turn: at most tool_iterations
+    AI tool-call messages, each followed by its tool results.
+    """
+    start = len(messages)
+    rounds = 0
+    for index in range(len(messages) - 1, -1, -1):
+        message = messages[index]
+        if rounds >= tool_iterations:
+            break
+        if isinstance(message, AIMessage) and message.tool_calls:
+            rounds += 1
+        elif not isinstance(message, ToolMessage):
+            break
+        start = index
+    # Never start on tool results whose tool call was cut off.
+    while start < len(messages) and isinstance(messages[start], ToolMessage):
+        start += 1
+    return list(messages[start:])
+
+
+def response_tokens(response: Any) -> int:
+    usage = getattr(response, "usage_metadata", None) or {}
+    return int(usage.get("total_tokens") or 0)
+
+
 class BankingNode:
 
-    def __init__(self, llm, tools):
+    def __init__(self, llm, tools, summarizer_llm=None):
         """
-        Initialize the HR_Node with an LLM and tools.
+        Initialize the HR_Node with an LLM and tools. The summarizer can use a
+        separate (smaller) model; it defaults to the main one.
         """
         self.llm = llm
+        self.summarizer_llm = summarizer_llm if summarizer_llm is not None else llm
 
         # MCP tools (e.g., execute_sql, list_tables) passed in from app/graphbuilder
         self.tools = tools
         
-        # Bind both MCP tools to the LLM for the main execute node
-        self.llm_with_tools = llm.bind_tools(self.tools)
+        # Bind both MCP tools to the LLM for the main execute node. Sorted so
+        # the tool schemas, the start of every cached prompt, never reorder.
+        self.llm_with_tools = llm.bind_tools(sorted(self.tools, key=lambda tool: tool.name))
 
 
     
     
-    def summarize_conversation_messages(self, state: BankingState) -> BankingState:
+    async def summarize_conversation_messages(self, state: BankingState) -> BankingState:
         logger = get_app_logger()
         error_logger = get_error_logger()
         log_node_entry(logger, "banking_node", "summarize_conversation_messages")
 
         conversation_messages = state['raw_conversation_history']
+        previous_summary = list(state.get('summarized_conversation_history') or [])
+        summarized_until = state.get('summarized_until') or ""
+        history_digest = state.get('history_digest') or ""
+
+        # Only compress messages newer than what the checkpoint already holds.
+        new_messages = project_messages([
+            m for m in conversation_messages
+            if (m.get("created_at") or "") > summarized_until
+        ])
         logger.info(
-            "banking_node:summarize start messages_count=%s",
+            "banking_node:summarize start messages_count=%s new_count=%s cached_count=%s",
             len(conversation_messages),
+            len(new_messages),
+            len(previous_summary),
+        )
+
+        if not new_messages:
+            return {
+                'summarized_conversation_history': previous_summary
+            }
+
+        # A large backlog (e.g. the first turn of an old thread) is not sent to
+        # the LLM in full: anything outside the recent window is only digested.
+        backlog, fresh_messages = split_recent_window(
+            new_messages,
+            settings.history_token_budget,
+            settings.history_max_messages,
         )
 
-        llm_with_structured_output = self.llm.with_structured_output(
+        llm_with_structured_output = self.summarizer_llm.with_structured_output(
             SummarizedMessages,
             method="json_schema",
         )
 
-        messages=[
-            SystemMessage(content=MESSAGE_SUMMARY_PROMPT),
-            HumanMessage(content=json.dumps(conversation_messages))
-        ]
+        messages = assemble_prompt(
+            [SystemMessage(content=MESSAGE_SUMMARY_PROMPT)],
+            dynamic=[HumanMessage(content=dumps_compact(fresh_messages))],
+        )
 
         try:
-            response = llm_with_structured_output.invoke(messages)
+            with time_stage("agent.summarize_llm"):
+                response = await llm_with_structured_output.ainvoke(messages)
         except Exception as exc:
             error_logger.exception("banking_node:summarize error %s", exc)
             raise
 
         logger.info(
-            "banking_node:summarize done summarized_count=%s",
+            "banking_node:summarize done summarized_count=%s backlog_count=%s",
             len(response.messages),
+            len(backlog),
         )
-        logger.info(
+        logger.debug(
             "banking_node:summarize preview=%s",
-            json.dumps([m.model_dump() for m in response.messages])[:500],
+            preview(response.messages),
         )
+
+        # Keep a recent window of summaries verbatim; fold the rest, oldest
+        # first, into the bounded plain-text digest.
+        fresh_summary = list(response.messages)
+        older, kept = split_recent_window(
+            previous_summary + fresh_summary,
+            settings.history_token_budget,
+            settings.history_max_messages,
+        )
+        older_previous = older[:len(previous_summary)]
+        older_fresh = older[len(previous_summary):]
+        for folded in (older_previous, backlog, older_fresh):
+            if folded:
+                history_digest = fold_into_digest(
+                    history_digest, folded, settings.history_digest_token_budget
+                )
+
         return {
-            'summarized_conversation_history': response.messages
+            'summarized_conversation_history': kept,
+            'summarized_until': max(m.get("created_at") or "" for m in new_messages),
+            'history_digest': history_digest,
         }
 
 
-    async def answer_user_query(self, state: BankingState) -> BankingState:
+    async def answer_user_query(self, state: BankingState, config: RunnableConfig) -> BankingState:
         logger = get_app_logger()
         error_logger = get_error_logger()
         log_node_entry(logger, "banking_node", "answer_user_query")
+
+        # In speculative mode the graph starts before routing has finished;
+        # hold the answer until the router confirms the AI should reply.
+        route_gate = (config.get("configurable") or {}).get("route_gate")
+        if route_gate is not None:
+            await route_gate
         user_query = state['user_query']
         summarized_conversation_history = state['summarized_conversation_history']
         customer_id = state['customer_id']
@@ -83,25 +191,78 @@ class BankingNode:
         serialized_summary = serialize_summarized_history(summarized_conversation_history)
 
         human_content = f"User query: {user_query}\nCustomer ID: {customer_id}\nSummarized conversation history: {serialized_summary}"
+        history_digest = state.get('history_digest')
+        if history_digest:
+            human_content += f"\nEarlier conversation (condensed):\n{history_digest}"
+
+        # Inline the cached schema so the model can skip a list_tables round trip.
+        system_prompt = EXECUTE_QUERY_PROMPT
+        schema_digest = await get_schema_digest()
+        if schema_digest:
+            system_prompt += SCHEMA_DIGEST_PROMPT.format(schema_digest=schema_digest)
 
-        messages=[
-            SystemMessage(content=EXECUTE_QUERY_PROMPT),
-            *state['messages'],
-            HumanMessage(content=human_content),
-        ]
+        # Per-turn tool-loop budget; the clock starts at the first answer step.
+        tool_iterations = state.get('tool_iterations') or 0
+        turn_tokens = state.get('turn_tokens') or 0
+        turn_started_at = state.get('turn_started_at') or time.time()
+        exhausted = exhausted_tool_budget(tool_iterations, turn_tokens, turn_started_at)
+
+        # Static system prompt, then the query with the summary, then this
+        # turn's tool loop. The query and summary are fixed for the turn and
+        # the loop is append-only, so each step's prompt starts with the whole
+        # previous prompt (a cached prefix), and the conversation always opens
+        # with a user turn. Earlier turns reach the model only through the
+        # summary and digest.
+        messages = assemble_prompt(
+            [SystemMessage(content=system_prompt)],
+            [HumanMessage(content=human_content), *current_turn_messages(state['messages'], tool_iterations)],
+        )
 
         logger.info(
-            "banking_node:answer start customer_id=%s query=%s",
+            "banking_node:answer start customer_id=%s query=%s tool_iterations=%s",
             customer_id,
             user_query,
+            tool_iterations,
         )
         try:
-            response = await self.llm_with_tools.ainvoke(messages)
+            if exhausted == "time":
+                response = AIMessage(content=TOOL_BUDGET_TIMEOUT_MESSAGE)
+            elif exhausted:
+                # Tools stay bound (some providers reject tool results without
+                # tool definitions) but any further calls are dropped.
+                messages.append(SystemMessage(content=TOOL_BUDGET_EXHAUSTED_PROMPT))
+                with time_stage("agent.answer_llm"):
+                    response = await self.llm_with_tools.ainvoke(messages)
+                if getattr(response, "tool_calls", None):
+                    response = AIMessage(
+                        content=response.content or TOOL_BUDGET_TIMEOUT_MESSAGE,
+                        usage_metadata=getattr(response, "usage_metadata", None),
+                    )
+            else:
+                remaining = None
+                if settings.agent_turn_timeout_seconds:
+                    remaining = settings.agent_turn_timeout_seconds - (time.time() - turn_started_at)
+                with time_stage("agent.answer_llm"):
+                    response = await asyncio.wait_for(self.llm_with_tools.ainvoke(messages), remaining)
+        except asyncio.TimeoutError:
+            exhausted = "time"
+            response = AIMessage(content=TOOL_BUDGET_TIMEOUT_MESSAGE)
         except Exception as exc:
             error_logger.exception("banking_node:answer error %s", exc)
             raise
 
         tool_calls = getattr(response, "tool_calls", None)
+        if exhausted:
+            AGENT_BUDGET_EXHAUSTED.inc(exhausted)
+            logger.warning(
+                "banking_node:answer tool budget exhausted reason=%s tool_iterations=%s turn_tokens=%s elapsed=%.1fs",
+                exhausted,
+                tool_iterations,
+                turn_tokens,
+                time.time() - turn_started_at,
+            )
+        if not tool_calls:
+            AGENT_TOOL_ITERATIONS.observe(tool_iterations)
         logger.info(
             "banking_node:answer done has_tool_calls=%s response_length=%s",
             bool(tool_calls),
@@ -109,33 +270,38 @@ class BankingNode:
         )
         if tool_calls:
             for idx, tool_call in enumerate(tool_calls, 1):
-                # Truncate args if they're too long
+                # Args are rendered (and truncated) only if the line is emitted
                 args = tool_call.get("args", {})
-                args_str = json.dumps(args) if isinstance(args, dict) else str(args)
-                args_preview = args_str[:500] if len(args_str) > 500 else args_str
                 logger.info(
                     "banking_node:answer tool_call_%s name=%s args=%s",
                     idx,
                     tool_call.get("name"),
-                    args_preview,
+                    preview(args, as_json=isinstance(args, dict)),
                 )
 
-        tool_messages = [
-            msg for msg in state.get("messages", []) if isinstance(msg, ToolMessage)
-        ]
-        for idx, tool_msg in enumerate(tool_messages, 1):
-            # Convert content to string and truncate to 500 chars
-            content_str = str(tool_msg.content) if tool_msg.content else ""
-            content_preview = content_str[:500] if len(content_str) > 500 else content_str
-            logger.info(
-                "banking_node:answer tool_response_%s name=%s preview=%s",
-                idx,
-                getattr(tool_msg, "name", ""),
-                content_preview,
-            )
+        if logger.isEnabledFor(logging.DEBUG):
+            tool_messages = [
+                msg for msg in state.get("messages", []) if isinstance(msg, ToolMessage)
+            ]
+            for idx, tool_msg in enumerate(tool_messages, 1):
+                logger.debug(
+                    "banking_node:answer tool_response_%s name=%s preview=%s",
+                    idx,
+                    getattr(tool_msg, "name", ""),
+                    preview(tool_msg.content or ""),
+                )
 
         # Preserve tool_calls and other metadata on the response message.
+        # The first step of a turn also drops the previous turns' messages so
+        # the checkpoint does not grow with every turn.
+        new_messages = [response]
+        if not tool_iterations and state['messages']:
+            new_messages.insert(0, RemoveMessage(id=REMOVE_ALL_MESSAGES))
         return {
-            'messages': [response]
+            'messages': new_messages,
+            'tool_iterations': tool_iterations + (1 if tool_calls else 0),
+            'turn_tokens': turn_tokens + response_tokens(response),
+            'turn_started_at': turn_started_at,
+            'budget_exhausted': exhausted or "",
         }
         
\ No newline at end of file
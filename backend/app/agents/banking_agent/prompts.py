@@ -51,7 +51,8 @@ You have access to two tools:
 Your job is to answer the user's question accurately by querying the database when needed.
 
 Rules:
-1) Use list_tables first if you are unsure about table names or schemas.
+1) Use list_tables first if you are unsure about table names or schemas and they are not
+   listed under "Known database schema" below.
 2) Use execute_sql for all data retrieval. Do not guess.
 3) Always filter queries by the provided customer_id when the data is customer-specific.
 4) Select only the columns you need. Avoid SELECT *.
@@ -65,3 +66,19 @@ Rules:
 
 Return a concise, user-facing answer. Do not include SQL or tool output.
 """
+
+SCHEMA_DIGEST_PROMPT = """
+Known database schema (public, from list_tables; one table per line as schema.table(columns)):
+{schema_digest}
+"""
+
+TOOL_BUDGET_EXHAUSTED_PROMPT = """
+The tool budget for this message is used up; no more tools can be called.
+Answer the user now using only the tool results above. If they are not enough,
+say what you could not look up and suggest a concise next step.
+"""
+
+TOOL_BUDGET_TIMEOUT_MESSAGE = (
+    "Sorry, this is taking longer than expected. Please try again in a moment, "
+    "or ask me to connect you to a human agent."
+)
@@ -25,5 +25,17 @@ class BankingState(TypedDict):
     user_query: str
     raw_conversation_history: List[Dict[str, Any]]
     summarized_conversation_history: List[Message]
+    # created_at of the newest raw message already folded into the summary;
+    # persisted by the checkpointer so each turn only summarizes the delta.
+    summarized_until: str
+    # Bounded plain-text digest of history that fell out of the recent window.
+    history_digest: str
+    # Per-turn tool-loop budget, reset by the caller on every new message.
+    tool_iterations: int
+    turn_tokens: int
+    # time.time() when the first answer step of the turn started (0 = not yet).
+    turn_started_at: float
+    # Limit that cut the turn short ("time", "iterations", "tokens"), or "".
+    budget_exhausted: str
 
     
@@ -0,0 +1,127 @@
+"""
+Deterministic fast path for the human/agent handoff decision.
+
+A compiled keyword/regex lexicon scores the customer's latest message against
+the categories in HANDOFF_ROUTER_PROMPT. Only confident results are returned;
+anything ambiguous returns None so the caller falls back to the LLM router.
+"""
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Pattern, Tuple
+
+HUMAN_THRESHOLD = 1.0
+AGENT_THRESHOLD = 1.0
+
+# (pattern, weight, reason)
+_HUMAN_RULES: List[Tuple[str, float, str]] = [
+    # Explicit requests for a person. "transfer/put/connect ... to a person"
+    # is also how customers describe payments, so those verbs only count
+    # with nouns that can only mean bank staff.
+    (r"\b(talk|speak|chat)\b(\s+\w+){0,4}\s+(to|with)\s+(a\s+|an\s+|the\s+|your\s+)?"
+     r"(human|agent|person|representative|rep|manager|supervisor|someone|somebody|staff|operator)\b",
+     1.0, "explicit request for a human"),
+    (r"\b(connect|transfer|put)\b(\s+\w+){0,4}\s+(to|with)\s+(a\s+|an\s+|the\s+|your\s+)?"
+     r"(human|agent|representative|operator)s?\b",
+     1.0, "explicit request for a human"),
+    (r"\b(real|live|actual)\s+(human|person|agent|people)\b", 1.0, "explicit request for a human"),
+    (r"\b(human|customer service)\s+(agent|representative|support)\b", 1.0, "explicit request for a human"),
+    (r"\bcall\s+me\b", 1.0, "explicit request for a human"),
+    # Fraud and security
+    (r"\bfraud(ulent|ster)?\b", 1.0, "reported fraud"),
+    (r"\bunauthori[sz]ed\b", 1.0, "unauthorized activity"),
+    (r"\bscam(med|mer)?\b", 1.0, "reported scam"),
+    (r"\bphish(ing|ed)?\b", 1.0, "reported phishing"),
+    (r"\bcharge\s?back\b", 1.0, "chargeback request"),
+    (r"\b(stolen|lost|missing)\s+(my\s+|our\s+)?(debit\s+|credit\s+)?(card|wallet|phone)\b", 1.0, "lost or stolen card"),
+    (r"\b(card|wallet|phone)\s+(was|has\s+been|got|is)\s+(stolen|lost|missing)\b", 1.0, "lost or stolen card"),
+    (r"\bstole\b", 1.0, "reported theft"),
+    (r"\b(hacked|compromised|breach(ed)?)\b", 1.0, "account compromise"),
+    (r"\bidentity\s+theft\b", 1.0, "identity theft"),
+    (r"\bsuspicious\s+(activity|transaction|transactions|charge|charges|login|payment|transfer)\b", 1.0,
+     "suspicious activity"),
+    (r"\b(i\s+)?(did\s*n[o']?t|never)\s+(make|made|authori[sz]e|authori[sz]ed|recogni[sz]e)\b", 1.0,
+     "disputed transaction"),
+    (r"\bdon'?t\s+recogni[sz]e\b", 1.0, "disputed transaction"),
+    # Dissatisfaction / escalation
+    (r"\b(unacceptable|ridiculous|outrageous|disgusting|furious|useless|pathetic)\b", 1.0, "customer is dissatisfied"),
+    (r"\b(fed\s+up|sick\s+of|had\s+enough|waste\s+of\s+time)\b", 1.0, "customer is dissatisfied"),
+    (r"\b(complaint|complain|escalate|lawyer|legal\s+action|sue|ombudsman|regulator)\b", 1.0,
+     "customer is escalating"),
+    (r"\b(angry|upset|frustrated|annoyed|terrible|worst|awful)\b", 0.5, "customer is dissatisfied"),
+    (r"!!+", 0.5, "customer is dissatisfied"),
+]
+
+_AGENT_RULES: List[Tuple[str, float, str]] = [
+    (r"\b(balance|balances)\b", 1.0, "account information request"),
+    (r"\b(transactions?|statement|statements|spend|spent|spending|purchases?|payments?)\b", 1.0,
+     "account information request"),
+    (r"\b(account\s+number|iban|swift|routing\s+number|sort\s+code)\b", 1.0, "account information request"),
+    (r"\b(interest\s+rate|exchange\s+rate|fees?|limit|limits|due\s+date|minimum\s+payment)\b", 1.0,
+     "product information request"),
+    (r"\b(opening\s+hours|branch|branches|atm|atms|working\s+hours)\b", 1.0, "general information request"),
+    (r"\b(accounts?|cards?|loans?|deposits?)\b", 0.5, "account information request"),
+    (r"\b(how\s+(do|can)\s+i|what\s+is|what's|when\s+is|where\s+is|show\s+me|list)\b", 0.5, "general question"),
+    (r"^\s*(hi|hello|hey|good\s+(morning|afternoon|evening)|thanks|thank\s+you|ok|okay)\b[\s!.]*$", 1.0,
+     "greeting or acknowledgement"),
+]
+
+# Negated human requests ("no need for an agent") are left to the LLM.
+_NEGATION = re.compile(
+    r"\b(don'?t|do\s+not|no\s+need|without|not)\b(\s+\w+){0,4}\s+"
+    r"(human|agent|person|representative|someone)\b",
+    re.IGNORECASE,
+)
+
+
+def _compile(rules: List[Tuple[str, float, str]]) -> List[Tuple[Pattern[str], float, str]]:
+    return [(re.compile(pattern, re.IGNORECASE), weight, reason) for pattern, weight, reason in rules]
+
+
+_COMPILED_HUMAN = _compile(_HUMAN_RULES)
+_COMPILED_AGENT = _compile(_AGENT_RULES)
+
+
+@dataclass(frozen=True)
+class FastRouteDecision:
+    needs_human: bool
+    reason: str
+    human_score: float
+    agent_score: float
+
+
+def _score(text: str, rules: List[Tuple[Pattern[str], float, str]]) -> Tuple[float, Optional[str]]:
+    score = 0.0
+    top_reason: Optional[str] = None
+    top_weight = 0.0
+    for pattern, weight, reason in rules:
+        if pattern.search(text):
+            score += weight
+            if weight > top_weight:
+                top_weight, top_reason = weight, reason
+    return score, top_reason
+
+
+def fast_route(recent_message: str) -> Optional[FastRouteDecision]:
+    """
+    Decide human vs agent from the latest customer message alone.
+    Returns None when the lexicon is not confident, including whenever both
+    human and agent rules match: a handoff cannot be undone, so mixed
+    messages ("is my account safe from fraud?") go to the LLM.
+    """
+    text = (recent_message or "").strip()
+    if not text:
+        return None
+
+    if _NEGATION.search(text):
+        return None
+
+    human_score, human_reason = _score(text, _COMPILED_HUMAN)
+    agent_score, agent_reason = _score(text, _COMPILED_AGENT)
+
+    if human_score >= HUMAN_THRESHOLD and agent_score == 0:
+        return FastRouteDecision(True, f"fast-path: {human_reason}", human_score, agent_score)
+
+    if human_score == 0 and agent_score >= AGENT_THRESHOLD:
+        return FastRouteDecision(False, f"fast-path: {agent_reason}", human_score, agent_score)
+
+    return None
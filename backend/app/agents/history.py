@@ -0,0 +1,93 @@
+"""
+History projection for the router and agent prompts.
+
+Supabase message rows carry every column of the messages table. The prompts
+only need sender_type, content and created_at, and they only need the most
+recent part of the conversation verbatim. Helpers here project rows down to
+those fields, cut a recent window that fits a token budget, and fold older
+content into a bounded plain-text digest.
+"""
+import json
+from typing import Any, Dict, List, Sequence, Tuple
+
+PROMPT_FIELDS = ("sender_type", "content", "created_at")
+
+# Rough chars-per-token ratio; good enough for budgeting without a tokenizer.
+CHARS_PER_TOKEN = 4
+DIGEST_LINE_CHARS = 160
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def project_message(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only the fields the prompts use."""
+    return {field: row.get(field) for field in PROMPT_FIELDS}
+
+
+def project_messages(rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [project_message(row) for row in rows]
+
+
+def dumps_compact(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _item_tokens(item: Any) -> int:
+    if hasattr(item, "model_dump"):
+        item = item.model_dump()
+    return estimate_tokens(dumps_compact(item))
+
+
+def split_recent_window(
+    items: Sequence[Any],
+    token_budget: int,
+    max_items: int,
+) -> Tuple[List[Any], List[Any]]:
+    """
+    Split chronological items into (older, recent), where recent is the
+    longest suffix that fits token_budget and max_items. The newest item is
+    always kept so the prompt never loses the latest turn.
+    """
+    recent: List[Any] = []
+    used = 0
+    for item in reversed(items):
+        cost = _item_tokens(item)
+        if recent and (
+            (max_items and len(recent) >= max_items)
+            or (token_budget and used + cost > token_budget)
+        ):
+            break
+        recent.append(item)
+        used += cost
+    recent.reverse()
+    return list(items[: len(items) - len(recent)]), recent
+
+
+def fold_into_digest(existing_digest: str, older: Sequence[Any], token_budget: int) -> str:
+    """
+    Append one truncated line per folded item to the digest, then keep only
+    the newest lines that fit token_budget.
+    """
+    lines = [line for line in (existing_digest or "").splitlines() if line]
+    for item in older:
+        if hasattr(item, "model_dump"):
+            item = item.model_dump()
+        who = item.get("sender_type") or "unknown"
+        when = item.get("created_at") or item.get("timestamp") or ""
+        content = " ".join(str(item.get("content") or "").split())
+        if len(content) > DIGEST_LINE_CHARS:
+            content = content[: DIGEST_LINE_CHARS - 3] + "..."
+        lines.append(f"[{when}] {who}: {content}")
+
+    kept: List[str] = []
+    used = 0
+    for line in reversed(lines):
+        cost = estimate_tokens(line) + 1
+        if token_budget and used + cost > token_budget:
+            break
+        kept.append(line)
+        used += cost
+    kept.reverse()
+    return "\n".join(kept)
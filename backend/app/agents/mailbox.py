@@ -0,0 +1,119 @@
+"""
+Per-conversation mailbox for customer messages.
+
+Customers often send a burst of short messages. A message for a conversation
+with no run in flight starts a run right away. Runs of one conversation never
+overlap: messages that arrive during a run wait in the mailbox and form the
+next batch, which starts once no new message has arrived for
+MAILBOX_DEBOUNCE_SECONDS (capped at MAILBOX_MAX_WAIT_SECONDS from the first
+one) and is processed by a single run.
+
+Only the newest message of a batch receives the run's result; earlier
+submitters get COALESCED right away, so a burst produces one reply.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Returned to a submitter whose message was folded into a later one.
+COALESCED = object()
+
+BatchRunner = Callable[[List[Any]], Awaitable[Any]]
+
+
+class _Mailbox:
+    def __init__(self) -> None:
+        self.pending: List[Any] = []
+        self.waiter: Optional[asyncio.Future] = None
+        self.first_at = 0.0
+        self.last_at = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+
+_mailboxes: Dict[str, _Mailbox] = {}
+
+
+def debounce_delay(first_at: float, last_at: float, now: Optional[float] = None) -> float:
+    """Seconds left before a batch that started at first_at and last grew at last_at is due."""
+    now = time.monotonic() if now is None else now
+    due = last_at + settings.mailbox_debounce_seconds
+    if settings.mailbox_max_wait_seconds:
+        due = min(due, first_at + settings.mailbox_max_wait_seconds)
+    return max(0.0, due - now)
+
+
+async def wait_for_quiet(arrivals: Callable[[], Tuple[float, float]]) -> None:
+    """Sleep until a batch is due; arrivals() returns its current (first_at, last_at)."""
+    delay = debounce_delay(*arrivals())
+    while delay > 0:
+        await asyncio.sleep(delay)
+        delay = debounce_delay(*arrivals())
+
+
+async def submit(conversation_id: str, item: Any, run: BatchRunner) -> Any:
+    """
+    Add a message to the conversation's mailbox and wait for the batch it ends
+    up in. Returns run()'s result, or COALESCED when a newer message took over.
+    """
+    box = _mailboxes.get(conversation_id)
+    if box is None:
+        box = _mailboxes[conversation_id] = _Mailbox()
+
+    now = time.monotonic()
+    if not box.pending:
+        box.first_at = now
+    box.last_at = now
+    box.pending.append(item)
+
+    # The newest message answers for the whole batch.
+    if box.waiter is not None and not box.waiter.done():
+        box.waiter.set_result(COALESCED)
+    waiter = box.waiter = asyncio.get_running_loop().create_future()
+
+    if box.task is None or box.task.done():
+        box.task = asyncio.create_task(_drain(conversation_id, box, run))
+    # A disconnecting client must not cancel the run for the rest of the batch.
+    return await asyncio.shield(waiter)
+
+
+async def _drain(conversation_id: str, box: _Mailbox, run: BatchRunner) -> None:
+    try:
+        # The first batch runs at once; only messages that queued up behind a
+        # run are debounced.
+        behind_run = False
+        while box.pending:
+            if behind_run:
+                await wait_for_quiet(lambda: (box.first_at, box.last_at))
+            behind_run = True
+
+            batch, waiter = box.pending, box.waiter
+            box.pending, box.waiter = [], None
+            if len(batch) > 1:
+                logger.info("mailbox:coalesced conversation_id=%s messages=%s", conversation_id, len(batch))
+            try:
+                result = await run(batch)
+            except Exception as exc:
+                if waiter is not None and not waiter.done():
+                    waiter.set_exception(exc)
+                else:
+                    logger.warning(
+                        "mailbox:run failed conversation_id=%s %s: %s", conversation_id, type(exc).__name__, exc
+                    )
+                continue
+            if waiter is not None and not waiter.done():
+                waiter.set_result(result)
+    finally:
+        if _mailboxes.get(conversation_id) is box and not box.pending:
+            del _mailboxes[conversation_id]
+
+
+def get_mailbox_metrics() -> Dict[str, Any]:
+    return {
+        "conversations": len(_mailboxes),
+        "pending": sum(len(box.pending) for box in _mailboxes.values()),
+    }
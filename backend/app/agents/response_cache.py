@@ -0,0 +1,165 @@
+"""
+Response cache for generic, non-account-specific customer questions
+("what are your opening hours", "how does a card PIN reset work").
+
+Questions are normalized (case, punctuation, greetings and filler words) and
+matched first by exact normalized text, then by cosine similarity over word
+and character-trigram features, so rephrasings of the same question share an
+answer. The cache is shared by all customers, so questions about the asker
+("what is my name", "can I ...") are never cached: the agent may answer them
+from the conversation summary without any tool call. Answers produced with
+execute_sql are never stored either. Entries expire after
+RESPONSE_CACHE_TTL_SECONDS and the cache is bounded by
+RESPONSE_CACHE_MAX_ENTRIES.
+"""
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from app.core.cache import BoundedTTLCache
+from app.core.config import settings
+
+# Tool calls that read customer-scoped data; answers using them are never cached.
+CUSTOMER_SCOPED_TOOLS = frozenset({"execute_sql"})
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_DIGIT_RE = re.compile(r"\d")
+# Follow-ups that only make sense with the earlier conversation.
+_CONTEXT_DEPENDENT_RE = re.compile(
+    r"^\s*(and|also|so|then|what about|how about)\b"
+    r"|\b(it|that|this|these|those|them|they|same|above|previous|earlier|again)\b",
+    re.IGNORECASE,
+)
+# Questions about the customer themselves; their answers are personal even
+# when no customer-scoped tool was called.
+_FIRST_PERSON_RE = re.compile(r"\b(i|i'm|im|i've|ive|i'd|me|my|mine|myself)\b", re.IGNORECASE)
+# Greetings, politeness and function words that don't change the question.
+_FILLER_WORDS = frozenset(
+    """
+    a an the is are am was were be been do does did can could would will shall should
+    please pls kindly hi hello hey thanks thank you your yours us we our i me
+    to of for in on at with about tell know want wanted like need just any some
+    there here sir madam
+    """.split()
+)
+
+# normalized question -> (feature vector, answer)
+_cache: BoundedTTLCache[Tuple[Dict[str, float], str]] = BoundedTTLCache(
+    ttl_seconds=settings.response_cache_ttl_seconds,
+    max_entries=settings.response_cache_max_entries,
+)
+_stats = {"lookups": 0, "hits": 0, "similar_hits": 0, "stores": 0, "skipped": 0}
+
+
+def normalize_question(text: str) -> str:
+    words = _WORD_RE.findall((text or "").lower())
+    return " ".join(word for word in words if word not in _FILLER_WORDS)
+
+
+def _features(normalized: str) -> Dict[str, float]:
+    """L2-normalized bag of words plus character trigrams (robust to typos)."""
+    counts: Counter = Counter()
+    for word in normalized.split():
+        counts["w:" + word] += 1.0
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            counts["c:" + padded[i:i + 3]] += 0.5
+    norm = math.sqrt(sum(value * value for value in counts.values())) or 1.0
+    return {feature: value / norm for feature, value in counts.items()}
+
+
+def similarity(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(feature, 0.0) for feature, value in a.items())
+
+
+def is_cacheable_question(text: str) -> bool:
+    """
+    Short, self-contained questions without numbers (amounts, IDs, dates)
+    that are not about the customer themselves.
+    """
+    if not settings.response_cache_enabled:
+        return False
+    if not text or len(text) > settings.response_cache_max_question_chars:
+        return False
+    if _DIGIT_RE.search(text) or _CONTEXT_DEPENDENT_RE.search(text):
+        return False
+    if _FIRST_PERSON_RE.search(text.replace("’", "'")):
+        return False
+    return len(normalize_question(text).split()) >= 2
+
+
+def turn_tool_names(messages: Iterable[Any]) -> Set[str]:
+    """
+    Names of the tools called in the latest turn of a graph run. Messages
+    accumulate across turns in the checkpoint; a turn is everything after
+    the previous AI message that issued no tool calls.
+    """
+    messages = list(messages)
+    names: Set[str] = set()
+    for message in reversed(messages[:-1]):
+        tool_calls = getattr(message, "tool_calls", None)
+        if getattr(message, "type", None) == "ai" and not tool_calls:
+            break
+        for call in tool_calls or ():
+            names.add(call.get("name") if isinstance(call, dict) else getattr(call, "name", ""))
+        if getattr(message, "type", None) == "tool":
+            names.add(getattr(message, "name", None) or "")
+    names.discard("")
+    return names
+
+
+def lookup_response(text: str) -> Optional[str]:
+    """Cached answer for an equivalent question, or None."""
+    if not is_cacheable_question(text):
+        return None
+    _stats["lookups"] += 1
+    key = normalize_question(text)
+    entry = _cache.get(key)
+    if entry is not None:
+        _stats["hits"] += 1
+        return entry[1]
+
+    features = _features(key)
+    best_key, best_score = None, settings.response_cache_similarity
+    for other_key in _cache.keys():
+        other = _cache.peek(other_key)
+        if other is None:
+            continue
+        score = similarity(features, other[0])
+        if score >= best_score:
+            best_key, best_score = other_key, score
+    if best_key is None:
+        return None
+    entry = _cache.get(best_key)  # refreshes recency and drops it if expired
+    if entry is None:
+        return None
+    _stats["similar_hits"] += 1
+    return entry[1]
+
+
+def store_response(text: str, answer: str, tool_names: Iterable[str] = (), customer_id: str = "") -> bool:
+    """
+    Cache an agent answer unless the question is not generic or the answer
+    may carry customer data. Returns True when stored.
+    """
+    if not answer or not is_cacheable_question(text):
+        return False
+    if CUSTOMER_SCOPED_TOOLS.intersection(tool_names) or (customer_id and customer_id in answer):
+        _stats["skipped"] += 1
+        return False
+    key = normalize_question(text)
+    _cache.set(key, (_features(key), answer))
+    _stats["stores"] += 1
+    return True
+
+
+def invalidate_response_cache() -> None:
+    """Drop every cached answer (e.g. after the prompt or product info changes)."""
+    _cache.clear()
+
+
+def get_response_cache_metrics() -> Dict[str, Any]:
+    return {"entries": len(_cache), **_stats}
@@ -0,0 +1,113 @@
+"""
+Agent runtime: chat model, MCP tools, checkpointer and the compiled banking
+graph, stored on app.state.
+
+With BOOT_MODE=eager the lifespan initializes it before serving. With
+BOOT_MODE=lazy the first chat request does, so /health and other light
+routes answer without waiting on MCP or graph compilation. Heavy packages
+(langgraph, MCP adapters, provider SDKs) are imported here on first use.
+"""
+import asyncio
+from contextlib import AsyncExitStack
+from typing import Any
+
+from app.routes.utils import get_app_logger, get_error_logger
+
+_init_lock = asyncio.Lock()
+
+
+def agent_runtime_ready(app: Any) -> bool:
+    return getattr(app.state, "banking_agent_graph", None) is not None
+
+
+async def ensure_agent_runtime(app: Any) -> None:
+    """Initialize the agent runtime once per process; concurrent callers wait."""
+    if agent_runtime_ready(app):
+        return
+    async with _init_lock:
+        if agent_runtime_ready(app):
+            return
+
+        from app.agents.banking_agent.graphbuilder import BankingAgentGraphBuilder
+        from app.core.llm import AGENT_TASK, ROUTER_TASK, SUMMARIZER_TASK, get_task_llm
+        from app.infra.cassette import get_cassette
+        from app.infra.checkpointer import open_checkpointer
+        from app.infra.mcp_supabase import get_mcp_tools, warm_schema_cache
+        from app.routes.utils import start_conversation_cache_sync
+
+        logger = get_app_logger()
+        logger.info("agent_runtime:init start")
+        stack = AsyncExitStack()
+        try:
+            # Single MCP server (supabase), filtered to execute_sql and list_tables
+            mcp_tools = await get_mcp_tools()
+
+            try:
+                await warm_schema_cache()
+            except Exception as exc:
+                # Non-fatal: the agent can still call list_tables itself.
+                get_error_logger().warning("MCP schema cache warm-up failed: %s", exc)
+
+            # One model chain per task (see LLM_<TASK>_MODELS), behind the
+            # cassette when CASSETTE_MODE records or replays calls
+            cassette = get_cassette()
+
+            def task_llm(task: str) -> Any:
+                if cassette is None:
+                    return get_task_llm(task)
+                return cassette.chat_model(task, None if cassette.replaying else get_task_llm(task))
+
+            agent_llm = task_llm(AGENT_TASK)
+            router_llm = task_llm(ROUTER_TASK)
+            summarizer_llm = task_llm(SUMMARIZER_TASK)
+            checkpointer = await stack.enter_async_context(open_checkpointer())
+            graph = BankingAgentGraphBuilder(
+                agent_llm, mcp_tools, checkpointer, summarizer_llm=summarizer_llm
+            ).build_graph()
+        except BaseException:
+            await stack.aclose()
+            raise
+
+        await start_conversation_cache_sync()
+
+        app.state.mcp_tools = mcp_tools
+        app.state.llm = agent_llm
+        app.state.router_llm = router_llm
+        app.state.checkpointer = checkpointer
+        app.state.agent_runtime_stack = stack
+        # Set last: its presence marks the runtime as ready.
+        app.state.banking_agent_graph = graph
+        logger.info(
+            "agent_runtime:init done agent=%s router=%s summarizer=%s",
+            agent_llm,
+            router_llm,
+            summarizer_llm,
+        )
+
+
+async def close_agent_runtime(app: Any) -> None:
+    """Close the checkpointer, conversation cache sync, MCP pool and cassette if they were opened."""
+    if not agent_runtime_ready(app):
+        return
+
+    from app.infra.cassette import close_cassette
+    from app.infra.mcp_supabase import shutdown_mcp
+    from app.routes.utils import stop_conversation_cache_sync
+
+    app.state.banking_agent_graph = None
+    try:
+        await stop_conversation_cache_sync()
+    except Exception:
+        pass
+
+    stack = getattr(app.state, "agent_runtime_stack", None)
+    if stack is not None:
+        app.state.agent_runtime_stack = None
+        await stack.aclose()
+
+    try:
+        await shutdown_mcp()
+    except Exception:
+        pass
+
+    close_cassette()
@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class BoundedTTLCache(Generic[V]):
+    """
+    Small in-process LRU cache with a per-entry TTL and two bounds:
+    max_entries and max_bytes (as measured by sizeof). A bound of 0 disables it.
+    Safe to share between the event loop and worker threads.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl_seconds: float,
+        max_entries: int = 1000,
+        max_bytes: int = 0,
+        sizeof: Callable[[Any], int] = lambda value: 0,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        # key -> (expires_at, size, value), least recently used first
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, V]]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, _, value = entry
+            if self.ttl_seconds and expires_at <= time.monotonic():
+                self._pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key: Hashable) -> Optional[V]:
+        """Like get, but without touching recency, expiry or hit counters."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[2] if entry is not None else None
+
+    def keys(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._entries)
+
+    def set(self, key: Hashable, value: V) -> None:
+        size = self._sizeof(value)
+        if self.max_bytes and size > self.max_bytes:
+            # Never let a single oversized value flush the whole cache.
+            return
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+            self._total_bytes += size
+            while self._entries and (
+                (self.max_entries and len(self._entries) > self.max_entries)
+                or (self.max_bytes and self._total_bytes > self.max_bytes)
+            ):
+                self._pop(next(iter(self._entries)))
+
+    def pop(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._pop(key)
+        return entry[2] if entry is not None else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _pop(self, key: Hashable) -> Optional[Tuple[float, int, V]]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[1]
+        return entry
@@ -1,6 +1,8 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field, AliasChoices
 from pathlib import Path
+from typing import Optional
+import os
 from dotenv import load_dotenv
 
 # Get the backend directory (parent of app/)
@@ -21,6 +23,170 @@ class Settings(BaseSettings):
         ),
     )
     cors_origins: str = Field("http://localhost:3000", alias="CORS_ORIGINS")
+    # Bearer token for the /admin endpoints (disabled while unset)
+    admin_token: Optional[str] = Field(None, alias="ADMIN_TOKEN")
+
+    # "eager": connect MCP and build the agent graph during startup.
+    # "lazy": serve immediately and initialize on the first chat request
+    # (default on Vercel, where cold starts matter).
+    boot_mode: str = Field(
+        default_factory=lambda: "lazy" if os.getenv("VERCEL") else "eager",
+        alias="BOOT_MODE",
+    )
+
+    # Chat models (see app.core.llm). LLM_PROVIDER/LLM_MODEL is the default for
+    # every task; LLM_<TASK>_MODELS overrides it with a "provider:model" chain,
+    # primary first, fallbacks after, e.g.
+    #   LLM_ROUTER_MODELS=groq:openai/gpt-oss-20b,groq:moonshotai/kimi-k2-instruct-0905
+    llm_provider: str = Field("groq", alias="LLM_PROVIDER")
+    llm_model: Optional[str] = Field(None, alias="LLM_MODEL")
+    llm_router_models: str = Field("", alias="LLM_ROUTER_MODELS")
+    llm_summarizer_models: str = Field("", alias="LLM_SUMMARIZER_MODELS")
+    llm_agent_models: str = Field("", alias="LLM_AGENT_MODELS")
+    # Per-request timeouts; a timed-out call moves on to the next fallback
+    llm_router_timeout_seconds: float = Field(10, alias="LLM_ROUTER_TIMEOUT_SECONDS")
+    llm_summarizer_timeout_seconds: float = Field(20, alias="LLM_SUMMARIZER_TIMEOUT_SECONDS")
+    llm_agent_timeout_seconds: float = Field(60, alias="LLM_AGENT_TIMEOUT_SECONDS")
+    llm_max_retries: int = Field(1, alias="LLM_MAX_RETRIES")
+    groq_api_key: Optional[str] = Field(None, alias="GROQ_API_KEY")
+    anthropic_api_key: Optional[str] = Field(
+        None,
+        validation_alias=AliasChoices("ANTHROPIC_API_KEY", "CLAUDE_API_KEY"),
+    )
+    # Mark the static prompt prefix and the history with cache_control for
+    # providers that need explicit cache breakpoints (Anthropic)
+    prompt_cache_control: bool = Field(True, alias="PROMPT_CACHE_CONTROL")
+
+    # Resolve clear-cut handoff decisions with the keyword router before the LLM
+    fast_router_enabled: bool = Field(True, alias="FAST_ROUTER_ENABLED")
+
+    # Prompt history budgets (tokens estimated as chars / 4)
+    history_token_budget: int = Field(2000, alias="HISTORY_TOKEN_BUDGET")
+    history_max_messages: int = Field(30, alias="HISTORY_MAX_MESSAGES")
+    # Messages loaded per turn for routing and the agent (newest first, server-side)
+    agent_history_messages: int = Field(50, alias="AGENT_HISTORY_MESSAGES")
+    history_digest_token_budget: int = Field(400, alias="HISTORY_DIGEST_TOKEN_BUDGET")
+    router_history_token_budget: int = Field(800, alias="ROUTER_HISTORY_TOKEN_BUDGET")
+
+    # Perform handoffs through the handoff_to_human database function (one
+    # transactional round trip). Disable to use the local multi-call stand-in.
+    handoff_rpc_enabled: bool = Field(True, alias="HANDOFF_RPC_ENABLED")
+    handoff_summary_messages: int = Field(8, alias="HANDOFF_SUMMARY_MESSAGES")
+
+    # Per-process cache of conversation rows and their recent messages.
+    # Sync mode: "realtime" (Supabase realtime, polling fallback), "poll" or "off".
+    conversation_cache_enabled: bool = Field(True, alias="CONVERSATION_CACHE_ENABLED")
+    conversation_cache_ttl_seconds: float = Field(300, alias="CONVERSATION_CACHE_TTL_SECONDS")
+    conversation_cache_max_entries: int = Field(1000, alias="CONVERSATION_CACHE_MAX_ENTRIES")
+    conversation_cache_max_mb: int = Field(64, alias="CONVERSATION_CACHE_MAX_MB")
+    conversation_cache_tail_messages: int = Field(100, alias="CONVERSATION_CACHE_TAIL_MESSAGES")
+    conversation_cache_sync: str = Field("realtime", alias="CONVERSATION_CACHE_SYNC")
+    conversation_cache_poll_interval_seconds: float = Field(
+        5, alias="CONVERSATION_CACHE_POLL_INTERVAL_SECONDS"
+    )
+
+    # Coalesce conversations.last_message/updated_at writes and flush them in
+    # the background instead of writing the row on every message (off by
+    # default on Vercel, where nothing runs once the response is sent)
+    conversation_write_behind: bool = Field(
+        default_factory=lambda: not os.getenv("VERCEL"),
+        alias="CONVERSATION_WRITE_BEHIND",
+    )
+    conversation_writer_flush_interval_seconds: float = Field(
+        0.5, alias="CONVERSATION_WRITER_FLUSH_INTERVAL_SECONDS"
+    )
+    conversation_writer_max_concurrency: int = Field(8, alias="CONVERSATION_WRITER_MAX_CONCURRENCY")
+
+    # Start history summarization concurrently with the handoff router
+    speculative_pipeline: bool = Field(True, alias="SPECULATIVE_PIPELINE")
+
+    # Accept customer messages with 202 and run the agent on an in-process
+    # worker pool; the AI reply arrives through the messages table. Needs a
+    # long-running server (not serverless functions that stop after the response).
+    messages_async_mode: bool = Field(False, alias="MESSAGES_ASYNC_MODE")
+    agent_workers: int = Field(4, alias="AGENT_WORKERS")
+    # Queued messages beyond this are rejected with 503 (0 = unbounded)
+    agent_queue_max_pending: int = Field(1000, alias="AGENT_QUEUE_MAX_PENDING")
+    agent_queue_drain_seconds: float = Field(30, alias="AGENT_QUEUE_DRAIN_SECONDS")
+
+    # Coalesce customer messages that arrive while a run of their conversation
+    # is in flight into one follow-up run: wait until the conversation has been
+    # quiet this long (0 = no wait, runs still serialized), but never longer
+    # than the max wait after the first of them. A message for an idle
+    # conversation starts its run immediately.
+    mailbox_debounce_seconds: float = Field(0.5, alias="MAILBOX_DEBOUNCE_SECONDS")
+    mailbox_max_wait_seconds: float = Field(2.0, alias="MAILBOX_MAX_WAIT_SECONDS")
+
+    # Per-message budget for the answer_user_query <-> tools loop (0 disables
+    # a limit). When it runs out the agent answers with what it has.
+    agent_max_tool_iterations: int = Field(6, alias="AGENT_MAX_TOOL_ITERATIONS")
+    agent_turn_timeout_seconds: float = Field(45, alias="AGENT_TURN_TIMEOUT_SECONDS")
+    agent_turn_max_tokens: int = Field(30000, alias="AGENT_TURN_MAX_TOKENS")
+
+    # Reuse agent answers for repeated generic questions (see
+    # app.agents.response_cache); answers that used execute_sql are never cached
+    response_cache_enabled: bool = Field(True, alias="RESPONSE_CACHE_ENABLED")
+    response_cache_ttl_seconds: float = Field(3600, alias="RESPONSE_CACHE_TTL_SECONDS")
+    response_cache_max_entries: int = Field(500, alias="RESPONSE_CACHE_MAX_ENTRIES")
+    # Cosine similarity (0-1) a rephrased question needs to reuse an answer
+    response_cache_similarity: float = Field(0.9, alias="RESPONSE_CACHE_SIMILARITY")
+    response_cache_max_question_chars: int = Field(200, alias="RESPONSE_CACHE_MAX_QUESTION_CHARS")
+
+    # Logging: root level and line format ("text" or "json"). Message/state
+    # previews are logged at DEBUG and only rendered when DEBUG is enabled.
+    log_level: str = Field("INFO", alias="LOG_LEVEL")
+    log_format: str = Field("text", alias="LOG_FORMAT")
+
+    # Also emit stage timings as OpenTelemetry spans/histograms (needs
+    # opentelemetry-api; exporters come from the OpenTelemetry SDK/distro)
+    otel_enabled: bool = Field(False, alias="OTEL_ENABLED")
+
+    # Shared HTTP connection pool used by the async Supabase client
+    supabase_max_connections: int = Field(100, alias="SUPABASE_MAX_CONNECTIONS")
+    supabase_max_keepalive_connections: int = Field(
+        20, alias="SUPABASE_MAX_KEEPALIVE_CONNECTIONS"
+    )
+    supabase_timeout_seconds: float = Field(10.0, alias="SUPABASE_TIMEOUT_SECONDS")
+
+    # Record or replay chat model and MCP tool calls (see app.infra.cassette):
+    # "off", "record" or "replay". Replayed calls sleep their recorded latency
+    # times CASSETTE_TIME_SCALE (1 = original timing, 0 = instant).
+    cassette_mode: str = Field("off", alias="CASSETTE_MODE")
+    cassette_path: str = Field("cassettes/agent.jsonl.gz", alias="CASSETTE_PATH")
+    cassette_time_scale: float = Field(1.0, alias="CASSETTE_TIME_SCALE")
+
+    # MCP server definitions (defaults to app/infra/mcp.json)
+    mcp_config_path: Optional[str] = Field(None, alias="MCP_CONFIG_PATH")
+
+    # MCP session pool
+    mcp_pool_size: int = Field(4, alias="MCP_POOL_SIZE")
+    mcp_pool_checkout_timeout_seconds: float = Field(30.0, alias="MCP_POOL_CHECKOUT_TIMEOUT_SECONDS")
+    mcp_pool_ping_interval_seconds: float = Field(30.0, alias="MCP_POOL_PING_INTERVAL_SECONDS")
+    mcp_pool_max_backoff_seconds: float = Field(30.0, alias="MCP_POOL_MAX_BACKOFF_SECONDS")
+
+    # How long list_tables results (and the prompt schema digest) are reused
+    mcp_schema_cache_ttl_seconds: int = Field(900, alias="MCP_SCHEMA_CACHE_TTL_SECONDS")
+
+    # Short-lived, per-customer cache of read-only execute_sql results
+    mcp_sql_cache_ttl_seconds: int = Field(60, alias="MCP_SQL_CACHE_TTL_SECONDS")
+    mcp_sql_cache_max_entries: int = Field(2000, alias="MCP_SQL_CACHE_MAX_ENTRIES")
+    mcp_sql_cache_max_mb: int = Field(32, alias="MCP_SQL_CACHE_MAX_MB")
+
+    # LangGraph checkpointer: "memory" | "sqlite" | "postgres"
+    checkpointer_backend: str = Field("memory", alias="CHECKPOINTER_BACKEND")
+    checkpointer_sqlite_path: str = Field(
+        str(BACKEND_DIR / "checkpoints.sqlite"), alias="CHECKPOINTER_SQLITE_PATH"
+    )
+    checkpointer_postgres_url: str | None = Field(
+        None,
+        validation_alias=AliasChoices("CHECKPOINTER_POSTGRES_URL", "DATABASE_URL"),
+    )
+    checkpointer_ttl_seconds: int = Field(86400, alias="CHECKPOINTER_TTL_SECONDS")
+    checkpointer_max_threads: int = Field(5000, alias="CHECKPOINTER_MAX_THREADS")
+    checkpointer_max_memory_mb: int = Field(256, alias="CHECKPOINTER_MAX_MEMORY_MB")
+    checkpointer_sweep_interval_seconds: int = Field(
+        600, alias="CHECKPOINTER_SWEEP_INTERVAL_SECONDS"
+    )
 
     @property
     def cors_origin_list(self) -> list[str]:
@@ -0,0 +1,182 @@
+"""
+Chat model registry.
+
+Each task (router, summarizer, agent) gets its own model chain from Settings:
+LLM_<TASK>_MODELS is a comma-separated list of "provider:model" entries, the
+first being the primary and the rest fallbacks tried in order when a call
+fails or times out (LLM_<TASK>_TIMEOUT_SECONDS). An empty chain falls back to
+LLM_PROVIDER/LLM_MODEL. Provider packages are imported only when a model from
+them is built, and new providers can be added with register_provider().
+"""
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+ROUTER_TASK = "router"
+SUMMARIZER_TASK = "summarizer"
+AGENT_TASK = "agent"
+TASKS = (ROUTER_TASK, SUMMARIZER_TASK, AGENT_TASK)
+
+# Default model per provider when a spec or LLM_MODEL names none
+DEFAULT_MODELS = {
+    "groq": "moonshotai/kimi-k2-instruct-0905",
+    "anthropic": "claude-sonnet-4-5-20250929",
+}
+
+# provider -> factory(model, timeout_seconds, max_retries) -> chat model
+ProviderFactory = Callable[[str, float, int], Any]
+
+
+def _groq(model: str, timeout: float, max_retries: int) -> Any:
+    from langchain_groq import ChatGroq
+
+    return ChatGroq(
+        model=model,
+        api_key=settings.groq_api_key,
+        timeout=timeout,
+        max_retries=max_retries,
+    )
+
+
+def _anthropic(model: str, timeout: float, max_retries: int) -> Any:
+    from langchain_anthropic import ChatAnthropic
+
+    return ChatAnthropic(
+        model=model,
+        api_key=settings.anthropic_api_key,
+        timeout=timeout,
+        max_retries=max_retries,
+    )
+
+
+PROVIDERS: Dict[str, ProviderFactory] = {
+    "groq": _groq,
+    "anthropic": _anthropic,
+}
+
+_task_llms: Dict[str, "ChatModelChain"] = {}
+
+
+def register_provider(name: str, factory: ProviderFactory, default_model: Optional[str] = None) -> None:
+    PROVIDERS[name.lower()] = factory
+    if default_model:
+        DEFAULT_MODELS[name.lower()] = default_model
+
+
+def parse_model_chain(spec: str) -> List[Tuple[str, str]]:
+    """'groq:model-a, anthropic:model-b' -> [("groq", "model-a"), ("anthropic", "model-b")]."""
+    chain: List[Tuple[str, str]] = []
+    for entry in (spec or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        provider, sep, model = entry.partition(":")
+        if not sep:
+            # Bare model name: use the default provider.
+            provider, model = settings.llm_provider, entry
+        provider = provider.strip().lower()
+        if provider not in PROVIDERS:
+            raise ValueError(f"Unknown LLM provider in {entry!r}: {provider}")
+        chain.append((provider, model.strip() or DEFAULT_MODELS.get(provider, "")))
+    return chain
+
+
+def build_llm(provider: str, model: Optional[str] = None, timeout: float = 60, max_retries: int = 2) -> Any:
+    """Construct a chat model; the provider package is imported here, not at startup."""
+    provider = provider.lower()
+    factory = PROVIDERS.get(provider)
+    if factory is None:
+        raise ValueError(f"Unknown LLM provider: {provider}")
+    return factory(model or DEFAULT_MODELS.get(provider, ""), timeout, max_retries)
+
+
+class ChatModelChain:
+    """
+    A primary chat model plus ordered fallbacks. bind_tools and
+    with_structured_output are applied to every model before the fallbacks
+    are attached, so callers use it like a single chat model. Every call
+    goes through app.core.prompt_cache (cache breakpoints, token accounting).
+    """
+
+    def __init__(self, task: str, models: Sequence[Any], labels: Sequence[str]) -> None:
+        if not models:
+            raise ValueError(f"No models configured for LLM task {task!r}")
+        self.task = task
+        self.models = list(models)
+        self.labels = list(labels)
+        self.providers = [label.partition(":")[0] for label in self.labels]
+
+        from app.core.prompt_cache import PromptCacheUsage
+
+        # Local callbacks on the model itself; they add to, rather than
+        # replace, the callbacks of the calling graph (token streaming).
+        usage = PromptCacheUsage(task)
+        for model in self.models:
+            if hasattr(model, "callbacks"):
+                model.callbacks = [*(model.callbacks or []), usage]
+
+    @property
+    def primary(self) -> Any:
+        return self.models[0]
+
+    def _chain(self, runnables: List[Any]) -> Any:
+        from app.core.prompt_cache import prompt_preparer
+
+        # Cache breakpoints are applied per model, so fallbacks on another
+        # provider get messages in the form that provider accepts.
+        runnables = [prompt_preparer(provider) | runnable for provider, runnable in zip(self.providers, runnables)]
+        if len(runnables) == 1:
+            return runnables[0]
+        return runnables[0].with_fallbacks(runnables[1:])
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> Any:
+        return self._chain([model.bind_tools(tools, **kwargs) for model in self.models])
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> Any:
+        return self._chain([model.with_structured_output(schema, **kwargs) for model in self.models])
+
+    def runnable(self) -> Any:
+        return self._chain(self.models)
+
+    async def ainvoke(self, *args: Any, **kwargs: Any) -> Any:
+        return await self.runnable().ainvoke(*args, **kwargs)
+
+    def invoke(self, *args: Any, **kwargs: Any) -> Any:
+        return self.runnable().invoke(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"ChatModelChain(task={self.task!r}, models={self.labels!r})"
+
+
+def task_model_spec(task: str) -> str:
+    spec = {
+        ROUTER_TASK: settings.llm_router_models,
+        SUMMARIZER_TASK: settings.llm_summarizer_models,
+        AGENT_TASK: settings.llm_agent_models,
+    }[task]
+    if spec and spec.strip():
+        return spec
+    return f"{settings.llm_provider}:{settings.llm_model or DEFAULT_MODELS.get(settings.llm_provider.lower(), '')}"
+
+
+def task_timeout(task: str) -> float:
+    return {
+        ROUTER_TASK: settings.llm_router_timeout_seconds,
+        SUMMARIZER_TASK: settings.llm_summarizer_timeout_seconds,
+        AGENT_TASK: settings.llm_agent_timeout_seconds,
+    }[task]
+
+
+def get_task_llm(task: str) -> ChatModelChain:
+    """Process-wide model chain for a task, built on first use."""
+    chain = _task_llms.get(task)
+    if chain is None:
+        timeout = task_timeout(task)
+        entries = parse_model_chain(task_model_spec(task))
+        chain = ChatModelChain(
+            task,
+            [build_llm(provider, model, timeout, settings.llm_max_retries) for provider, model in entries],
+            [f"{provider}:{model}" for provider, model in entries],
+        )
+        _task_llms[task] = chain
+    return chain
@@ -0,0 +1,228 @@
+"""
+In-process metrics for the /messages pipeline.
+
+Stage timings are recorded with time_stage() into Prometheus-style histograms
+and rendered in the text exposition format by render_prometheus() (served at
+GET /metrics). When OTEL_ENABLED is set and opentelemetry-api is installed,
+each stage is also emitted as a span and an OpenTelemetry histogram; the
+exporter itself is configured by the OpenTelemetry SDK/distro (for example by
+running under `opentelemetry-instrument`).
+"""
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs: Sequence[Tuple[str, Any]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed label set."""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str],
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts, sum, count)
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        key = tuple(str(v) for v in labelvalues)
+        with self._lock:
+            counts, total, count = self._series.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._series[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = list(zip(self.labelnames, key))
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {bucket_count}"
+                )
+            lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {repr(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with a fixed label set."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        key = tuple(str(v) for v in labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        with self._lock:
+            return self._values.get(tuple(str(v) for v in labelvalues), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {_format_value(value)}")
+        return lines
+
+
+_REGISTRY: List[Any] = []
+
+STAGE_SECONDS = Histogram(
+    "support_stage_duration_seconds",
+    "Duration of /messages pipeline stages (DB, router, LLM, MCP tool calls).",
+    ("stage", "outcome"),
+)
+
+AGENT_TOOL_ITERATIONS = Histogram(
+    "support_agent_tool_iterations",
+    "Tool-loop iterations used per answered message.",
+    (),
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12),
+)
+
+AGENT_BUDGET_EXHAUSTED = Counter(
+    "support_agent_budget_exhausted_total",
+    "Messages whose tool-loop budget ran out, by exhausted limit.",
+    ("reason",),
+)
+
+LLM_INPUT_TOKENS = Counter(
+    "support_llm_input_tokens_total",
+    "Chat model input tokens by task and prompt cache status (cached, cache_write, uncached).",
+    ("task", "cache"),
+)
+
+# Callbacks receiving every raw stage sample as (stage, outcome, seconds),
+# e.g. for exact percentiles in benchmarks.
+_stage_observers: List[Callable[[str, str, float], None]] = []
+
+# OpenTelemetry handles, resolved lazily on first use.
+_otel_tracer: Any = None
+_otel_histogram: Any = None
+_otel_checked = False
+
+
+def _otel() -> Tuple[Any, Any]:
+    global _otel_tracer, _otel_histogram, _otel_checked
+    if not _otel_checked:
+        _otel_checked = True
+        if settings.otel_enabled:
+            try:
+                from opentelemetry import metrics as otel_metrics, trace
+            except ImportError:
+                logger.warning("OTEL_ENABLED is set but opentelemetry-api is not installed")
+            else:
+                _otel_tracer = trace.get_tracer("support-api")
+                _otel_histogram = otel_metrics.get_meter("support-api").create_histogram(
+                    "support.stage.duration",
+                    unit="s",
+                    description="Duration of /messages pipeline stages",
+                )
+    return _otel_tracer, _otel_histogram
+
+
+@contextmanager
+def time_stage(stage: str, **attributes: Any) -> Iterator[None]:
+    """
+    Time a pipeline stage. Recorded with outcome "ok", "error" or "cancelled";
+    extra attributes only go to the OpenTelemetry span.
+    """
+    tracer, otel_histogram = _otel()
+    span = tracer.start_as_current_span(stage, attributes=attributes or None) if tracer else nullcontext()
+    with span:
+        outcome = "ok"
+        started = time.perf_counter()
+        try:
+            yield
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            STAGE_SECONDS.observe(elapsed, stage, outcome)
+            for observer in _stage_observers:
+                observer(stage, outcome, elapsed)
+            if otel_histogram is not None:
+                otel_histogram.record(elapsed, {"stage": stage, "outcome": outcome})
+
+
+def add_stage_observer(observer: Callable[[str, str, float], None]) -> None:
+    _stage_observers.append(observer)
+
+
+def remove_stage_observer(observer: Callable[[str, str, float], None]) -> None:
+    if observer in _stage_observers:
+        _stage_observers.remove(observer)
+
+
+def render_gauges(prefix: str, values: Mapping[str, Any], help_text: str) -> List[str]:
+    """Render a flat dict of numeric snapshot values as gauges named prefix_key."""
+    lines: List[str] = []
+    for key, value in values.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f"{prefix}_{key}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_format_value(value)}")
+    return lines
+
+
+def render_prometheus(extra_lines: Optional[Sequence[str]] = None) -> str:
+    lines: List[str] = []
+    for metric in list(_REGISTRY):
+        lines.extend(metric.render())
+    if extra_lines:
+        lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,156 @@
+"""
+Prompt-cache-friendly message assembly and cache-hit accounting.
+
+Providers reuse the longest prompt prefix they have seen recently (tool
+schemas, then the system prompt, then messages) and serve those tokens faster
+and cheaper. Prompts are therefore assembled static-first: the system prompt
+(with the schema digest), then history that only ever grows, then the
+per-turn data.
+
+assemble_prompt() marks the end of the static part and the end of the history
+as cache breakpoints. The marker is provider-neutral until a model of the
+chain is called: providers in CACHE_CONTROL_PROVIDERS (Anthropic) get an
+explicit cache_control block, the others (which cache prefixes on their own,
+e.g. Groq) get the plain message. PromptCacheUsage records cached and
+uncached input tokens of every call.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableLambda
+
+from app.core.config import settings
+from app.core.metrics import LLM_INPUT_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# additional_kwargs flag on a message that ends a cacheable prefix
+CACHE_BREAKPOINT = "prompt_cache_breakpoint"
+# Providers that need explicit cache_control markers
+CACHE_CONTROL_PROVIDERS = {"anthropic"}
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def _has_content(message: BaseMessage) -> bool:
+    content = message.content
+    if isinstance(content, str):
+        return bool(content.strip())
+    return bool(content)
+
+
+def mark_cache_breakpoint(message: BaseMessage) -> BaseMessage:
+    """Copy of message flagged as the end of a cacheable prefix."""
+    return message.model_copy(
+        update={"additional_kwargs": {**message.additional_kwargs, CACHE_BREAKPOINT: True}}
+    )
+
+
+def _mark_last(messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+    # Tool-call-only AI messages have no content block to carry a marker.
+    marked = list(messages)
+    for index in range(len(marked) - 1, -1, -1):
+        if _has_content(marked[index]):
+            marked[index] = mark_cache_breakpoint(marked[index])
+            break
+    return marked
+
+
+def assemble_prompt(
+    static: Sequence[BaseMessage],
+    history: Sequence[BaseMessage] = (),
+    dynamic: Sequence[BaseMessage] = (),
+) -> List[BaseMessage]:
+    """
+    [*static, *history, *dynamic] with cache breakpoints after the static
+    part and after the history. static must not change between calls and
+    history must only be appended to; anything else goes into dynamic.
+    """
+    return [*_mark_last(static), *_mark_last(history), *dynamic]
+
+
+def _with_cache_control(message: BaseMessage) -> BaseMessage:
+    content = message.content
+    if isinstance(content, str):
+        blocks: List[Any] = [{"type": "text", "text": content, "cache_control": CACHE_CONTROL}]
+    else:
+        blocks = list(content)
+        for index in range(len(blocks) - 1, -1, -1):
+            block = blocks[index]
+            if isinstance(block, str):
+                blocks[index] = {"type": "text", "text": block, "cache_control": CACHE_CONTROL}
+                break
+            if isinstance(block, dict) and block.get("type") not in ("thinking", "redacted_thinking"):
+                blocks[index] = {**block, "cache_control": CACHE_CONTROL}
+                break
+    return message.model_copy(update={"content": blocks})
+
+
+def prepare_messages(messages: Sequence[Any], cache_control: bool) -> List[Any]:
+    """Turn breakpoint flags into cache_control blocks, or drop them."""
+    prepared = []
+    for message in messages:
+        if isinstance(message, BaseMessage) and message.additional_kwargs.get(CACHE_BREAKPOINT):
+            extra = {k: v for k, v in message.additional_kwargs.items() if k != CACHE_BREAKPOINT}
+            message = message.model_copy(update={"additional_kwargs": extra})
+            if cache_control:
+                message = _with_cache_control(message)
+        prepared.append(message)
+    return prepared
+
+
+def prompt_preparer(provider: str) -> RunnableLambda:
+    """Runnable placed in front of a provider's model to apply (or strip) breakpoints."""
+    cache_control = settings.prompt_cache_control and provider.lower() in CACHE_CONTROL_PROVIDERS
+
+    def prepare(value: Any) -> Any:
+        if isinstance(value, (list, tuple)):
+            return prepare_messages(value, cache_control)
+        return value
+
+    return RunnableLambda(prepare, name=f"prompt_cache:{provider}")
+
+
+def input_token_breakdown(usage: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """cached / cache_write / uncached input tokens from a usage_metadata dict."""
+    usage = usage or {}
+    details = usage.get("input_token_details") or {}
+    cached = int(details.get("cache_read") or 0)
+    cache_write = int(details.get("cache_creation") or 0)
+    total = int(usage.get("input_tokens") or 0)
+    return {
+        "cached": cached,
+        "cache_write": cache_write,
+        "uncached": max(0, total - cached - cache_write),
+    }
+
+
+class PromptCacheUsage(BaseCallbackHandler):
+    """Counts input tokens by cache status for every chat model call of a task."""
+
+    run_inline = True
+
+    def __init__(self, task: str) -> None:
+        self.task = task
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if not usage:
+                    continue
+                tokens = input_token_breakdown(usage)
+                for status, count in tokens.items():
+                    if count:
+                        LLM_INPUT_TOKENS.inc(self.task, status, amount=count)
+                logger.info(
+                    "llm:usage task=%s input_cached=%s input_cache_write=%s input_uncached=%s output=%s",
+                    self.task,
+                    tokens["cached"],
+                    tokens["cache_write"],
+                    tokens["uncached"],
+                    usage.get("output_tokens") or 0,
+                )
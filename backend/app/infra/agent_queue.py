@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from app.agents.mailbox import wait_for_quiet
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+AgentJobHandler = Callable[[List[Any]], Awaitable[None]]
+
+# In-process queue for agent runs accepted with 202 (MESSAGES_ASYNC_MODE).
+# Jobs are kept per conversation and a conversation is handed to at most one
+# worker at a time, so replies within a conversation stay in FIFO order while
+# different conversations run concurrently (AGENT_WORKERS). A worker hands
+# every queued job of a conversation to the handler as one batch; jobs that
+# arrived during a run are debounced like the inline mailbox (app.agents.mailbox).
+_jobs: Dict[str, Deque[Any]] = {}
+# conversation_id -> (first, last) submit time of jobs not yet taken
+_arrivals: Dict[str, Tuple[float, float]] = {}
+# Conversations rescheduled with jobs that queued up behind a run
+_behind_run: Set[str] = set()
+_ready: Optional["asyncio.Queue[str]"] = None
+_active: Set[str] = set()
+_workers: List[asyncio.Task] = []
+_handler: Optional[AgentJobHandler] = None
+_accepting = False
+
+
+def is_running() -> bool:
+    return _accepting
+
+
+def pending_count() -> int:
+    return sum(len(jobs) for jobs in _jobs.values())
+
+
+def has_capacity() -> bool:
+    limit = settings.agent_queue_max_pending
+    return _accepting and (not limit or pending_count() < limit)
+
+
+def submit(conversation_id: str, job: Any) -> bool:
+    """
+    Queue a job behind any earlier jobs of the same conversation.
+    Returns False when the pool is not running or the backlog is full.
+    """
+    if not has_capacity() or _ready is None:
+        return False
+    jobs = _jobs.setdefault(conversation_id, deque())
+    jobs.append(job)
+    now = time.monotonic()
+    _arrivals[conversation_id] = (_arrivals.get(conversation_id, (now, now))[0], now)
+    # Schedule the conversation unless a worker owns it or it is already queued.
+    if len(jobs) == 1 and conversation_id not in _active:
+        _ready.put_nowait(conversation_id)
+    return True
+
+
+async def _worker(index: int) -> None:
+    assert _ready is not None
+    while True:
+        conversation_id = await _ready.get()
+        jobs = _jobs.get(conversation_id)
+        if not jobs:
+            _ready.task_done()
+            continue
+        _active.add(conversation_id)
+        batch: List[Any] = []
+        try:
+            if conversation_id in _behind_run:
+                _behind_run.discard(conversation_id)
+                await wait_for_quiet(lambda: _arrivals.get(conversation_id, (0.0, 0.0)))
+            batch = list(jobs)
+            _arrivals.pop(conversation_id, None)
+            await _handler(batch)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.exception(
+                "agent_queue:job failed worker=%s conversation_id=%s %s: %s",
+                index,
+                conversation_id,
+                type(exc).__name__,
+                exc,
+            )
+        finally:
+            for _ in batch:
+                jobs.popleft()
+            _active.discard(conversation_id)
+            if jobs:
+                _behind_run.add(conversation_id)
+                _ready.put_nowait(conversation_id)
+            else:
+                _jobs.pop(conversation_id, None)
+            _ready.task_done()
+
+
+def start_agent_workers(handler: AgentJobHandler) -> None:
+    """Start the worker pool. No-op unless MESSAGES_ASYNC_MODE is enabled."""
+    global _ready, _handler, _accepting
+    if not settings.messages_async_mode or _accepting:
+        return
+    _handler = handler
+    _ready = asyncio.Queue()
+    _workers.extend(
+        asyncio.create_task(_worker(i)) for i in range(max(1, settings.agent_workers))
+    )
+    _accepting = True
+    logger.info("agent_queue:start workers=%s", len(_workers))
+
+
+async def stop_agent_workers(drain_timeout: Optional[float] = None) -> None:
+    """Stop accepting jobs, let queued ones finish within the timeout, then cancel."""
+    global _ready, _handler, _accepting
+    if not _workers:
+        return
+    _accepting = False
+    timeout = settings.agent_queue_drain_seconds if drain_timeout is None else drain_timeout
+    if _ready is not None and timeout:
+        try:
+            await asyncio.wait_for(_ready.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("agent_queue:stop dropping unfinished jobs=%s", pending_count())
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _jobs.clear()
+    _arrivals.clear()
+    _behind_run.clear()
+    _active.clear()
+    _ready = None
+    _handler = None
+
+
+def get_agent_queue_metrics() -> Dict[str, Any]:
+    return {
+        "workers": len(_workers),
+        "pending": pending_count(),
+        "active": len(_active),
+        "conversations": len(_jobs),
+    }
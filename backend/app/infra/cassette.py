@@ -0,0 +1,449 @@
+"""
+Record/replay of chat model and MCP tool calls ("cassettes").
+
+CASSETTE_MODE=record wraps the task chat models and the pooled MCP tools, and
+appends every call to CASSETTE_PATH with its request, response and measured
+latency. CASSETTE_MODE=replay serves those calls from the file instead: no
+provider keys or MCP server are needed, and each call sleeps its recorded
+latency times CASSETTE_TIME_SCALE (1 = original timing, 0 = instant).
+
+File format: gzip-compressed JSON lines. The first line is a header, a
+"tools" line holds the MCP tool definitions, every other line is one call:
+    {"kind": "llm"|"tool", "name": ..., "key": ..., "latency": seconds,
+     "request": ..., "response": ...}
+
+Replay matches a call by key (a hash of the request with ids and timestamps
+masked). When no unplayed call has that key it takes the next unplayed call
+of the same name, so a changed prompt still replays in recorded order, and a
+repeated request may reuse its last answer. Replayed chat models return
+whole messages; they do not stream tokens.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.messages import (
+    BaseMessage,
+    convert_to_messages,
+    message_to_dict,
+    messages_from_dict,
+)
+from langchain_core.tools import StructuredTool, ToolException
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.metrics import time_stage
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = ("off", "record", "replay")
+CASSETTE_VERSION = 1
+
+_VOLATILE_RE = re.compile(
+    r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+    r"|\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?",
+    re.IGNORECASE,
+)
+
+
+class CassetteMiss(LookupError):
+    """Replay found no recorded call for a request."""
+
+
+class ReplayedError(RuntimeError):
+    """A chat model call that failed while recording fails the same way on replay."""
+
+
+def request_key(kind: str, name: str, request: Any) -> str:
+    text = json.dumps(request, sort_keys=True, default=str, ensure_ascii=False)
+    text = _VOLATILE_RE.sub("<volatile>", text)
+    return hashlib.sha256(f"{kind}\x00{name}\x00{text}".encode("utf-8")).hexdigest()[:24]
+
+
+def _message_record(message: BaseMessage) -> Dict[str, Any]:
+    # Ids (message, tool call) differ between runs and are left out.
+    record: Dict[str, Any] = {"type": message.type, "content": message.content}
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        record["tool_calls"] = [{"name": call["name"], "args": call["args"]} for call in tool_calls]
+    if message.type == "tool":
+        record["name"] = getattr(message, "name", None)
+    return record
+
+
+def llm_request(value: Any) -> Any:
+    """Compact, id-free form of a chat model input."""
+    if hasattr(value, "to_messages"):
+        value = value.to_messages()
+    if isinstance(value, (list, tuple)):
+        return [_message_record(message) for message in convert_to_messages(value)]
+    return str(value)
+
+
+def _encode_llm_output(value: Any) -> Dict[str, Any]:
+    if isinstance(value, BaseMessage):
+        return {"message": message_to_dict(value)}
+    if isinstance(value, BaseModel):
+        return {"model": value.model_dump(mode="json")}
+    return {"value": value}
+
+
+def _decode_llm_output(data: Dict[str, Any], schema: Any = None) -> Any:
+    if "error" in data:
+        raise ReplayedError(data["error"])
+    if "message" in data:
+        return messages_from_dict([data["message"]])[0]
+    if "model" in data:
+        return schema.model_validate(data["model"]) if schema is not None else data["model"]
+    return data.get("value")
+
+
+def _encode_tool_output(value: Any) -> Dict[str, Any]:
+    if isinstance(value, tuple) and len(value) == 2:
+        return {"content": value[0], "artifact": value[1]}
+    return {"value": value}
+
+
+def _decode_tool_output(data: Dict[str, Any]) -> Any:
+    if "error" in data:
+        raise ToolException(data["error"])
+    if "content" in data:
+        return data["content"], data.get("artifact")
+    return data.get("value")
+
+
+def _error_text(exc: BaseException) -> str:
+    return f"{type(exc).__name__}: {exc}"
+
+
+def _tool_name(tool: Any) -> str:
+    if isinstance(tool, dict):
+        return str(tool.get("name") or tool.get("function", {}).get("name", ""))
+    return str(getattr(tool, "name", tool))
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str, time_scale: float = 1.0) -> None:
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unsupported cassette mode {mode!r}")
+        self.path = Path(path)
+        self.mode = mode
+        self.time_scale = max(0.0, time_scale)
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self._file: Any = None
+        self._tool_specs: List[Dict[str, Any]] = []
+        self._entries: List[Dict[str, Any]] = []
+        self._played: List[bool] = []
+        self._by_key: Dict[str, List[int]] = defaultdict(list)
+        self._by_name: Dict[str, List[int]] = defaultdict(list)
+        self._last_by_key: Dict[str, int] = {}
+        if mode == "replay":
+            self._load()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    # -- file -------------------------------------------------------------
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            raise FileNotFoundError(f"Cassette not found: {self.path} (record one with CASSETTE_MODE=record)")
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                kind = entry.get("kind")
+                if kind == "header":
+                    if entry.get("version") != CASSETTE_VERSION:
+                        raise ValueError(f"Unsupported cassette version {entry.get('version')!r} in {self.path}")
+                elif kind == "tools":
+                    self._tool_specs = entry.get("tools") or []
+                else:
+                    index = len(self._entries)
+                    self._entries.append(entry)
+                    self._by_key[entry["key"]].append(index)
+                    self._by_name[f"{kind}:{entry['name']}"].append(index)
+        self._played = [False] * len(self._entries)
+        logger.info("cassette:replay path=%s calls=%s scale=%s", self.path, len(self._entries), self.time_scale)
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = gzip.open(self.path, "wt", encoding="utf-8")
+            self._file.write(json.dumps({"kind": "header", "version": CASSETTE_VERSION, "created_at": time.time()}) + "\n")
+            logger.info("cassette:record path=%s", self.path)
+        self._file.write(json.dumps(entry, default=str, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info("cassette:closed path=%s recorded=%s", self.path, self.recorded)
+        elif self.replaying:
+            logger.info(
+                "cassette:closed path=%s replayed=%s misses=%s unplayed=%s",
+                self.path,
+                self.replayed,
+                self.misses,
+                self._played.count(False),
+            )
+
+    # -- calls ------------------------------------------------------------
+
+    def record(self, kind: str, name: str, request: Any, response: Dict[str, Any], latency: float) -> None:
+        self._write(
+            {
+                "kind": kind,
+                "name": name,
+                "key": request_key(kind, name, request),
+                "latency": round(latency, 4),
+                "request": request,
+                "response": response,
+            }
+        )
+        self.recorded += 1
+
+    def lookup(self, kind: str, name: str, request: Any) -> Dict[str, Any]:
+        """Recorded call for a request; see the module docstring for matching."""
+        key = request_key(kind, name, request)
+        index = next((i for i in self._by_key.get(key, ()) if not self._played[i]), None)
+        if index is None:
+            index = next((i for i in self._by_name.get(f"{kind}:{name}", ()) if not self._played[i]), None)
+            if index is None:
+                index = self._last_by_key.get(key)
+            if index is None:
+                self.misses += 1
+                raise CassetteMiss(f"No recorded {kind} call {name!r} left in {self.path}")
+            logger.debug("cassette:replay fallback kind=%s name=%s key=%s", kind, name, key)
+        self._played[index] = True
+        self._last_by_key[key] = index
+        self.replayed += 1
+        return self._entries[index]
+
+    def delay(self, entry: Dict[str, Any]) -> float:
+        return float(entry.get("latency") or 0.0) * self.time_scale
+
+    async def acall(
+        self,
+        kind: str,
+        name: str,
+        request: Any,
+        call: Callable[[], Any],
+        encode: Callable[[Any], Dict[str, Any]],
+        decode: Callable[[Dict[str, Any]], Any],
+    ) -> Any:
+        """Await call() and record it, or replay the recorded result."""
+        if self.replaying:
+            entry = self.lookup(kind, name, request)
+            delay = self.delay(entry)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return decode(entry["response"])
+
+        started = time.perf_counter()
+        try:
+            result = await call()
+        except Exception as exc:
+            self.record(kind, name, request, {"error": _error_text(exc)}, time.perf_counter() - started)
+            raise
+        self.record(kind, name, request, encode(result), time.perf_counter() - started)
+        return result
+
+    def call(
+        self,
+        kind: str,
+        name: str,
+        request: Any,
+        call: Callable[[], Any],
+        encode: Callable[[Any], Dict[str, Any]],
+        decode: Callable[[Dict[str, Any]], Any],
+    ) -> Any:
+        """Synchronous acall()."""
+        if self.replaying:
+            entry = self.lookup(kind, name, request)
+            delay = self.delay(entry)
+            if delay > 0:
+                time.sleep(delay)
+            return decode(entry["response"])
+
+        started = time.perf_counter()
+        try:
+            result = call()
+        except Exception as exc:
+            self.record(kind, name, request, {"error": _error_text(exc)}, time.perf_counter() - started)
+            raise
+        self.record(kind, name, request, encode(result), time.perf_counter() - started)
+        return result
+
+    # -- wrappers ---------------------------------------------------------
+
+    def chat_model(self, task: str, inner: Any = None) -> "CassetteChatModel":
+        """Wrap a task's ChatModelChain (inner is unused, and may be None, on replay)."""
+        return CassetteChatModel(self, task, inner)
+
+    def record_tools(self, tools: List[Any]) -> List[StructuredTool]:
+        """Wrap MCP tools so their calls are recorded, and record their definitions."""
+        specs = []
+        for tool in tools:
+            schema = tool.args_schema
+            if isinstance(schema, type) and issubclass(schema, BaseModel):
+                schema = schema.model_json_schema()
+            specs.append(
+                {
+                    "name": tool.name,
+                    "description": tool.description,
+                    "args_schema": schema,
+                    "response_format": tool.response_format,
+                }
+            )
+        self._write({"kind": "tools", "tools": specs})
+        return [self._tool(tool.name, tool.description, tool.args_schema, tool.response_format, tool) for tool in tools]
+
+    def replay_tools(self) -> List[StructuredTool]:
+        """MCP tools rebuilt from the recorded definitions, answering from the cassette."""
+        if not self._tool_specs:
+            raise CassetteMiss(f"No MCP tool definitions in {self.path}")
+        return [
+            self._tool(spec["name"], spec["description"], spec["args_schema"], spec["response_format"])
+            for spec in self._tool_specs
+        ]
+
+    def _tool(self, name: str, description: str, args_schema: Any, response_format: str, inner: Any = None) -> StructuredTool:
+        async def cassette_call(**arguments: Any) -> Any:
+            if self.replaying:
+                # Replaces the pooled call, which times this stage when recording.
+                with time_stage(f"mcp.{name}"):
+                    return await self.acall(
+                        "tool", name, arguments, None, _encode_tool_output, _decode_tool_output
+                    )
+            return await self.acall(
+                "tool", name, arguments, lambda: inner.coroutine(**arguments), _encode_tool_output, _decode_tool_output
+            )
+
+        return StructuredTool(
+            name=name,
+            description=description,
+            args_schema=args_schema,
+            coroutine=cassette_call,
+            response_format=response_format,
+            metadata=getattr(inner, "metadata", None),
+            handle_tool_error=getattr(inner, "handle_tool_error", False),
+        )
+
+
+class _CassetteRunnable:
+    """A bound chat model (plain, with tools or with a structured schema) behind the cassette."""
+
+    def __init__(self, cassette: Cassette, name: str, inner: Any, schema: Any = None, extra: Any = None) -> None:
+        self.cassette = cassette
+        self.name = name
+        self.inner = inner
+        self.schema = schema
+        self.extra = extra
+
+    def _request(self, value: Any) -> Dict[str, Any]:
+        request: Dict[str, Any] = {"input": llm_request(value)}
+        if self.extra:
+            request.update(self.extra)
+        return request
+
+    def _decode(self, data: Dict[str, Any]) -> Any:
+        return _decode_llm_output(data, self.schema)
+
+    async def ainvoke(self, value: Any, config: Any = None, **kwargs: Any) -> Any:
+        return await self.cassette.acall(
+            "llm",
+            self.name,
+            self._request(value),
+            lambda: self.inner.ainvoke(value, config, **kwargs),
+            _encode_llm_output,
+            self._decode,
+        )
+
+    def invoke(self, value: Any, config: Any = None, **kwargs: Any) -> Any:
+        return self.cassette.call(
+            "llm",
+            self.name,
+            self._request(value),
+            lambda: self.inner.invoke(value, config, **kwargs),
+            _encode_llm_output,
+            self._decode,
+        )
+
+
+class CassetteChatModel:
+    """Used like a ChatModelChain; every call goes through the cassette."""
+
+    def __init__(self, cassette: Cassette, task: str, inner: Any = None) -> None:
+        self.cassette = cassette
+        self.task = task
+        self.inner = inner
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> _CassetteRunnable:
+        bound = self.inner.bind_tools(tools, **kwargs) if self.inner is not None else None
+        names = sorted(_tool_name(tool) for tool in tools)
+        return _CassetteRunnable(self.cassette, f"{self.task}.tools", bound, extra={"tools": names})
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> _CassetteRunnable:
+        bound = self.inner.with_structured_output(schema, **kwargs) if self.inner is not None else None
+        schema_name = getattr(schema, "__name__", None) or str(schema.get("title", "schema"))
+        model = schema if isinstance(schema, type) and issubclass(schema, BaseModel) else None
+        return _CassetteRunnable(self.cassette, f"{self.task}.{schema_name}", bound, schema=model)
+
+    def runnable(self) -> _CassetteRunnable:
+        inner = self.inner.runnable() if self.inner is not None else None
+        return _CassetteRunnable(self.cassette, self.task, inner)
+
+    async def ainvoke(self, *args: Any, **kwargs: Any) -> Any:
+        return await self.runnable().ainvoke(*args, **kwargs)
+
+    def invoke(self, *args: Any, **kwargs: Any) -> Any:
+        return self.runnable().invoke(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"CassetteChatModel(task={self.task!r}, mode={self.cassette.mode!r}, inner={self.inner!r})"
+
+
+_cassette: Optional[Cassette] = None
+
+
+def get_cassette() -> Optional[Cassette]:
+    """The process-wide cassette, opened on first use; None when CASSETTE_MODE=off."""
+    global _cassette
+    mode = (settings.cassette_mode or "off").strip().lower()
+    if mode not in CASSETTE_MODES:
+        raise ValueError(f"CASSETTE_MODE must be one of {CASSETTE_MODES}, got {settings.cassette_mode!r}")
+    if mode == "off":
+        return None
+    if _cassette is None:
+        _cassette = Cassette(settings.cassette_path, mode, settings.cassette_time_scale)
+    return _cassette
+
+
+def close_cassette() -> None:
+    """Flush a recording (or log replay stats) and forget the cassette."""
+    global _cassette
+    if _cassette is not None:
+        _cassette.close()
+        _cassette = None
+
+
+def get_cassette_metrics() -> Dict[str, Any]:
+    if _cassette is None:
+        return {}
+    return {
+        "recorded": _cassette.recorded,
+        "replayed": _cassette.replayed,
+        "misses": _cassette.misses,
+    }
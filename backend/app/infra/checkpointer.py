@@ -0,0 +1,345 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from langgraph.checkpoint.base.id import UUID as CheckpointUUID
+from langgraph.checkpoint.memory import InMemorySaver
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MEMORY_BACKEND = "memory"
+SQLITE_BACKEND = "sqlite"
+POSTGRES_BACKEND = "postgres"
+# 100-ns intervals between the UUID epoch (1582-10-15) and the Unix epoch
+_UUID_EPOCH_OFFSET = 0x01B21DD213814000
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """
+    In-process checkpointer with per-thread TTL, LRU eviction and a memory cap.
+
+    Behaves like MemorySaver, but a thread (conversation) is dropped once it has
+    been idle for longer than ttl_seconds, and the least recently used threads
+    are evicted whenever max_threads or max_bytes (serialized size) is exceeded.
+    The thread being written is never evicted by its own write.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_threads: int = 1000,
+        ttl_seconds: float = 3600,
+        max_bytes: int = 256 * 1024 * 1024,
+        serde: Any = None,
+    ) -> None:
+        super().__init__(serde=serde)
+        self.max_threads = max_threads
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        # thread_id -> last access (monotonic), oldest first
+        self._last_access: "OrderedDict[str, float]" = OrderedDict()
+        self._thread_bytes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    @property
+    def thread_count(self) -> int:
+        return len(self._last_access)
+
+    def _touch(self, thread_id: str) -> None:
+        self._last_access[thread_id] = time.monotonic()
+        self._last_access.move_to_end(thread_id)
+
+    def _add_bytes(self, thread_id: str, size: int) -> None:
+        self._thread_bytes[thread_id] = self._thread_bytes.get(thread_id, 0) + size
+        self._total_bytes += size
+
+    def _evict_expired(self) -> None:
+        if not self.ttl_seconds:
+            return
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._last_access:
+            thread_id, last_access = next(iter(self._last_access.items()))
+            if last_access >= cutoff:
+                break
+            logger.info("checkpointer:evict thread_id=%s reason=ttl", thread_id)
+            self.delete_thread(thread_id)
+
+    def _enforce_limits(self, keep: str) -> None:
+        self._evict_expired()
+        while len(self._last_access) > 1 and (
+            (self.max_threads and len(self._last_access) > self.max_threads)
+            or (self.max_bytes and self._total_bytes > self.max_bytes)
+        ):
+            thread_id = next(iter(self._last_access))
+            if thread_id == keep:
+                # Only the active thread is left at the head; nothing else to drop.
+                break
+            logger.info(
+                "checkpointer:evict thread_id=%s reason=lru total_bytes=%s threads=%s",
+                thread_id,
+                self._total_bytes,
+                len(self._last_access),
+            )
+            self.delete_thread(thread_id)
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            self._evict_expired()
+            if thread_id in self._last_access:
+                self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            saved_checkpoint, saved_metadata, _ = self.storage[thread_id][checkpoint_ns][
+                checkpoint["id"]
+            ]
+            size = len(saved_checkpoint[1]) + len(saved_metadata[1])
+            for channel, version in new_versions.items():
+                blob = self.blobs.get((thread_id, checkpoint_ns, channel, version))
+                if blob is not None:
+                    size += len(blob[1])
+            self._add_bytes(thread_id, size)
+            self._touch(thread_id)
+            self._enforce_limits(keep=thread_id)
+            return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        outer_key = (
+            thread_id,
+            config["configurable"].get("checkpoint_ns", ""),
+            config["configurable"]["checkpoint_id"],
+        )
+        with self._lock:
+            before = _writes_size(self.writes.get(outer_key))
+            super().put_writes(config, writes, task_id, task_path)
+            self._add_bytes(thread_id, _writes_size(self.writes.get(outer_key)) - before)
+            self._touch(thread_id)
+            self._enforce_limits(keep=thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            super().delete_thread(thread_id)
+            self._last_access.pop(thread_id, None)
+            self._total_bytes -= self._thread_bytes.pop(thread_id, 0)
+
+
+def _writes_size(writes: Optional[Dict[Any, Any]]) -> int:
+    if not writes:
+        return 0
+    return sum(len(value[1]) for _, _, value, _ in writes.values())
+
+
+def build_memory_checkpointer() -> BoundedMemorySaver:
+    """Build the in-process tier from settings."""
+    return BoundedMemorySaver(
+        max_threads=settings.checkpointer_max_threads,
+        ttl_seconds=settings.checkpointer_ttl_seconds,
+        max_bytes=settings.checkpointer_max_memory_mb * 1024 * 1024,
+    )
+
+
+LatestCheckpoints = Callable[[BaseCheckpointSaver], Awaitable[Dict[str, float]]]
+
+
+def _checkpoint_id_time(checkpoint_id: str) -> Optional[float]:
+    """Unix time encoded in a checkpoint id (LangGraph ids are time-ordered UUIDv6)."""
+    try:
+        checkpoint_uuid = CheckpointUUID(checkpoint_id)
+    except ValueError:
+        return None
+    if checkpoint_uuid.version != 6:
+        return None
+    return (checkpoint_uuid.time - _UUID_EPOCH_OFFSET) / 10_000_000
+
+
+def _thread_times(rows: Iterable[Tuple[str, str]]) -> Dict[str, float]:
+    # Threads whose id carries no time are kept rather than guessed at.
+    latest: Dict[str, float] = {}
+    for thread_id, checkpoint_id in rows:
+        ts = _checkpoint_id_time(checkpoint_id)
+        if ts is not None:
+            latest[str(thread_id)] = ts
+    return latest
+
+
+async def _sqlite_latest_checkpoints(saver: BaseCheckpointSaver) -> Dict[str, float]:
+    async with saver.lock, saver.conn.execute(
+        "SELECT thread_id, MAX(checkpoint_id) FROM checkpoints"
+        " WHERE checkpoint_ns = '' GROUP BY thread_id"
+    ) as cur:
+        return _thread_times(await cur.fetchall())
+
+
+async def _postgres_latest_checkpoints(saver: BaseCheckpointSaver) -> Dict[str, float]:
+    async with saver.lock, saver.conn.cursor() as cur:
+        await cur.execute(
+            "SELECT DISTINCT ON (thread_id) thread_id, checkpoint_id FROM checkpoints"
+            " WHERE checkpoint_ns = '' ORDER BY thread_id, checkpoint_id DESC"
+        )
+        rows = await cur.fetchall()
+    return _thread_times((row["thread_id"], row["checkpoint_id"]) for row in rows)
+
+
+async def _scan_latest_checkpoints(saver: BaseCheckpointSaver) -> Dict[str, float]:
+    # Reads every checkpoint; only for savers without a query above.
+    latest: Dict[str, float] = {}
+    async for item in saver.alist(None):
+        thread_id = item.config["configurable"]["thread_id"]
+        ts = _checkpoint_id_time(item.checkpoint["id"])
+        if ts is not None and ts > latest.get(thread_id, 0):
+            latest[thread_id] = ts
+    return latest
+
+
+async def prune_checkpoints(
+    saver: BaseCheckpointSaver,
+    ttl_seconds: float,
+    max_threads: int,
+    latest_checkpoints: Optional[LatestCheckpoints] = None,
+) -> int:
+    """
+    Delete threads idle for longer than ttl_seconds, then the oldest threads
+    beyond max_threads. latest_checkpoints returns the time of each thread's
+    newest checkpoint (one row per thread for the SQL backends); threads are
+    removed with adelete_thread. Returns the number of deleted threads.
+    """
+    last_seen = await (latest_checkpoints or _scan_latest_checkpoints)(saver)
+
+    by_age = sorted(last_seen.items(), key=lambda entry: entry[1])
+    stale: list[str] = []
+    if ttl_seconds:
+        cutoff = time.time() - ttl_seconds
+        stale = [thread_id for thread_id, ts in by_age if ts < cutoff]
+    if max_threads and len(by_age) - len(stale) > max_threads:
+        overflow = len(by_age) - len(stale) - max_threads
+        stale += [thread_id for thread_id, _ in by_age[len(stale):len(stale) + overflow]]
+
+    for thread_id in stale:
+        await saver.adelete_thread(thread_id)
+    if stale:
+        logger.info("checkpointer:prune deleted_threads=%s remaining=%s", len(stale), len(by_age) - len(stale))
+    return len(stale)
+
+
+@asynccontextmanager
+async def _periodic_prune(
+    saver: BaseCheckpointSaver, latest_checkpoints: LatestCheckpoints
+) -> AsyncIterator[None]:
+    interval = settings.checkpointer_sweep_interval_seconds
+
+    async def _loop() -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await prune_checkpoints(
+                    saver,
+                    settings.checkpointer_ttl_seconds,
+                    settings.checkpointer_max_threads,
+                    latest_checkpoints,
+                )
+            except Exception as exc:
+                logger.warning("checkpointer:prune failed %s: %s", type(exc).__name__, exc)
+
+    task = asyncio.create_task(_loop()) if interval > 0 else None
+    try:
+        yield
+    finally:
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+@asynccontextmanager
+async def open_checkpointer(backend: str | None = None) -> AsyncIterator[BaseCheckpointSaver]:
+    """
+    Open the LangGraph checkpointer selected by CHECKPOINTER_BACKEND:
+    - memory:   bounded in-process tier (TTL + LRU + memory cap)
+    - sqlite:   file-backed, survives restarts, shared by workers on one host
+    - postgres: shared by every replica
+
+    Persistent backends are pruned in the background using the same TTL and
+    thread limit as the in-process tier.
+    """
+    resolved = (backend or settings.checkpointer_backend).strip().lower()
+
+    if resolved == MEMORY_BACKEND:
+        yield build_memory_checkpointer()
+        return
+
+    if resolved == SQLITE_BACKEND:
+        try:
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        except ImportError as exc:
+            raise RuntimeError(
+                "CHECKPOINTER_BACKEND=sqlite requires langgraph-checkpoint-sqlite "
+                "(pip install 'support-api[sqlite]')."
+            ) from exc
+
+        async with AsyncSqliteSaver.from_conn_string(settings.checkpointer_sqlite_path) as saver:
+            await saver.setup()
+            logger.info("checkpointer:open backend=sqlite path=%s", settings.checkpointer_sqlite_path)
+            async with _periodic_prune(saver, _sqlite_latest_checkpoints):
+                yield saver
+        return
+
+    if resolved == POSTGRES_BACKEND:
+        if not settings.checkpointer_postgres_url:
+            raise RuntimeError(
+                "CHECKPOINTER_POSTGRES_URL is required when CHECKPOINTER_BACKEND=postgres."
+            )
+        try:
+            from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+        except ImportError as exc:
+            raise RuntimeError(
+                "CHECKPOINTER_BACKEND=postgres requires langgraph-checkpoint-postgres "
+                "(pip install 'support-api[postgres]')."
+            ) from exc
+
+        async with AsyncPostgresSaver.from_conn_string(settings.checkpointer_postgres_url) as saver:
+            await saver.setup()
+            logger.info("checkpointer:open backend=postgres")
+            async with _periodic_prune(saver, _postgres_latest_checkpoints):
+                yield saver
+        return
+
+    raise ValueError(f"Unknown CHECKPOINTER_BACKEND: {resolved}")
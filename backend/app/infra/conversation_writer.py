@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ConversationWrite = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+# Write-behind state for denormalized conversation fields (last_message,
+# updated_at). Updates are merged per conversation and only the latest value
+# of each field is written when the queue is flushed.
+_pending: Dict[str, Dict[str, Any]] = {}
+_write: Optional[ConversationWrite] = None
+_flush_task: Optional[asyncio.Task] = None
+_flush_lock = asyncio.Lock()
+
+
+def is_running() -> bool:
+    """True when the flush loop is alive on the current event loop."""
+    if _write is None or _flush_task is None or _flush_task.done():
+        return False
+    try:
+        return _flush_task.get_loop() is asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+
+
+def enqueue(conversation_id: str, fields: Dict[str, Any]) -> bool:
+    """
+    Queue fields for a conversation, overriding any pending values.
+    Returns False when the writer is not running; the caller must write directly.
+    """
+    if not is_running():
+        # The direct write supersedes anything still queued for it.
+        _pending.pop(conversation_id, None)
+        return False
+    _pending.setdefault(conversation_id, {}).update(fields)
+    return True
+
+
+async def discard_pending(conversation_id: str) -> None:
+    """
+    Drop pending fields for a conversation and wait out any in-flight flush.
+    Call before a direct write that supersedes them, so a queued older value
+    cannot land on top of it.
+    """
+    _pending.pop(conversation_id, None)
+    async with _flush_lock:
+        # A failed in-flight write may have re-queued the old value.
+        _pending.pop(conversation_id, None)
+
+
+def pending_count() -> int:
+    return len(_pending)
+
+
+async def flush() -> int:
+    """Write every pending conversation once. Returns the number written."""
+    if _write is None:
+        return 0
+    async with _flush_lock:
+        if not _pending:
+            return 0
+        batch = dict(_pending)
+        _pending.clear()
+
+        semaphore = asyncio.Semaphore(max(1, settings.conversation_writer_max_concurrency))
+
+        async def _write_one(conversation_id: str, fields: Dict[str, Any]) -> bool:
+            async with semaphore:
+                try:
+                    await _write(conversation_id, fields)
+                    return True
+                except Exception as exc:
+                    logger.warning(
+                        "conversation_writer:write failed conversation_id=%s %s: %s",
+                        conversation_id,
+                        type(exc).__name__,
+                        exc,
+                    )
+                    # Re-queue without clobbering anything newer that arrived meanwhile.
+                    merged = dict(fields)
+                    merged.update(_pending.get(conversation_id, {}))
+                    _pending[conversation_id] = merged
+                    return False
+
+        results = await asyncio.gather(
+            *(_write_one(conversation_id, fields) for conversation_id, fields in batch.items())
+        )
+        return sum(results)
+
+
+async def _flush_loop(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await flush()
+        except Exception as exc:
+            logger.warning("conversation_writer:flush failed %s: %s", type(exc).__name__, exc)
+
+
+def start_conversation_writer(write: ConversationWrite) -> None:
+    """Start the periodic flush. No-op when CONVERSATION_WRITE_BEHIND is disabled."""
+    global _write, _flush_task
+    if not settings.conversation_write_behind or _write is not None:
+        return
+    _write = write
+    _flush_task = asyncio.create_task(
+        _flush_loop(settings.conversation_writer_flush_interval_seconds)
+    )
+    logger.info(
+        "conversation_writer:start interval=%ss",
+        settings.conversation_writer_flush_interval_seconds,
+    )
+
+
+async def stop_conversation_writer() -> None:
+    """Stop the periodic flush and write whatever is still pending."""
+    global _write, _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        try:
+            await _flush_task
+        except asyncio.CancelledError:
+            pass
+        _flush_task = None
+    try:
+        written = await flush()
+        if written or _pending:
+            logger.info(
+                "conversation_writer:stop flushed=%s unflushed=%s", written, len(_pending)
+            )
+    finally:
+        _write = None
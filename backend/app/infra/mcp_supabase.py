@@ -2,27 +2,65 @@ import asyncio
 import json
 import logging
 import os
+import random
+import re
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import StructuredTool, ToolException
 from langgraph.prebuilt import ToolNode
 from langchain_mcp_adapters.client import MultiServerMCPClient
 from langchain_mcp_adapters.tools import load_mcp_tools
 
+from app.core.cache import BoundedTTLCache
+from app.core.config import settings
+from app.core.metrics import time_stage
+from app.infra.cassette import get_cassette
+
 logger = logging.getLogger(__name__)
 
 _MODULE_DIR = Path(__file__).resolve().parent
 
 DEFAULT_SERVER_NAME = "supabase"
+EXPOSED_TOOL_NAMES = ("execute_sql", "list_tables")
+DEFAULT_SCHEMA_ARGS: Dict[str, Any] = {"schemas": ["public"]}
+SCHEMA_DIGEST_MAX_CHARS = 6000
 
 # Module-level cached state (single server)
 _client: Optional[MultiServerMCPClient] = None
-_session_cm: Optional[Any] = None
-_session: Optional[Any] = None
+_pool: Optional["MCPSessionPool"] = None
 _tools: Optional[List[Any]] = None
 _tool_node: Optional[ToolNode] = None
 _init_lock = asyncio.Lock()
 
+# list_tables results keyed by normalized arguments -> (fetched_at, tool result)
+_schema_cache: Dict[str, Tuple[float, Any]] = {}
+_schema_digest: str = ""
+_schema_refresh_lock = asyncio.Lock()
+# After a failed refresh the previous digest is served until then (monotonic)
+_schema_retry_at = 0.0
+SCHEMA_RETRY_SECONDS = 60
+
+# execute_sql results keyed by (customer scope, normalized SQL, other args)
+_sql_cache: BoundedTTLCache[Any] = BoundedTTLCache(
+    ttl_seconds=settings.mcp_sql_cache_ttl_seconds,
+    max_entries=settings.mcp_sql_cache_max_entries,
+    max_bytes=settings.mcp_sql_cache_max_mb * 1024 * 1024,
+    sizeof=lambda result: len(_result_text(result)),
+)
+
+_SQL_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_SQL_WHITESPACE_RE = re.compile(r"\s+")
+_SQL_WRITE_RE = re.compile(
+    r"\b(insert|update|delete|merge|upsert|alter|drop|create|truncate|grant|revoke|"
+    r"copy|call|do|execute|lock|vacuum|analyze|refresh|reindex|cluster|comment|"
+    r"into|nextval|setval|set_config|pg_sleep|pg_advisory_lock)\b|\bfor\s+(update|share)\b",
+    re.IGNORECASE,
+)
+
 
 def load_mcp_servers(config_path: str | None = None) -> Dict[str, Any]:
     """
@@ -35,7 +73,7 @@ def load_mcp_servers(config_path: str | None = None) -> Dict[str, Any]:
     - Finally fall back to NEXT_PUBLIC_SUPABASE_PUBLISHABLE_DEFAULT_KEY (last resort; usually not enough for hosted MCP)
     """
     if config_path is None:
-        config_path = str(_MODULE_DIR / "mcp.json")
+        config_path = settings.mcp_config_path or str(_MODULE_DIR / "mcp.json")
 
     if not os.path.exists(config_path):
         raise FileNotFoundError(f"MCP config file not found: {config_path}")
@@ -71,48 +109,296 @@ def load_mcp_servers(config_path: str | None = None) -> Dict[str, Any]:
     return servers
 
 
+class _PooledSession:
+    """
+    One MCP session plus the tools bound to it.
+
+    The session context is entered and exited by a dedicated holder task,
+    because the MCP transport's task group must be closed by the task that
+    opened it. close() just signals that task.
+    """
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.session: Optional[Any] = None
+        self.tools: Dict[str, Any] = {}
+        self._close_event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def open(self, client: MultiServerMCPClient, server_name: str) -> None:
+        ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._close_event = asyncio.Event()
+        self._task = asyncio.create_task(self._hold(client, server_name, ready))
+        await ready
+
+    async def _hold(self, client: MultiServerMCPClient, server_name: str, ready: asyncio.Future) -> None:
+        try:
+            async with client.session(server_name) as session:
+                tools = await load_mcp_tools(session)
+                self.session = session
+                self.tools = {tool.name: tool for tool in tools}
+                ready.set_result(None)
+                await self._close_event.wait()
+        except BaseException as exc:
+            if not ready.done():
+                ready.set_exception(exc if isinstance(exc, Exception) else RuntimeError(repr(exc)))
+            elif not isinstance(exc, asyncio.CancelledError):
+                logger.warning(
+                    "MCP session %s closed unexpectedly: %s: %s",
+                    self.index,
+                    type(exc).__name__,
+                    exc,
+                )
+        finally:
+            self.session = None
+
+    async def close(self) -> None:
+        self._close_event.set()
+        task, self._task = self._task, None
+        if task is None:
+            return
+        try:
+            await asyncio.wait_for(task, timeout=5)
+        except (asyncio.TimeoutError, asyncio.CancelledError, Exception) as exc:
+            logger.debug(
+                "MCP session cleanup warning (non-critical): %s: %s",
+                type(exc).__name__,
+                exc,
+            )
+        self.session = None
+
+
+class MCPSessionPool:
+    """
+    Fixed-size pool of MCP sessions with per-call checkout.
+
+    - Idle sessions are pinged every ping_interval seconds; failures and
+      broken transports are reconnected with exponential backoff.
+    - A session whose call fails with a transport error (anything other than
+      a ToolException) is closed and reopened on its next checkout.
+    - metrics() reports pool occupancy, checkout wait time and reconnects.
+    """
+
+    def __init__(
+        self,
+        client: MultiServerMCPClient,
+        server_name: str,
+        *,
+        size: int,
+        checkout_timeout: float,
+        ping_interval: float,
+        max_backoff: float,
+    ) -> None:
+        self.client = client
+        self.server_name = server_name
+        self.size = max(1, size)
+        self.checkout_timeout = checkout_timeout
+        self.ping_interval = ping_interval
+        self.max_backoff = max_backoff
+        self._slots = [_PooledSession(index) for index in range(self.size)]
+        self._idle: asyncio.Queue[_PooledSession] = asyncio.Queue()
+        self._health_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.reconnects = 0
+        self.reconnect_failures = 0
+        self.ping_failures = 0
+
+    @property
+    def template_tools(self) -> List[Any]:
+        """Tools of the first open session, used for names and schemas."""
+        for slot in self._slots:
+            if slot.tools:
+                return list(slot.tools.values())
+        return []
+
+    async def start(self) -> None:
+        results = await asyncio.gather(
+            *(slot.open(self.client, self.server_name) for slot in self._slots),
+            return_exceptions=True,
+        )
+        failure = next((result for result in results if isinstance(result, BaseException)), None)
+        if failure is not None:
+            # Don't leak the sessions that did open.
+            await asyncio.gather(*(slot.close() for slot in self._slots), return_exceptions=True)
+            raise failure
+        for slot in self._slots:
+            self._idle.put_nowait(slot)
+        if self.ping_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        await asyncio.gather(*(slot.close() for slot in self._slots))
+
+    @asynccontextmanager
+    async def checkout(self) -> AsyncIterator[_PooledSession]:
+        started = time.monotonic()
+        slot = await asyncio.wait_for(self._idle.get(), timeout=self.checkout_timeout)
+        waited = time.monotonic() - started
+        self.checkouts += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        try:
+            if not slot.is_open:
+                await self._reconnect(slot)
+            yield slot
+        except ToolException:
+            raise
+        except Exception:
+            # Transport-level failure: drop the session, reopen on next checkout.
+            await slot.close()
+            raise
+        finally:
+            self._idle.put_nowait(slot)
+
+    async def _reconnect(self, slot: _PooledSession, attempts: int = 5) -> None:
+        await slot.close()
+        delay = 0.5
+        for attempt in range(1, attempts + 1):
+            try:
+                await slot.open(self.client, self.server_name)
+                self.reconnects += 1
+                logger.info("MCP session %s reconnected (attempt=%s)", slot.index, attempt)
+                return
+            except Exception as exc:
+                self.reconnect_failures += 1
+                logger.warning(
+                    "MCP session %s reconnect failed (attempt=%s): %s: %s",
+                    slot.index,
+                    attempt,
+                    type(exc).__name__,
+                    exc,
+                )
+                if attempt == attempts or self._closed:
+                    raise
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+                delay = min(delay * 2, self.max_backoff)
+
+    async def _health_loop(self) -> None:
+        while not self._closed:
+            await asyncio.sleep(self.ping_interval)
+            # Only check sessions that are idle right now; busy ones are in use.
+            # One at a time, so checkouts still find the other idle sessions.
+            checked: set = set()
+            for _ in range(self._idle.qsize()):
+                if self._closed or self._idle.empty():
+                    break
+                slot = self._idle.get_nowait()
+                try:
+                    if slot.index not in checked:
+                        checked.add(slot.index)
+                        await self._check(slot)
+                finally:
+                    self._idle.put_nowait(slot)
+
+    async def _check(self, slot: _PooledSession) -> None:
+        try:
+            if slot.is_open:
+                await asyncio.wait_for(slot.session.send_ping(), timeout=10)
+                return
+        except Exception as exc:
+            self.ping_failures += 1
+            logger.warning("MCP session %s ping failed: %s: %s", slot.index, type(exc).__name__, exc)
+        try:
+            await self._reconnect(slot)
+        except Exception:
+            # Leave it closed; the next checkout retries.
+            pass
+
+    def metrics(self) -> Dict[str, Any]:
+        idle = self._idle.qsize()
+        return {
+            "size": self.size,
+            "idle": idle,
+            "in_use": self.size - idle,
+            "open": sum(1 for slot in self._slots if slot.is_open),
+            "checkouts": self.checkouts,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+            "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+            "reconnects": self.reconnects,
+            "reconnect_failures": self.reconnect_failures,
+            "ping_failures": self.ping_failures,
+        }
+
+
 async def init_mcp(server_name: str | None = None) -> None:
     """
     Initialize MCP once per process:
     - Create MultiServerMCPClient
-    - Open a persistent session to the given server_name
-    - Load tools from that session
+    - Open a pool of MCP_POOL_SIZE sessions to the given server_name
+    - Expose tools that check out a pooled session per call
     - Build a ToolNode from those tools
     """
-    global _client, _session_cm, _session, _tools, _tool_node
+    global _client, _pool, _tools, _tool_node
     resolved_name = server_name or DEFAULT_SERVER_NAME
 
     async with _init_lock:
         if _tool_node is not None:
             return
 
+        cassette = get_cassette()
+        if cassette is not None and cassette.replaying:
+            # Recorded tool definitions and results; no MCP server involved.
+            _tools = cassette.replay_tools()
+            _tool_node = ToolNode(_tools, handle_tool_errors=True)
+            logger.info("MCP tools replayed from cassette %s", cassette.path)
+            return
+
         mcp_servers = load_mcp_servers()
         _client = MultiServerMCPClient(mcp_servers)
 
-        # Open a single long-lived session and keep it open.
-        _session_cm = _client.session(resolved_name)
-        _session = await _session_cm.__aenter__()
+        _pool = MCPSessionPool(
+            _client,
+            resolved_name,
+            size=settings.mcp_pool_size,
+            checkout_timeout=settings.mcp_pool_checkout_timeout_seconds,
+            ping_interval=settings.mcp_pool_ping_interval_seconds,
+            max_backoff=settings.mcp_pool_max_backoff_seconds,
+        )
+        await _pool.start()
 
-        # Load tools bound to the persistent session.
-        _tools = await load_mcp_tools(_session)
+        # Tools route each call through a pooled session.
+        _tools = [_with_session_pool(tool) for tool in _pool.template_tools]
+        if cassette is not None:
+            _tools = cassette.record_tools(_tools)
 
         # ToolNode is what LangGraph uses to execute tool calls
         _tool_node = ToolNode(_tools, handle_tool_errors=True)
 
-        logger.info("MCP initialized with persistent session (server=%s)", resolved_name)
+        logger.info(
+            "MCP initialized with session pool (server=%s, size=%s)",
+            resolved_name,
+            _pool.size,
+        )
 
 
 async def shutdown_mcp() -> None:
     """
-    Close the persistent MCP session and clear caches.
+    Close the MCP session pool and clear caches.
     Call once at application shutdown.
     """
-    global _client, _session_cm, _session, _tools, _tool_node
+    global _client, _pool, _tools, _tool_node
 
     async with _init_lock:
-        if _session_cm is not None:
+        if _pool is not None:
             try:
-                await _session_cm.__aexit__(None, None, None)
+                await _pool.close()
             except (RuntimeError, GeneratorExit, Exception) as exc:
                 logger.debug(
                     "MCP session cleanup warning (non-critical): %s: %s",
@@ -120,8 +406,7 @@ async def shutdown_mcp() -> None:
                     exc,
                 )
             finally:
-                _session_cm = None
-                _session = None
+                _pool = None
                 _tools = None
                 _tool_node = None
 
@@ -130,17 +415,243 @@ async def shutdown_mcp() -> None:
         logger.info("MCP shutdown complete")
 
 
+def get_mcp_pool_metrics() -> Dict[str, Any]:
+    """Pool occupancy and checkout wait metrics ({} before init)."""
+    return _pool.metrics() if _pool is not None else {}
+
+
+def _cache_key(arguments: Dict[str, Any]) -> str:
+    return json.dumps(arguments, sort_keys=True, default=str)
+
+
+def _wrap_tool(tool: Any, coroutine: Any) -> StructuredTool:
+    """Clone an MCP tool with the same schema but a different coroutine."""
+    return StructuredTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        coroutine=coroutine,
+        response_format=tool.response_format,
+        metadata=tool.metadata,
+        handle_tool_error=tool.handle_tool_error,
+    )
+
+
+def _result_text(result: Any) -> str:
+    """Flatten an MCP tool result (content or (content, artifact)) to text."""
+    content = result[0] if isinstance(result, tuple) else result
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for block in content:
+            if isinstance(block, dict):
+                parts.append(str(block.get("text", "")))
+            else:
+                parts.append(str(getattr(block, "text", block)))
+        return "\n".join(parts)
+    return str(content)
+
+
+def build_schema_digest(result: Any) -> str:
+    """
+    Compact one-line-per-table digest of a list_tables result, e.g.
+    "public.accounts(id, customer_id, balance)". Falls back to the raw text
+    (truncated) if the payload is not the expected JSON shape.
+    """
+    text = _result_text(result)
+    try:
+        tables = json.loads(text)
+    except (TypeError, ValueError):
+        return text[:SCHEMA_DIGEST_MAX_CHARS]
+
+    if isinstance(tables, dict):
+        tables = tables.get("tables", [])
+    if not isinstance(tables, list):
+        return text[:SCHEMA_DIGEST_MAX_CHARS]
+
+    lines = []
+    for table in tables:
+        if not isinstance(table, dict):
+            continue
+        name = f"{table.get('schema', 'public')}.{table.get('name', '?')}"
+        columns = [
+            column.get("name", "") if isinstance(column, dict) else str(column)
+            for column in table.get("columns") or []
+        ]
+        lines.append(f"{name}({', '.join(c for c in columns if c)})")
+    # Sorted so the digest (part of the cached system prompt) is byte-stable.
+    lines.sort()
+    return "\n".join(lines)[:SCHEMA_DIGEST_MAX_CHARS]
+
+
+def _with_session_pool(tool: Any) -> StructuredTool:
+    """Run each call on a session checked out from the pool."""
+
+    async def pooled_call(**arguments: Any) -> Any:
+        if _pool is None:
+            raise ToolException("MCP is not initialized")
+        with time_stage(f"mcp.{tool.name}"):
+            async with _pool.checkout() as slot:
+                return await slot.tools[tool.name].coroutine(**arguments)
+
+    return _wrap_tool(tool, pooled_call)
+
+
+def _with_schema_cache(tool: Any) -> StructuredTool:
+    """Serve list_tables from the in-process schema cache within the TTL."""
+
+    async def cached_list_tables(**arguments: Any) -> Any:
+        global _schema_digest
+        key = _cache_key(arguments)
+        entry = _schema_cache.get(key)
+        if entry is not None and time.monotonic() - entry[0] < settings.mcp_schema_cache_ttl_seconds:
+            logger.info("mcp:list_tables cache hit args=%s", key)
+            return entry[1]
+
+        result = await tool.coroutine(**arguments)
+        _schema_cache[key] = (time.monotonic(), result)
+        if key == _cache_key(DEFAULT_SCHEMA_ARGS):
+            _schema_digest = build_schema_digest(result)
+        logger.info("mcp:list_tables cache refreshed args=%s", key)
+        return result
+
+    return _wrap_tool(tool, cached_list_tables)
+
+
+def normalize_sql(query: str) -> str:
+    """Strip comments, collapse whitespace and drop a trailing semicolon."""
+    query = _SQL_COMMENT_RE.sub(" ", query or "")
+    query = _SQL_WHITESPACE_RE.sub(" ", query).strip()
+    return query.rstrip(";").strip()
+
+
+def is_pure_select(normalized_query: str) -> bool:
+    """
+    Conservative read-only check: a single SELECT statement with no
+    data-modifying or side-effecting keyword anywhere in it.
+    """
+    if not normalized_query.lower().startswith("select "):
+        return False
+    if ";" in normalized_query:
+        return False
+    return _SQL_WRITE_RE.search(normalized_query) is None
+
+
+def _with_sql_cache(tool: Any) -> StructuredTool:
+    """
+    Read-through cache for execute_sql, scoped to the customer of the run.
+    Only pure SELECTs are cached; everything else goes straight to MCP.
+    """
+
+    async def cached_execute_sql(config: RunnableConfig = None, **arguments: Any) -> Any:
+        configurable = (config or {}).get("configurable") or {}
+        scope = configurable.get("customer_id") or configurable.get("thread_id")
+        query = normalize_sql(str(arguments.get("query", "")))
+
+        if not scope or not is_pure_select(query):
+            return await tool.coroutine(**arguments)
+
+        other_args = {k: v for k, v in arguments.items() if k != "query"}
+        key = (scope, query, _cache_key(other_args))
+        cached = _sql_cache.get(key)
+        if cached is not None:
+            logger.info("mcp:execute_sql cache hit scope=%s", scope)
+            return cached
+
+        result = await tool.coroutine(**arguments)
+        _sql_cache.set(key, result)
+        return result
+
+    return _wrap_tool(tool, cached_execute_sql)
+
+
+def invalidate_sql_cache() -> None:
+    """Drop every cached execute_sql result."""
+    _sql_cache.clear()
+
+
+def get_sql_cache_metrics() -> Dict[str, Any]:
+    return {
+        "entries": len(_sql_cache),
+        "bytes": _sql_cache.total_bytes,
+        "hits": _sql_cache.hits,
+        "misses": _sql_cache.misses,
+    }
+
+
+def _expose_tools(tools: List[Any]) -> List[Any]:
+    """Only expose the two tools we want to use, wrapped with their caches."""
+    exposed = []
+    for tool in tools:
+        if tool.name not in EXPOSED_TOOL_NAMES:
+            continue
+        if tool.name == "list_tables":
+            tool = _with_schema_cache(tool)
+        elif tool.name == "execute_sql":
+            tool = _with_sql_cache(tool)
+        exposed.append(tool)
+    return exposed
+
+
+async def warm_schema_cache() -> str:
+    """
+    Fetch the public schema through list_tables once and cache it.
+    Call at startup so the first agent turn already has the schema digest.
+    """
+    tools = await get_mcp_tools()
+    list_tables = next((tool for tool in tools if tool.name == "list_tables"), None)
+    if list_tables is None:
+        raise RuntimeError("list_tables tool not found from MCP tools.")
+    await list_tables.coroutine(**DEFAULT_SCHEMA_ARGS)
+    logger.info("MCP schema cache warmed (digest_chars=%s)", len(_schema_digest))
+    return _schema_digest
+
+
+def invalidate_schema_cache() -> None:
+    """
+    Drop cached list_tables results, e.g. after a migration; the next agent
+    turn fetches the schema again. Exposed as POST /admin/cache/invalidate.
+    """
+    global _schema_digest, _schema_retry_at
+    _schema_cache.clear()
+    _schema_digest = ""
+    _schema_retry_at = 0.0
+    logger.info("MCP schema cache invalidated")
+
+
+def _schema_digest_fresh() -> bool:
+    entry = _schema_cache.get(_cache_key(DEFAULT_SCHEMA_ARGS))
+    return entry is not None and time.monotonic() - entry[0] < settings.mcp_schema_cache_ttl_seconds
+
+
+async def get_schema_digest() -> str:
+    """
+    Compact digest of the public schema for the system prompt. Refetched
+    through list_tables once MCP_SCHEMA_CACHE_TTL_SECONDS have passed or the
+    cache was invalidated; if that fails the previous digest ("" if none) is
+    served and the refresh retried later.
+    """
+    global _schema_retry_at
+    if _tools is None or _schema_digest_fresh() or time.monotonic() < _schema_retry_at:
+        return _schema_digest
+    async with _schema_refresh_lock:
+        if _schema_digest_fresh() or time.monotonic() < _schema_retry_at:
+            return _schema_digest
+        try:
+            await warm_schema_cache()
+        except Exception as exc:
+            _schema_retry_at = time.monotonic() + SCHEMA_RETRY_SECONDS
+            logger.warning("mcp:schema digest refresh failed %s: %s", type(exc).__name__, exc)
+    return _schema_digest
+
+
 async def get_mcp_tools() -> List[Any]:
     """Get cached tools; lazily initializes MCP if needed."""
     if _tools is None:
         await init_mcp()
 
-    # Only expose the two tools we want to use
-    tools = _tools or []
-    filtered_tools = [
-        tool for tool in tools if tool.name in ["execute_sql", "list_tables"]
-    ]
-    return filtered_tools
+    return _expose_tools(_tools or [])
 
 
 def get_mcp_tools_sync() -> List[Any]:
@@ -149,7 +660,7 @@ def get_mcp_tools_sync() -> List[Any]:
     Use this in synchronous contexts.
     """
     if _tools is not None:
-        return [tool for tool in _tools if tool.name in ["execute_sql", "list_tables"]]
+        return _expose_tools(_tools)
 
     try:
         loop = asyncio.get_running_loop()
@@ -162,8 +673,7 @@ def get_mcp_tools_sync() -> List[Any]:
             raise
 
     asyncio.run(init_mcp())
-    tools = _tools or []
-    return [tool for tool in tools if tool.name in ["execute_sql", "list_tables"]]
+    return _expose_tools(_tools or [])
 
 
 async def get_mcp_tool_node() -> ToolNode:
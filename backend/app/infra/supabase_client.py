@@ -1,10 +1,22 @@
-from supabase import create_client, Client
+from __future__ import annotations
+
+import asyncio
 import base64
 import json
 import logging
+from typing import TYPE_CHECKING
+
 from app.core.config import settings
 
-_supabase: Client | None = None
+# The supabase SDK is imported when the first client is created, keeping it
+# off the cold-start path for routes that never touch the database.
+if TYPE_CHECKING:
+    import httpx
+    from supabase import AsyncClient
+
+_async_supabase: AsyncClient | None = None
+_http_client: httpx.AsyncClient | None = None
+_async_init_lock = asyncio.Lock()
 _logger = logging.getLogger("supabase_client")
 
 
@@ -22,16 +34,62 @@ def _get_key_role(key: str) -> str | None:
     except Exception:
         return None
 
-def supabase() -> Client:
-    global _supabase
-    if _supabase is None:
-        service_key = settings.supabase_service_role_key
-        role = _get_key_role(service_key)
-        if role and role != "service_role":
-            _logger.warning(
-                "Supabase key role is %s; inserts into conversations may fail. "
-                "Ensure SUPABASE_SERVICE_ROLE_KEY is set to the service role key.",
-                role,
+def _warn_if_not_service_role(key: str) -> None:
+    role = _get_key_role(key)
+    if role and role != "service_role":
+        _logger.warning(
+            "Supabase key role is %s; inserts into conversations may fail. "
+            "Ensure SUPABASE_SERVICE_ROLE_KEY is set to the service role key.",
+            role,
+        )
+
+
+async def async_supabase() -> AsyncClient:
+    """
+    Get the process-wide async Supabase client.
+    All PostgREST calls share one httpx connection pool, so request handlers
+    never block the event loop waiting on a database round trip.
+    """
+    global _async_supabase, _http_client
+    if _async_supabase is not None:
+        return _async_supabase
+
+    async with _async_init_lock:
+        if _async_supabase is None:
+            import httpx
+            from supabase import AsyncClientOptions, acreate_client
+
+            service_key = settings.supabase_service_role_key
+            _warn_if_not_service_role(service_key)
+            _http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.supabase_max_connections,
+                    max_keepalive_connections=settings.supabase_max_keepalive_connections,
+                ),
+                timeout=settings.supabase_timeout_seconds,
+            )
+            _async_supabase = await acreate_client(
+                settings.supabase_url,
+                service_key,
+                options=AsyncClientOptions(httpx_client=_http_client),
             )
-        _supabase = create_client(settings.supabase_url, service_key)
-    return _supabase
+    return _async_supabase
+
+
+def set_async_supabase(client: AsyncClient | None) -> None:
+    """
+    Install the process-wide async client instead of connecting (e.g. an
+    in-memory stand-in for offline benchmarks). None resets to the default.
+    """
+    global _async_supabase
+    _async_supabase = client
+
+
+async def close_async_supabase() -> None:
+    """Close the shared connection pool. Call once at application shutdown."""
+    global _async_supabase, _http_client
+    async with _async_init_lock:
+        if _http_client is not None:
+            await _http_client.aclose()
+        _http_client = None
+        _async_supabase = None
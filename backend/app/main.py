@@ -12,26 +12,19 @@ from contextlib import asynccontextmanager
 
 from app.core.config import settings
 from app.routes.health import router as health_router
-from app.routes.chat import router as chat_router
-from app.routes.utils import init_logging
-from app.infra.mcp_supabase import shutdown_mcp, get_mcp_tools
-import uvicorn
-
-from langchain_groq import ChatGroq
-from langchain_anthropic import ChatAnthropic
-import os
-from app.agents.banking_agent.graphbuilder import BankingAgentGraphBuilder
-
-
-# llm = ChatAnthropic(
-#      model="claude-sonnet-4-5-20250929",
-#      api_key=os.getenv("CLAUDE_API_KEY"),
-# )
-
-llm = ChatGroq(
-   model="moonshotai/kimi-k2-instruct-0905",
-   api_key=os.getenv("GROQ_API_KEY"),
+from app.routes.chat import router as chat_router, run_queued_customer_messages
+from app.routes.metrics import router as metrics_router
+from app.routes.admin import router as admin_router
+from app.routes.utils import (
+    init_logging,
+    shutdown_logging,
+    get_error_logger,
+    update_conversation,
 )
+from app.agents.runtime import ensure_agent_runtime, close_agent_runtime
+from app.infra.supabase_client import close_async_supabase
+from app.infra.conversation_writer import start_conversation_writer, stop_conversation_writer
+from app.infra.agent_queue import start_agent_workers, stop_agent_workers
 
 
 @asynccontextmanager
@@ -39,30 +32,51 @@ async def lifespan(app: FastAPI):
     """
     Lifespan context manager for FastAPI app lifecycle.
     Startup:
-    - Open ONE persistent MCP session
-    - Load MCP tools bound to that session
-    - Filter to only execute_sql and list_tables
-    - Store filtered tools and ToolNode in app.state
+    - Start the write-behind flush for conversation last_message/updated_at
+    - MESSAGES_ASYNC_MODE: start the agent worker pool for 202-accepted messages
+    - BOOT_MODE=eager: initialize the agent runtime now (see app.agents.runtime):
+      MCP session pool and tools, schema cache warm-up, chat model,
+      checkpointer, compiled graph and conversation cache sync
+    - BOOT_MODE=lazy: defer all of that to the first chat request
 
     Shutdown:
-    - Close the persistent MCP session
+    - Let queued agent runs finish (bounded by AGENT_QUEUE_DRAIN_SECONDS)
+    - Flush pending conversation writes
+    - Close the agent runtime (cache sync, checkpointer, MCP sessions) if it was opened
+    - Close the shared Supabase HTTP connection pool
+    - Drain the logging queue
     """
     init_logging()
+    start_conversation_writer(update_conversation)
+    start_agent_workers(run_queued_customer_messages)
 
-    # Single MCP server (supabase), filtered to execute_sql and list_tables
-    app.state.mcp_tools = await get_mcp_tools() 
+    if settings.boot_mode.lower() != "lazy":
+        await ensure_agent_runtime(app)
 
-    app.state.llm = llm
+    yield
 
-    app.state.banking_agent_graph = BankingAgentGraphBuilder(llm, app.state.mcp_tools).build_graph()
+    try:
+        await stop_agent_workers()
+    except Exception as exc:
+        get_error_logger().warning("Agent worker pool shutdown failed: %s", exc)
 
-    yield
+    try:
+        await stop_conversation_writer()
+    except Exception as exc:
+        get_error_logger().warning("Conversation write-behind flush failed: %s", exc)
 
     try:
-        await shutdown_mcp()
+        await close_agent_runtime(app)
     except Exception:
         pass
 
+    try:
+        await close_async_supabase()
+    except Exception:
+        pass
+
+    shutdown_logging()
+
 
 app = FastAPI(title="Support API", lifespan=lifespan)
 
@@ -75,7 +89,11 @@ app.add_middleware(
 )
 
 app.include_router(health_router, tags=["health"])
+app.include_router(metrics_router, tags=["metrics"])
 app.include_router(chat_router, tags=["chat"])
+app.include_router(admin_router, tags=["admin"])
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=False)
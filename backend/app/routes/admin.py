@@ -0,0 +1,46 @@
+import secrets
+import sys
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Header, HTTPException
+
+from app.agents.response_cache import invalidate_response_cache
+from app.core.config import settings
+from app.routes.utils import get_app_logger
+
+router = APIRouter()
+
+CacheName = Literal["all", "schema", "sql", "response"]
+
+
+def require_admin(authorization: Optional[str]) -> None:
+    """Admin routes only exist when ADMIN_TOKEN is set and need it as a bearer token."""
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.strip(), settings.admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@router.post("/admin/cache/invalidate")
+def invalidate_cache(cache: CacheName = "all", authorization: Optional[str] = Header(None)):
+    """
+    Drop cached data on this process: the list_tables schema and prompt
+    digest ("schema", e.g. after a migration), execute_sql results ("sql")
+    and agent answers ("response").
+    """
+    require_admin(authorization)
+    invalidated = []
+    # Nothing MCP-related is cached before the agent runtime has started.
+    mcp = sys.modules.get("app.infra.mcp_supabase")
+    if cache in ("all", "schema") and mcp is not None:
+        mcp.invalidate_schema_cache()
+        invalidated.append("schema")
+    if cache in ("all", "sql") and mcp is not None:
+        mcp.invalidate_sql_cache()
+        invalidated.append("sql")
+    if cache in ("all", "response"):
+        invalidate_response_cache()
+        invalidated.append("response")
+    get_app_logger().info("admin:cache invalidated=%s", ",".join(invalidated) or "-")
+    return {"status": "ok", "invalidated": invalidated}
@@ -1,18 +1,33 @@
-from fastapi import APIRouter, HTTPException, Request
+import asyncio
+import json
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional
 
-from app.infra.supabase_client import supabase
+from app.agents import mailbox
+from app.agents.history import project_messages
+from app.agents.response_cache import lookup_response, store_response, turn_tool_names
+from app.agents.runtime import ensure_agent_runtime
+from app.core.config import settings
+from app.core.metrics import time_stage
+from app.infra import agent_queue
+from app.infra.supabase_client import async_supabase
 from app.routes.utils import (
     ensure_data,
-    now_iso,
-    get_conversation,
-    update_conversation,
+    get_conversation_recent,
+    list_all_messages,
+    list_messages_page,
+    MESSAGE_PAGE_DEFAULT_LIMIT,
+    MESSAGE_PAGE_MAX_LIMIT,
+    touch_conversation,
     insert_message,
     should_handoff_to_human,
-    build_handoff_summary,
+    handoff_conversation,
     get_app_logger,
     get_error_logger,
+    preview,
     AI_AGENT_ID,
 )
 
@@ -21,6 +36,11 @@ router = APIRouter()
 # Default agent ID for testing purposes (human agent)
 DEFAULT_AGENT_ID = "e66fa391-28b5-44ec-b3a9-4397c2f2d225"
 
+HANDOFF_ACK_MESSAGE = "I'm connecting you to a human agent now for further assistance."
+
+# Streamed agent turns still running (kept referenced after a client disconnects)
+_stream_turns: set[asyncio.Task] = set()
+
 
 class CreateConversationRequest(BaseModel):
     customer_id: str
@@ -39,7 +59,7 @@ class SendMessageRequest(BaseModel):
 
 
 @router.post("/conversations")
-def create_conversation(body: CreateConversationRequest):
+async def create_conversation(body: CreateConversationRequest):
     logger = get_app_logger()
     error_logger = get_error_logger()
     payload = {
@@ -59,7 +79,8 @@ def create_conversation(body: CreateConversationRequest):
     )
 
     try:
-        res = supabase().table("conversations").insert(payload).execute()
+        client = await async_supabase()
+        res = await client.table("conversations").insert(payload).execute()
         data = ensure_data(res, "Failed to create conversation")
     except Exception as exc:
         error_logger.exception("create_conversation:error %s", exc)
@@ -76,27 +97,27 @@ def create_conversation(body: CreateConversationRequest):
 
 
 @router.get("/conversations/{conversation_id}/messages")
-def list_messages(conversation_id: str):
-    res = (
-        supabase()
-        .table("messages")
-        .select("*")
-        .eq("conversation_id", conversation_id)
-        .order("created_at", desc=False)
-        .execute()
+async def list_messages(
+    conversation_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=MESSAGE_PAGE_MAX_LIMIT, description="Page size; returns a page object instead of the full list"),
+    before: Optional[str] = Query(None, description="Cursor: return messages older than this one"),
+    after: Optional[str] = Query(None, description="Cursor: return messages newer than this one"),
+    fields: Optional[str] = Query(None, description="Comma-separated message columns to return"),
+):
+    # Without limit/before/after keep the original response: a bare list of all messages.
+    if limit is None and before is None and after is None:
+        return await list_all_messages(conversation_id, fields=fields)
+    return await list_messages_page(
+        conversation_id,
+        limit=limit or MESSAGE_PAGE_DEFAULT_LIMIT,
+        before=before,
+        after=after,
+        fields=fields,
     )
-    if hasattr(res, "error") and res.error:
-        raise HTTPException(status_code=500, detail=str(res.error))
-    return res.data or []
 
 
-@router.post("/messages")
-async def send_message(body: SendMessageRequest, request: Request):
-    logger = get_app_logger()
-    error_logger = get_error_logger()
-    # -------------------------
-    # 1) Validate request
-    # -------------------------
+def validate_message_sender(body: SendMessageRequest) -> str:
+    """Validate sender fields and return the normalized sender_type."""
     sender_type = (body.sender_type or "").strip().lower()
 
     if sender_type == "customer":
@@ -108,48 +129,27 @@ async def send_message(body: SendMessageRequest, request: Request):
         # Normalize non-customer senders: agent/ai/system should always have a sender_agent_id
         if not body.sender_agent_id or body.sender_customer_id is not None:
             raise HTTPException(400, "non-customer message requires sender_agent_id only")
+    return sender_type
 
-    # If it's not a CUSTOMER message, we're done (human/ai/system messages just get stored)
-    if sender_type != "customer":
-        incoming_payload = {
-            "conversation_id": body.conversation_id,
-            "sender_type": sender_type,
-            "sender_customer_id": body.sender_customer_id,
-            "sender_agent_id": body.sender_agent_id,
-            "content": body.content,
-            "is_internal": body.is_internal,
-        }
-        try:
-            inserted_message = insert_message(incoming_payload)
-        except Exception as exc:
-            error_logger.exception("messages:non_customer error %s", exc)
-            raise
-
-        # Always update conversation.last_message/updated_at
-        update_conversation(
-            body.conversation_id,
-            {"last_message": body.content[:200], "updated_at": now_iso()},
-        )
 
-        logger.info(
-            "========== [NON-CUSTOMER MESSAGE STORED] ========== conversation_id=%s sender_type=%s message_id=%s",
-            body.conversation_id,
-            sender_type,
-            inserted_message.get("id"),
-        )
-        return inserted_message
-
-    # Persist incoming customer message immediately.
+async def persist_customer_message(body: SendMessageRequest, touch: bool = True) -> dict:
+    """
+    Insert the incoming customer message and bump conversation.last_message.
+    With touch=False the caller bumps it once the turn has an outcome (see
+    process_customer_message), so an AI turn writes the row only once.
+    """
+    logger = get_app_logger()
+    error_logger = get_error_logger()
     incoming_payload = {
         "conversation_id": body.conversation_id,
-        "sender_type": sender_type,
+        "sender_type": "customer",
         "sender_customer_id": body.sender_customer_id,
         "sender_agent_id": None,
         "content": body.content,
         "is_internal": body.is_internal,
     }
     try:
-        inserted_message = insert_message(incoming_payload)
+        inserted_message = await insert_message(incoming_payload)
         logger.info(
             "========== [CUSTOMER MESSAGE INSERTED] ========== conversation_id=%s message_id=%s",
             body.conversation_id,
@@ -159,227 +159,649 @@ async def send_message(body: SendMessageRequest, request: Request):
         error_logger.exception("========== [CUSTOMER MESSAGE INSERT ERROR] ========== conversation_id=%s error=%s", body.conversation_id, exc)
         raise
 
-    # Always update conversation.last_message/updated_at
-    update_conversation(
-        body.conversation_id,
-        {"last_message": body.content[:200], "updated_at": now_iso()},
-    )
+    if touch:
+        await touch_conversation(body.conversation_id, body.content)
+    return inserted_message
 
-    # -------------------------
-    # 2) Orchestrate ONLY for customer messages
-    # -------------------------
+
+async def touch_customer_message(conversation_id: str, content: str) -> None:
+    """Deferred last_message bump for a customer message whose turn produced no reply."""
     try:
-        conv = get_conversation(body.conversation_id)
+        await touch_conversation(conversation_id, content)
+    except Exception as exc:
+        get_error_logger().warning(
+            "messages:touch_conversation failed conversation_id=%s %s: %s",
+            conversation_id,
+            type(exc).__name__,
+            exc,
+        )
+
+
+async def load_conversation_for_routing(body: SendMessageRequest) -> dict:
+    logger = get_app_logger()
+    error_logger = get_error_logger()
+    try:
+        conv = await get_conversation_recent(
+            body.conversation_id, settings.agent_history_messages, fresh_handling_mode=True
+        )
     except Exception as exc:
         error_logger.exception("========== [LOAD CONVERSATION ERROR] ========== conversation_id=%s error=%s", body.conversation_id, exc)
         raise
     
     # Log conversation state when first retrieved
-    handling_mode = conv.get("handling_mode")
-    sender_id = body.sender_customer_id if body.sender_customer_id else body.sender_agent_id
     logger.info(
         "========== [STAGE 1: CONVERSATION LOADED] ========== conversation_id=%s sender_type=%s sender_id=%s handling_mode=%s",
         body.conversation_id,
-        sender_type,
-        sender_id,
-        handling_mode,
+        "customer",
+        body.sender_customer_id,
+        conv.get("handling_mode"),
     )
     
-    logger.info(
+    logger.debug(
         "messages:history preview=%s",
-        str(conv.get("messages") or [])[:500],
+        preview(conv.get("messages") or []),
     )
+    return conv
 
-    # If conversation is already in human-handling mode, do not call AI.
-    is_human_handling = handling_mode == "human"
 
-    # -------------------------
-    # 3) Router decision: AI vs handoff
-    # -------------------------
+async def hand_off_to_human(conversation_id: str, handling_mode: Optional[str]) -> dict:
+    """
+    Switch the conversation to human handling and notify agent and customer.
+    Returns the handoff result (handling_mode, summary_message_id, ack_message_id).
+    """
+    logger = get_app_logger()
+    error_logger = get_error_logger()
+
+    # Mode switch, internal summary, customer acknowledgement and last_message
+    # are applied together in one transactional call.
+    logger.info(
+        "========== [STAGE 3: HANDOFF UPDATE - BEFORE] ========== conversation_id=%s from handling_mode=%s to handling_mode=human",
+        conversation_id,
+        handling_mode,
+    )
     try:
-        needs_human, reason = should_handoff_to_human(
-            getattr(request.app.state, "llm", None),
-            conv.get("messages") or [],
-            body.content,
-        )
+        result = await handoff_conversation(conversation_id, HANDOFF_ACK_MESSAGE)
     except Exception as exc:
-        error_logger.exception("========== [STAGE 2: ROUTING DECISION ERROR] ========== conversation_id=%s error=%s", body.conversation_id, exc)
+        error_logger.exception(
+            "========== [STAGE 3: HANDOFF UPDATE - ERROR] ========== conversation_id=%s error=%s",
+            conversation_id,
+            exc,
+        )
         raise
 
-
-    
     logger.info(
-        "========== [STAGE 2: ROUTING DECISION] ========== conversation_id=%s is_human_handling=%s needs_human=%s reason=%s",
-        body.conversation_id,
-        is_human_handling,
-        needs_human,
-        reason,
+        "========== [STAGE 3: HANDOFF UPDATE - AFTER] ========== conversation_id=%s handling_mode after update=%s summary_message_id=%s ack_message_id=%s",
+        conversation_id,
+        result.get("handling_mode"),
+        result.get("summary_message_id"),
+        result.get("ack_message_id"),
     )
+    return result
+
+
+def handoff_response(customer_message_id: Optional[str], handoff: Optional[dict] = None) -> dict:
+    """
+    Reply payload for a customer message routed to a human. handoff is the
+    result of hand_off_to_human, or None when a human already had the
+    conversation (nothing was sent to the customer).
+    """
+    return {
+        "status": "handoff",
+        "customer_message_id": customer_message_id,
+        "ai_reply": HANDOFF_ACK_MESSAGE if handoff is not None else None,
+        "ai_message_id": handoff.get("ack_message_id") if handoff is not None else None,
+    }
+
+
+async def persist_ai_reply(conversation_id: str, ai_reply_text: str) -> dict:
+    """Store the AI reply and bump conversation.last_message."""
+    error_logger = get_error_logger()
+    try:
+        ai_msg = await insert_message(
+            {
+                "conversation_id": conversation_id,
+                "sender_type": "ai",
+                "sender_customer_id": None,
+                "sender_agent_id": AI_AGENT_ID,
+                "content": ai_reply_text,
+                "is_internal": False,
+            }
+        )
+    except Exception as exc:
+        error_logger.exception("messages:ai_insert error %s", exc)
+        raise
+
+    await touch_conversation(conversation_id, ai_reply_text)
+    return ai_msg
+
+
+@router.post("/messages")
+async def send_message(body: SendMessageRequest, request: Request):
+    logger = get_app_logger()
+    error_logger = get_error_logger()
+    # -------------------------
+    # 1) Validate request
+    # -------------------------
+    sender_type = validate_message_sender(body)
+
+    # If it's not a CUSTOMER message, we're done (human/ai/system messages just get stored)
+    if sender_type != "customer":
+        incoming_payload = {
+            "conversation_id": body.conversation_id,
+            "sender_type": sender_type,
+            "sender_customer_id": body.sender_customer_id,
+            "sender_agent_id": body.sender_agent_id,
+            "content": body.content,
+            "is_internal": body.is_internal,
+        }
+        try:
+            inserted_message = await insert_message(incoming_payload)
+        except Exception as exc:
+            error_logger.exception("messages:non_customer error %s", exc)
+            raise
+
+        # Always update conversation.last_message/updated_at
+        await touch_conversation(body.conversation_id, body.content)
 
-    if is_human_handling:
-        # Customer message persisted; a human will reply via call-center UI
         logger.info(
-            "========== [STAGE 3: ALREADY IN HUMAN MODE] ========== conversation_id=%s customer_message_id=%s",
+            "========== [NON-CUSTOMER MESSAGE STORED] ========== conversation_id=%s sender_type=%s message_id=%s",
             body.conversation_id,
+            sender_type,
             inserted_message.get("id"),
         )
+        return inserted_message
+
+    if agent_queue.is_running():
+        # MESSAGES_ASYNC_MODE: accept now, answer from the worker pool.
+        if not agent_queue.has_capacity():
+            raise HTTPException(503, "Too many pending messages", headers={"Retry-After": "5"})
+        inserted_message = await persist_customer_message(body)
+        job = {"app": request.app, "body": body, "customer_message": inserted_message}
+        if agent_queue.submit(body.conversation_id, job):
+            logger.info(
+                "========== [CUSTOMER MESSAGE QUEUED] ========== conversation_id=%s customer_message_id=%s pending=%s",
+                body.conversation_id,
+                inserted_message.get("id"),
+                agent_queue.pending_count(),
+            )
+            return JSONResponse(
+                status_code=202,
+                content={
+                    "status": "accepted",
+                    "customer_message_id": inserted_message.get("id"),
+                    "ai_reply": None,
+                    "ai_message_id": None,
+                },
+            )
+        # The pool filled up or stopped since the check; answer inline.
+        await ensure_agent_runtime(request.app)
+        return await process_customer_message(request.app, body, inserted_message)
+
+    # Make sure the chat model, MCP tools and graph exist (BOOT_MODE=lazy
+    # defers them to the first chat request).
+    await ensure_agent_runtime(request.app)
+
+    # Persist incoming customer message immediately; the conversation row is
+    # written once, by whatever answers the batch.
+    inserted_message = await persist_customer_message(body, touch=False)
+
+    # Messages sent in a burst are answered by one run; earlier requests of
+    # the burst return "coalesced" and the newest one carries the reply.
+    result = await mailbox.submit(
+        body.conversation_id,
+        (body, inserted_message),
+        lambda batch: process_customer_batch(request.app, batch, touch_pending=True),
+    )
+    if result is mailbox.COALESCED:
         return {
-            "status": "handoff",
+            "status": "coalesced",
             "customer_message_id": inserted_message.get("id"),
             "ai_reply": None,
             "ai_message_id": None,
         }
+    return result
+
+
+async def run_queued_customer_messages(jobs: list[dict]) -> None:
+    """Worker-pool handler for messages accepted with 202 (one conversation per batch)."""
+    app = jobs[-1]["app"]
+    await ensure_agent_runtime(app)
+    await process_customer_batch(app, [(job["body"], job["customer_message"]) for job in jobs])
+
+
+async def process_customer_batch(
+    app, batch: list[tuple[SendMessageRequest, dict]], touch_pending: bool = False
+) -> dict:
+    """Answer stored customer messages of one conversation with a single run."""
+    body, inserted_message = batch[-1]
+    if len(batch) > 1:
+        merged = "\n".join(item_body.content for item_body, _ in batch)
+        body = body.model_copy(update={"content": merged})
+    return await process_customer_message(app, body, inserted_message, touch_pending)
+
+
+async def process_customer_message(
+    app, body: SendMessageRequest, inserted_message: dict, touch_pending: bool = False
+) -> dict:
+    """
+    Route a stored customer message and produce the AI reply or handoff.
+    Runs inside the request, or on the agent worker pool in MESSAGES_ASYNC_MODE.
+
+    touch_pending: the customer message has not bumped conversation.last_message
+    yet. The AI reply or the handoff then writes the row in its place; if the
+    turn ends with neither, the customer message is written on the way out.
+    """
+    logger = get_app_logger()
+    error_logger = get_error_logger()
+    conversation_written = not touch_pending
 
-    if needs_human:
-        # 4a) Mark conversation as handed off
-        logger.info(
-            "========== [STAGE 3: HANDOFF UPDATE - BEFORE] ========== conversation_id=%s from handling_mode=%s to handling_mode=human",
-            body.conversation_id,
-            handling_mode,
+    # -------------------------
+    # 2) Orchestrate ONLY for customer messages
+    # -------------------------
+    conv = await load_conversation_for_routing(body)
+    handling_mode = conv.get("handling_mode")
+
+    # If conversation is already in human-handling mode, do not call AI.
+    is_human_handling = handling_mode == "human"
+
+    # A generic question answered before is served from the response cache
+    # (still subject to the router below), so the agent is not started.
+    cached_reply = None if is_human_handling else cached_agent_reply(body.content)
+
+    # Speculatively start the agent graph so history summarization overlaps
+    # with the router call; the answer step waits on route_gate.
+    agent_graph = getattr(app.state, "banking_agent_graph", None)
+    agent_task: Optional[asyncio.Task] = None
+    route_gate: Optional[asyncio.Future] = None
+    if (
+        settings.speculative_pipeline
+        and not is_human_handling
+        and cached_reply is None
+        and agent_graph is not None
+    ):
+        route_gate = asyncio.get_running_loop().create_future()
+        agent_task = asyncio.create_task(
+            invoke_banking_agent(
+                agent_graph,
+                body.conversation_id,
+                conv.get("customer_id") or "",
+                body.content,
+                conv.get("messages") or [],
+                route_gate=route_gate,
+            )
         )
+
+    # Whatever ends this turn early (handoff, errors, cancellation), the
+    # speculative run must not be left waiting on route_gate.
+    try:
+        # -------------------------
+        # 3) Router decision: AI vs handoff
+        # -------------------------
         try:
-            update_conversation(
-                body.conversation_id,
-                {
-                    "handling_mode": "human",
-                    "updated_at": now_iso(),
-                },
+            needs_human, reason = await should_handoff_to_human(
+                getattr(app.state, "router_llm", None),
+                conv.get("messages") or [],
+                body.content,
             )
-            # Verify the update by fetching the conversation again
-            updated_conv = get_conversation(body.conversation_id)
-            updated_handling_mode = updated_conv.get("handling_mode")
+        except Exception as exc:
+            error_logger.exception("========== [STAGE 2: ROUTING DECISION ERROR] ========== conversation_id=%s error=%s", body.conversation_id, exc)
+            raise
+
+
+
+        logger.info(
+            "========== [STAGE 2: ROUTING DECISION] ========== conversation_id=%s is_human_handling=%s needs_human=%s reason=%s",
+            body.conversation_id,
+            is_human_handling,
+            needs_human,
+            reason,
+        )
+
+        if is_human_handling:
+            # Customer message persisted; a human will reply via call-center UI
             logger.info(
-                "========== [STAGE 3: HANDOFF UPDATE - AFTER] ========== conversation_id=%s handling_mode after update=%s",
+                "========== [STAGE 3: ALREADY IN HUMAN MODE] ========== conversation_id=%s customer_message_id=%s",
                 body.conversation_id,
-                updated_handling_mode,
+                inserted_message.get("id"),
             )
-        except Exception as exc:
-            error_logger.exception(
-                "========== [STAGE 3: HANDOFF UPDATE - ERROR] ========== conversation_id=%s error=%s",
+            return handoff_response(inserted_message.get("id"))
+
+        if needs_human:
+            await cancel_speculative_agent(agent_task)
+            handoff = await hand_off_to_human(body.conversation_id, handling_mode)
+            conversation_written = True
+
+            logger.info(
+                "========== [STAGE 4: HANDOFF COMPLETE] ========== conversation_id=%s customer_message_id=%s",
                 body.conversation_id,
-                exc,
+                inserted_message.get("id"),
             )
-            raise
+            return handoff_response(inserted_message.get("id"), handoff)
 
-        # 4b) Create internal handoff summary for the human agent
+        # -------------------------
+        # 5) AI answers
+        # -------------------------
         try:
-            summary_text = build_handoff_summary(body.conversation_id)
-            insert_message(
-                {
-                    "conversation_id": body.conversation_id,
-                    "sender_type": "ai",
-                    "sender_customer_id": None,
-                    "sender_agent_id": AI_AGENT_ID,
-                    "content": summary_text,
-                    "is_internal": True,
-                }
-            )
+            if cached_reply is not None:
+                ai_reply_text = cached_reply
+            elif agent_task is not None:
+                route_gate.set_result(True)
+                ai_reply_text = await agent_task
+            else:
+                ai_reply_text = await invoke_banking_agent(
+                    agent_graph,
+                    body.conversation_id,
+                    conv.get("customer_id") or "",
+                    body.content,
+                    conv.get("messages") or [],
+                )
         except Exception as exc:
-            error_logger.exception("========== [STAGE 3: HANDOFF SUMMARY ERROR] ========== conversation_id=%s error=%s", body.conversation_id, exc)
+            error_logger.exception("messages:ai_invoke error %s", exc)
             raise
 
-        # 4c) Optionally send a customer-visible message acknowledging handoff
-        try:
-            insert_message(
-                {
-                    "conversation_id": body.conversation_id,
-                    "sender_type": "ai",
-                    "sender_customer_id": None,
-                    "sender_agent_id": AI_AGENT_ID,
-                    "content": "I'm connecting you to a human agent now for further assistance.",
-                    "is_internal": False,
-                }
-            )
-        except Exception as exc:
-            error_logger.exception("========== [STAGE 3: HANDOFF ACK ERROR] ========== conversation_id=%s error=%s", body.conversation_id, exc)
-            raise
+        ai_msg = await persist_ai_reply(body.conversation_id, ai_reply_text)
+        conversation_written = True
 
         logger.info(
-            "========== [STAGE 4: HANDOFF COMPLETE] ========== conversation_id=%s customer_message_id=%s",
+            "========== [STAGE 4: AI RESPONSE COMPLETE] ========== conversation_id=%s customer_message_id=%s ai_message_id=%s ai_reply=%s",
             body.conversation_id,
             inserted_message.get("id"),
+            ai_msg.get("id"),
+            ai_reply_text,
         )
-        return inserted_message
 
-    # -------------------------
-    # 5) AI answers
-    # -------------------------
-    agent_graph = getattr(request.app.state, "banking_agent_graph", None)
+        # Return a consistent schema for all customer messages.
+        return {
+            "status": "ai",
+            "customer_message_id": inserted_message.get("id"),
+            "ai_reply": ai_reply_text,
+            "ai_message_id": ai_msg.get("id"),
+        }
+    finally:
+        if route_gate is None or not route_gate.done():
+            await cancel_speculative_agent(agent_task)
+        if not conversation_written:
+            await touch_customer_message(body.conversation_id, inserted_message.get("content") or body.content)
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Encode one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/messages/stream")
+async def send_message_stream(body: SendMessageRequest, request: Request):
+    """
+    Streaming variant of POST /messages for customer messages.
+
+    Emits SSE frames:
+    - message: the stored customer message id
+    - token:   incremental text from answer_user_query
+    - done:    final status, ai_reply and ai_message_id (after persistence),
+               the same payload POST /messages returns
+    - error:   the run failed; nothing was persisted for the AI reply
+
+    The reply is produced and stored even if the client disconnects mid-stream.
+    """
+    logger = get_app_logger()
+    error_logger = get_error_logger()
+
+    sender_type = validate_message_sender(body)
+    if sender_type != "customer":
+        raise HTTPException(400, "streaming is only supported for customer messages")
+
+    await ensure_agent_runtime(request.app)
+    # The conversation row is written once, with the turn's outcome.
+    inserted_message = await persist_customer_message(body, touch=False)
+    conv = await load_conversation_for_routing(body)
+    handling_mode = conv.get("handling_mode")
+    is_human_handling = handling_mode == "human"
+
     try:
-        ai_reply_text = await invoke_banking_agent(
-            agent_graph,
-            body.conversation_id,
-            conv.get("customer_id") or "",
-            body.content,
+        needs_human, reason = await should_handoff_to_human(
+            getattr(request.app.state, "router_llm", None),
             conv.get("messages") or [],
+            body.content,
         )
     except Exception as exc:
-        error_logger.exception("messages:ai_invoke error %s", exc)
+        error_logger.exception("========== [STAGE 2: ROUTING DECISION ERROR] ========== conversation_id=%s error=%s", body.conversation_id, exc)
         raise
 
-    try:
-        ai_msg = insert_message(
-            {
-                "conversation_id": body.conversation_id,
-                "sender_type": "ai",
-                "sender_customer_id": None,
-                "sender_agent_id": AI_AGENT_ID,
-                "content": ai_reply_text,
-                "is_internal": False,
-            }
+    logger.info(
+        "========== [STAGE 2: ROUTING DECISION] ========== conversation_id=%s is_human_handling=%s needs_human=%s reason=%s",
+        body.conversation_id,
+        is_human_handling,
+        needs_human,
+        reason,
+    )
+
+    customer_message_id = inserted_message.get("id")
+
+    if is_human_handling or needs_human:
+        # Applied before responding, so a client that goes away cannot skip it.
+        if is_human_handling:
+            handoff = None
+            await touch_customer_message(body.conversation_id, inserted_message.get("content") or body.content)
+        else:
+            handoff = await hand_off_to_human(body.conversation_id, handling_mode)
+        return sse_response(
+            [
+                format_sse("message", {"customer_message_id": customer_message_id}),
+                format_sse("done", handoff_response(customer_message_id, handoff)),
+            ]
         )
-    except Exception as exc:
-        error_logger.exception("messages:ai_insert error %s", exc)
-        raise
 
-    update_conversation(
-        body.conversation_id,
-        {"last_message": ai_reply_text[:200], "updated_at": now_iso()},
+    # The turn runs in its own task and the response only relays its frames:
+    # if the client disconnects, the reply is still persisted, matching the
+    # graph checkpoint (POST /messages gets the same from asyncio.shield).
+    frames: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+    turn = asyncio.create_task(
+        stream_agent_turn(
+            getattr(request.app.state, "banking_agent_graph", None),
+            body,
+            conv,
+            customer_message_id,
+            frames,
+        )
     )
+    _stream_turns.add(turn)
+    turn.add_done_callback(_stream_turns.discard)
 
-    logger.info(
-        "========== [STAGE 4: AI RESPONSE COMPLETE] ========== conversation_id=%s customer_message_id=%s ai_message_id=%s ai_reply=%s",
-        body.conversation_id,
-        inserted_message.get("id"),
-        ai_msg.get("id"),
-        ai_reply_text,
+    async def relay():
+        yield format_sse("message", {"customer_message_id": customer_message_id})
+        while True:
+            frame = await frames.get()
+            if frame is None:
+                return
+            yield frame
+
+    return sse_response(relay())
+
+
+def sse_response(frames) -> StreamingResponse:
+    return StreamingResponse(
+        frames,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    # Return a consistent schema for all customer messages.
+
+async def stream_agent_turn(
+    agent_graph,
+    body: SendMessageRequest,
+    conv: dict,
+    customer_message_id: Optional[str],
+    frames: "asyncio.Queue[Optional[str]]",
+) -> None:
+    """
+    Answer a customer message routed to the AI, putting token/done/error SSE
+    frames on frames and None when finished. Persists the reply whether or
+    not anyone is still reading; without a reply the customer message bumps
+    conversation.last_message instead.
+    """
+    logger = get_app_logger()
+    error_logger = get_error_logger()
+    customer_id = conv.get("customer_id") or ""
+    ai_msg = None
+    try:
+        cached_reply = cached_agent_reply(body.content)
+        if cached_reply is not None:
+            ai_msg = await persist_ai_reply(body.conversation_id, cached_reply)
+            frames.put_nowait(format_sse("token", {"content": cached_reply}))
+            frames.put_nowait(
+                format_sse(
+                    "done",
+                    {
+                        "status": "ai",
+                        "customer_message_id": customer_message_id,
+                        "ai_reply": cached_reply,
+                        "ai_message_id": ai_msg.get("id"),
+                    },
+                )
+            )
+            return
+
+        if agent_graph is None:
+            frames.put_nowait(format_sse("error", {"detail": "Banking agent graph not found"}))
+            return
+
+        config = build_agent_config(body.conversation_id, customer_id)
+        state = build_agent_input(customer_id, body.content, conv.get("messages") or [])
+        try:
+            async for event in agent_graph.astream_events(state, config=config, version="v2"):
+                if event["event"] != "on_chat_model_stream":
+                    continue
+                if event.get("metadata", {}).get("langgraph_node") != "answer_user_query":
+                    continue
+                text = getattr(event["data"].get("chunk"), "content", None)
+                if isinstance(text, str) and text:
+                    frames.put_nowait(format_sse("token", {"content": text}))
+
+            final_state = await agent_graph.aget_state(config)
+            messages = final_state.values.get("messages") or []
+            ai_reply_text = messages[-1].content if messages else ""
+            ai_msg = await persist_ai_reply(body.conversation_id, ai_reply_text)
+            if not final_state.values.get("budget_exhausted"):
+                store_response(body.content, ai_reply_text, turn_tool_names(messages), customer_id)
+        except Exception as exc:
+            error_logger.exception("messages:stream error conversation_id=%s error=%s", body.conversation_id, exc)
+            frames.put_nowait(format_sse("error", {"detail": str(exc)}))
+            return
+
+        logger.info(
+            "========== [STAGE 4: AI RESPONSE STREAMED] ========== conversation_id=%s customer_message_id=%s ai_message_id=%s",
+            body.conversation_id,
+            customer_message_id,
+            ai_msg.get("id"),
+        )
+        frames.put_nowait(
+            format_sse(
+                "done",
+                {
+                    "status": "ai",
+                    "customer_message_id": customer_message_id,
+                    "ai_reply": ai_reply_text,
+                    "ai_message_id": ai_msg.get("id"),
+                },
+            )
+        )
+    finally:
+        if ai_msg is None:
+            await touch_customer_message(body.conversation_id, body.content)
+        frames.put_nowait(None)
+
+
+async def cancel_speculative_agent(agent_task: Optional[asyncio.Task]) -> None:
+    """Cancel a speculatively started agent run and wait for it to unwind."""
+    if agent_task is None:
+        return
+    if not agent_task.done():
+        agent_task.cancel()
+    try:
+        await agent_task
+    except asyncio.CancelledError:
+        pass
+    except Exception as exc:
+        get_error_logger().warning("messages:speculative_agent cancel error %s", exc)
+
+
+def build_agent_input(
+    customer_id: str,
+    customer_text: str,
+    conversation_messages: list[dict],
+) -> dict:
+    # summarized_conversation_history is intentionally omitted so the value
+    # stored in the checkpoint for this thread is reused and only extended.
+    # Raw rows are projected so checkpoints don't store every Supabase column.
     return {
-        "status": "ai",
-        "customer_message_id": inserted_message.get("id"),
-        "ai_reply": ai_reply_text,
-        "ai_message_id": ai_msg.get("id"),
+        "messages": [],
+        "customer_id": customer_id,
+        "user_query": customer_text,
+        "raw_conversation_history": project_messages(conversation_messages),
+        # Fresh tool-loop budget for every message.
+        "tool_iterations": 0,
+        "turn_tokens": 0,
+        "turn_started_at": 0.0,
+        "budget_exhausted": "",
     }
 
 
+def build_agent_config(
+    conversation_id: str,
+    customer_id: str = "",
+    route_gate: Optional[asyncio.Future] = None,
+) -> dict:
+    # customer_id scopes the execute_sql result cache to this customer.
+    configurable = {"thread_id": conversation_id, "customer_id": customer_id}
+    if route_gate is not None:
+        configurable["route_gate"] = route_gate
+    config: dict = {"configurable": configurable}
+    if settings.agent_max_tool_iterations:
+        # Hard backstop under the tool budget: summarize, one answer + tools
+        # step per iteration, and the final answer.
+        config["recursion_limit"] = 2 * settings.agent_max_tool_iterations + 4
+    return config
+
+
 async def invoke_banking_agent(
     agent_graph,
     conversation_id: str,
     customer_id: str,
     customer_text: str,
     conversation_messages: list[dict],
+    route_gate: Optional[asyncio.Future] = None,
 ) -> str:
     if agent_graph is None:
         return "Error: Banking agent graph not found"
 
-    state = {
-        "messages": [],
-        "customer_id": customer_id,
-        "user_query": customer_text,
-        "raw_conversation_history": conversation_messages,
-        "summarized_conversation_history": [],
-    }
+    state = build_agent_input(customer_id, customer_text, conversation_messages)
     logger = get_app_logger()
-    logger.info(
+    logger.debug(
         "banking_agent:invoke state_preview=%s",
-        str(state)[:500],
-    )
-    result = await agent_graph.ainvoke(
-        state,
-        config={"configurable": {"thread_id": conversation_id}},
+        preview(state),
     )
+    with time_stage("agent.graph"):
+        result = await agent_graph.ainvoke(
+            state,
+            config=build_agent_config(conversation_id, customer_id, route_gate),
+        )
     
-    msg = result["messages"][-1].content if result.get("messages") else ""
+    messages = result.get("messages") or []
+    msg = messages[-1].content if messages else ""
+    # Only reached on the "agent" route; the cache rejects answers that
+    # needed customer data (execute_sql) or questions that aren't generic.
+    # Answers cut short by the tool budget are never cached.
+    if not result.get("budget_exhausted") and store_response(
+        customer_text, msg, turn_tool_names(messages), customer_id
+    ):
+        logger.info("response_cache:store conversation_id=%s", conversation_id)
     return msg
+
+
+def cached_agent_reply(customer_text: str) -> Optional[str]:
+    """Answer to an equivalent generic question from the response cache, if any."""
+    with time_stage("agent.response_cache"):
+        reply = lookup_response(customer_text)
+    if reply is not None:
+        get_app_logger().info("response_cache:hit")
+    return reply
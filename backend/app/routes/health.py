@@ -1,18 +1,33 @@
 from fastapi import APIRouter
-from app.infra.supabase_client import supabase
 
 router = APIRouter()
 
+# /health must stay import-light so it can answer during a cold start;
+# the DB and MCP checks import their clients on demand.
+
 @router.get("/health")
 def health():
     return {"status": "ok"}
 
 @router.get("/health/db")
-def health_db():
+async def health_db():
+    from app.infra.supabase_client import async_supabase
+
     try:
         # lightweight connectivity check
-        supabase().table("customers").select("id").limit(1).execute()
+        client = await async_supabase()
+        await client.table("customers").select("id").limit(1).execute()
         return {"status": "ok", "db": "ok"}
     except Exception as e:
         # demo-friendly: return JSON instead of raising
         return {"status": "degraded", "db": "error", "detail": str(e)}
+
+@router.get("/health/mcp")
+def health_mcp():
+    from app.infra.mcp_supabase import get_mcp_pool_metrics
+
+    metrics = get_mcp_pool_metrics()
+    if not metrics:
+        return {"status": "degraded", "mcp": "not_initialized"}
+    status = "ok" if metrics["open"] > 0 else "degraded"
+    return {"status": status, "mcp": metrics}
@@ -0,0 +1,49 @@
+import sys
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.agents.mailbox import get_mailbox_metrics
+from app.agents.response_cache import get_response_cache_metrics
+from app.core.metrics import render_gauges, render_prometheus
+from app.infra import agent_queue, conversation_writer
+from app.routes.utils import get_conversation_cache_metrics
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    gauges = []
+    # Don't pull in the MCP stack just to report it (BOOT_MODE=lazy).
+    mcp = sys.modules.get("app.infra.mcp_supabase")
+    if mcp is not None:
+        gauges += render_gauges("support_mcp_pool", mcp.get_mcp_pool_metrics(), "MCP session pool snapshot.")
+        gauges += render_gauges(
+            "support_mcp_sql_cache", mcp.get_sql_cache_metrics(), "execute_sql result cache snapshot."
+        )
+    cassette = sys.modules.get("app.infra.cassette")
+    if cassette is not None:
+        gauges += render_gauges(
+            "support_cassette", cassette.get_cassette_metrics(), "Recorded/replayed LLM and MCP calls."
+        )
+    gauges += render_gauges(
+        "support_conversation_cache", get_conversation_cache_metrics(), "Conversation cache snapshot."
+    )
+    gauges += render_gauges(
+        "support_response_cache", get_response_cache_metrics(), "Agent response cache snapshot."
+    )
+    gauges += render_gauges(
+        "support_conversation_writer",
+        {"pending": conversation_writer.pending_count()},
+        "Conversations with unflushed last_message writes.",
+    )
+    gauges += render_gauges(
+        "support_mailbox", get_mailbox_metrics(), "Customer messages waiting to be coalesced."
+    )
+    gauges += render_gauges(
+        "support_agent_queue", agent_queue.get_agent_queue_metrics(), "Agent worker pool snapshot."
+    )
+    return PlainTextResponse(render_prometheus(gauges), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -2,11 +2,24 @@ from fastapi import HTTPException
 from typing import Tuple, Optional, Dict, Any, List, Literal
 from datetime import datetime, timezone
 from pathlib import Path
+import asyncio
+import atexit
+import base64
+import json
 import logging
+import logging.handlers
+import queue
+import re
 import sys
-
-from app.infra.supabase_client import supabase
-from langchain_core.messages import SystemMessage, HumanMessage
+import uuid
+
+from app.agents.fast_router import fast_route
+from app.agents.history import dumps_compact, project_messages, split_recent_window
+from app.core.cache import BoundedTTLCache
+from app.core.config import settings
+from app.core.metrics import time_stage
+from app.infra import conversation_writer
+from app.infra.supabase_client import async_supabase
 from pydantic import BaseModel, Field
 
 HANDOFF_ROUTER_PROMPT = """
@@ -14,7 +27,7 @@ You are a banking support router.
 
 You will be given:
 - recent_message: the customer's latest message
-- conversation_history: a list of raw message dicts (chronological)
+- conversation_history: the most recent messages (chronological), each with sender_type, content and created_at
 
 Your job:
 Perform lightweight sentiment analysis and decide whether the next response
@@ -47,36 +60,94 @@ APP_LOG_NAME = "app"
 ERROR_LOG_NAME = "app.errors"
 
 
+LOG_TEXT_FORMAT = "%(asctime)s | %(levelname)s | %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
+
+_log_listener: Optional[logging.handlers.QueueListener] = None
+_log_queue_handler: Optional[logging.handlers.QueueHandler] = None
+
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message (+ exc_info)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, LOG_DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
 def init_logging() -> None:
-    formatter = logging.Formatter(
-        "%(asctime)s | %(levelname)s | %(message)s",
-        datefmt="%Y-%m-%dT%H:%M:%S%z",
-    )
+    """
+    Route all logging through a queue so the request path only enqueues
+    records; a background listener thread formats and writes them to stdout.
+    LOG_FORMAT selects "text" or "json" lines, LOG_LEVEL the root level.
+    """
+    global _log_listener, _log_queue_handler
+    if _log_listener is not None:
+        return
+
+    if settings.log_format.lower() == "json":
+        formatter: logging.Formatter = JsonLogFormatter()
+    else:
+        formatter = logging.Formatter(LOG_TEXT_FORMAT, datefmt=LOG_DATE_FORMAT)
+    stdout_handler = logging.StreamHandler(sys.stdout)
+    stdout_handler.setFormatter(formatter)
 
-    # Configure root logger to write to stdout
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _log_queue_handler = logging.handlers.QueueHandler(log_queue)
+    _log_listener = logging.handlers.QueueListener(log_queue, stdout_handler)
+    _log_listener.start()
+
+    # Configure root logger to write to stdout through the queue
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
-    if not root_logger.handlers:
-        root_handler = logging.StreamHandler(sys.stdout)
-        root_handler.setLevel(logging.INFO)
-        root_handler.setFormatter(formatter)
-        root_logger.addHandler(root_handler)
-
-    app_logger = logging.getLogger(APP_LOG_NAME)
-    if not app_logger.handlers:
-        app_logger.setLevel(logging.INFO)
-        app_handler = logging.StreamHandler(sys.stdout)
-        app_handler.setLevel(logging.INFO)
-        app_handler.setFormatter(formatter)
-        app_logger.addHandler(app_handler)
-
-    error_logger = logging.getLogger(ERROR_LOG_NAME)
-    if not error_logger.handlers:
-        error_logger.setLevel(logging.ERROR)
-        error_handler = logging.StreamHandler(sys.stdout)
-        error_handler.setLevel(logging.ERROR)
-        error_handler.setFormatter(formatter)
-        error_logger.addHandler(error_handler)
+    root_logger.setLevel(settings.log_level.upper())
+    root_logger.addHandler(_log_queue_handler)
+
+    # app and app.errors propagate to root (no handlers of their own, so
+    # nothing is written twice); the error logger also carries warnings.
+    logging.getLogger(APP_LOG_NAME).setLevel(settings.log_level.upper())
+    logging.getLogger(ERROR_LOG_NAME).setLevel(logging.WARNING)
+
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the background listener."""
+    global _log_listener, _log_queue_handler
+    if _log_listener is None:
+        return
+    logging.getLogger().removeHandler(_log_queue_handler)
+    _log_listener.stop()
+    _log_listener = None
+    _log_queue_handler = None
+
+
+class LazyPreview:
+    """
+    Log argument that renders a truncated preview only when the record is
+    actually formatted, so disabled levels never pay for str()/json.dumps().
+    """
+
+    __slots__ = ("value", "limit", "as_json")
+
+    def __init__(self, value: Any, limit: int = 500, as_json: bool = False) -> None:
+        self.value = value
+        self.limit = limit
+        self.as_json = as_json
+
+    def __str__(self) -> str:
+        text = dumps_compact(self.value) if self.as_json else str(self.value)
+        return text[: self.limit]
+
+
+def preview(value: Any, limit: int = 500, as_json: bool = False) -> LazyPreview:
+    return LazyPreview(value, limit, as_json)
 
 
 def get_app_logger() -> logging.Logger:
@@ -112,60 +183,509 @@ def now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def get_conversation(conversation_id: str) -> Dict[str, Any]:
-    """Fetch a conversation by ID with all its messages in ascending order."""
-    # Fetch conversation with messages using foreign key relationship
-    res = (
-        supabase()
-        .table("conversations")
-        .select("*, messages:messages(*)")
-        .eq("id", conversation_id)
-        .limit(1)
-        .execute()
+async def fetch_conversation_recent(conversation_id: str, limit: int) -> Dict[str, Any]:
+    """
+    Fetch a conversation by ID with only its last `limit` messages, selected
+    and ordered server-side and returned in ascending order.
+    """
+    client = await async_supabase()
+    with time_stage("db.load_conversation"):
+        conv_res, messages_res = await asyncio.gather(
+            client
+            .table("conversations")
+            .select("*")
+            .eq("id", conversation_id)
+            .limit(1)
+            .execute(),
+            client
+            .table("messages")
+            .select("*")
+            .eq("conversation_id", conversation_id)
+            .order("created_at", desc=True)
+            .order("id", desc=True)
+            .limit(limit)
+            .execute(),
+        )
+    conversation = ensure_data(conv_res, "Failed to load conversation")[0]
+    messages = messages_res.data or []
+    messages.reverse()
+    conversation["messages"] = messages
+    return conversation
+
+
+# ---------------------------------------------------------------------------
+# Conversation cache
+#
+# Per-process cache of the conversation row plus a tail of its messages.
+# Our own inserts/updates are applied in place; writes made elsewhere (the
+# call-center UI, other workers) arrive through a Supabase realtime
+# subscription, with a poller as backstop (or alone when realtime is
+# unavailable). Routing re-reads handling_mode on every customer turn.
+# ---------------------------------------------------------------------------
+
+def _conversation_entry_size(entry: Dict[str, Any]) -> int:
+    # Cheap estimate: message text plus a fixed overhead per row.
+    messages = entry.get("messages") or []
+    return 1024 + sum(len(m.get("content") or "") + 512 for m in messages)
+
+
+_conversation_cache: BoundedTTLCache[Dict[str, Any]] = BoundedTTLCache(
+    ttl_seconds=settings.conversation_cache_ttl_seconds,
+    max_entries=settings.conversation_cache_max_entries,
+    max_bytes=settings.conversation_cache_max_mb * 1024 * 1024,
+    sizeof=_conversation_entry_size,
+)
+_conversation_sync_channel: Any = None
+_conversation_poll_task: Optional[asyncio.Task] = None
+
+
+def _parse_ts(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def _cache_store(conversation: Dict[str, Any], complete: bool) -> None:
+    if not settings.conversation_cache_enabled:
+        return
+    tail = settings.conversation_cache_tail_messages
+    messages = list(conversation.get("messages") or [])
+    if len(messages) > tail:
+        messages = messages[-tail:]
+        complete = False
+    row = {k: v for k, v in conversation.items() if k != "messages"}
+    _conversation_cache.set(
+        row["id"], {"conversation": row, "messages": messages, "complete": complete}
+    )
+
+
+def invalidate_conversation(conversation_id: str) -> None:
+    _conversation_cache.pop(conversation_id)
+
+
+def get_conversation_cache_metrics() -> Dict[str, Any]:
+    return {
+        "entries": len(_conversation_cache),
+        "bytes": _conversation_cache.total_bytes,
+        "hits": _conversation_cache.hits,
+        "misses": _conversation_cache.misses,
+        "polling": int(_conversation_poll_task is not None and not _conversation_poll_task.done()),
+        "realtime": int(_conversation_sync_channel is not None),
+    }
+
+
+def _cache_update_conversation(conversation_id: str, fields: Dict[str, Any]) -> None:
+    entry = _conversation_cache.get(conversation_id)
+    if entry is not None:
+        entry["conversation"].update(fields)
+
+
+def _cache_upsert_message(message: Dict[str, Any]) -> None:
+    conversation_id = message.get("conversation_id")
+    entry = _conversation_cache.get(conversation_id) if conversation_id else None
+    if entry is None:
+        return
+    messages = entry["messages"]
+    for i, existing in enumerate(messages):
+        if existing.get("id") == message.get("id"):
+            messages[i] = {**existing, **message}
+            return
+    if messages and (message.get("created_at") or "") < (messages[-1].get("created_at") or ""):
+        # Out-of-order arrival; reload rather than re-sorting a partial tail.
+        invalidate_conversation(conversation_id)
+        return
+    messages.append(message)
+    if len(messages) > settings.conversation_cache_tail_messages:
+        del messages[0]
+        entry["complete"] = False
+    # Re-store so the byte accounting reflects the new tail.
+    _conversation_cache.set(conversation_id, entry)
+
+
+def _on_message_change(payload: Dict[str, Any]) -> None:
+    data = payload.get("data") or {}
+    event = str(getattr(data.get("type"), "value", data.get("type")))
+    record = data.get("record") or {}
+    old_record = data.get("old_record") or {}
+    if event in ("INSERT", "UPDATE") and record.get("conversation_id"):
+        _cache_upsert_message(record)
+    else:
+        conversation_id = record.get("conversation_id") or old_record.get("conversation_id")
+        if conversation_id:
+            invalidate_conversation(conversation_id)
+        else:
+            # DELETE without REPLICA IDENTITY FULL only carries the id.
+            _conversation_cache.clear()
+
+
+def _on_conversation_change(payload: Dict[str, Any]) -> None:
+    data = payload.get("data") or {}
+    event = str(getattr(data.get("type"), "value", data.get("type")))
+    record = data.get("record") or {}
+    conversation_id = record.get("id") or (data.get("old_record") or {}).get("id")
+    if not conversation_id:
+        return
+    entry = _conversation_cache.get(conversation_id)
+    if entry is None:
+        return
+    if event != "UPDATE":
+        invalidate_conversation(conversation_id)
+        return
+    cached_at = _parse_ts(entry["conversation"].get("updated_at"))
+    incoming_at = _parse_ts(record.get("updated_at"))
+    # Ignore echoes of older writes (e.g. a write-behind flush we already applied).
+    if cached_at and incoming_at and incoming_at < cached_at:
+        return
+    entry["conversation"].update(record)
+
+
+def _on_sync_state(state: Any, error: Optional[Exception]) -> None:
+    state = str(getattr(state, "value", state))
+    if state == "SUBSCRIBED":
+        get_app_logger().info("conversation_cache:realtime subscribed")
+        return
+    get_error_logger().warning(
+        "conversation_cache:realtime %s (%s); falling back to polling", state, error
+    )
+    _ensure_conversation_poller()
+
+
+async def poll_conversation_changes() -> int:
+    """
+    Compare cached conversations against the database and drop stale entries.
+    Returns the number of entries invalidated.
+    """
+    entries = {
+        conversation_id: _conversation_cache.peek(conversation_id)
+        for conversation_id in _conversation_cache.keys()
+    }
+    entries = {k: v for k, v in entries.items() if v is not None}
+    if not entries:
+        return 0
+
+    client = await async_supabase()
+    ids = list(entries)
+    tails = [e["messages"] for e in entries.values()]
+    # Only messages newer than the oldest cached tail end can be unseen.
+    watermark = None if any(not t for t in tails) else min(t[-1].get("created_at") or "" for t in tails)
+    conv_query = client.table("conversations").select("id,updated_at").in_("id", ids)
+    msg_query = (
+        client
+        .table("messages")
+        .select("id,conversation_id,created_at")
+        .in_("conversation_id", ids)
+    )
+    if watermark:
+        msg_query = msg_query.gt("created_at", watermark)
+    conv_res, msg_res = await asyncio.gather(
+        conv_query.execute(),
+        msg_query.order("created_at").limit(1000).execute(),
+    )
+
+    # Rows that disappeared or were updated after our copy are stale.
+    stale = set(ids) - {row["id"] for row in conv_res.data or []}
+    for row in conv_res.data or []:
+        cached_at = _parse_ts(entries[row["id"]]["conversation"].get("updated_at"))
+        db_at = _parse_ts(row.get("updated_at"))
+        if db_at and (cached_at is None or db_at > cached_at):
+            stale.add(row["id"])
+    # So are conversations with a message inside the cached window we have not seen.
+    known_ids = {conversation_id: {m.get("id") for m in e["messages"]} for conversation_id, e in entries.items()}
+    for row in msg_res.data or []:
+        entry = entries.get(row["conversation_id"])
+        if entry is None or row["id"] in known_ids[row["conversation_id"]]:
+            continue
+        tail = entry["messages"]
+        if not tail or row["created_at"] >= (tail[0].get("created_at") or ""):
+            stale.add(row["conversation_id"])
+
+    for conversation_id in stale:
+        invalidate_conversation(conversation_id)
+    return len(stale)
+
+
+async def _conversation_poll_loop(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await poll_conversation_changes()
+        except Exception as exc:
+            get_error_logger().warning("conversation_cache:poll failed %s: %s", type(exc).__name__, exc)
+
+
+def _ensure_conversation_poller() -> None:
+    global _conversation_poll_task
+    if _conversation_poll_task is None or _conversation_poll_task.done():
+        _conversation_poll_task = asyncio.create_task(
+            _conversation_poll_loop(settings.conversation_cache_poll_interval_seconds)
+        )
+
+
+async def start_conversation_cache_sync() -> None:
+    """
+    Start invalidation for the conversation cache: Supabase realtime when
+    CONVERSATION_CACHE_SYNC=realtime, polling when it is "poll". The poller
+    also runs alongside realtime as a backstop, since a subscription can
+    report SUBSCRIBED and still miss events (e.g. tables not published).
+    """
+    global _conversation_sync_channel
+    if not settings.conversation_cache_enabled:
+        return
+    mode = settings.conversation_cache_sync.lower()
+    if mode == "poll":
+        _ensure_conversation_poller()
+        return
+    if mode != "realtime":
+        return
+    try:
+        client = await async_supabase()
+        channel = client.channel("backend-conversation-cache")
+        channel.on_postgres_changes("*", schema="public", table="messages", callback=_on_message_change)
+        channel.on_postgres_changes("*", schema="public", table="conversations", callback=_on_conversation_change)
+        # Don't let a slow realtime handshake hold up startup.
+        await asyncio.wait_for(channel.subscribe(_on_sync_state), timeout=10)
+        _conversation_sync_channel = channel
+        _ensure_conversation_poller()
+    except Exception as exc:
+        get_error_logger().warning(
+            "conversation_cache:realtime unavailable %s: %s; falling back to polling",
+            type(exc).__name__,
+            exc,
+        )
+        _ensure_conversation_poller()
+
+
+async def stop_conversation_cache_sync() -> None:
+    global _conversation_sync_channel, _conversation_poll_task
+    if _conversation_poll_task is not None:
+        _conversation_poll_task.cancel()
+        try:
+            await _conversation_poll_task
+        except asyncio.CancelledError:
+            pass
+        _conversation_poll_task = None
+    if _conversation_sync_channel is not None:
+        channel, _conversation_sync_channel = _conversation_sync_channel, None
+        try:
+            client = await async_supabase()
+            await client.remove_channel(channel)
+        except Exception as exc:
+            get_error_logger().warning("conversation_cache:realtime close failed %s", exc)
+    _conversation_cache.clear()
+
+
+async def fetch_handling_mode(conversation_id: str) -> Optional[Dict[str, Any]]:
+    """handling_mode/updated_at straight from the database (None if the row is gone)."""
+    client = await async_supabase()
+    with time_stage("db.handling_mode"):
+        res = await (
+            client
+            .table("conversations")
+            .select("handling_mode,updated_at")
+            .eq("id", conversation_id)
+            .limit(1)
+            .execute()
+        )
+    rows = res.data or []
+    return rows[0] if rows else None
+
+
+async def get_conversation_recent(
+    conversation_id: str,
+    limit: int,
+    fresh_handling_mode: bool = False,
+) -> Dict[str, Any]:
+    """
+    Conversation row plus its last `limit` messages (ascending), served from
+    the conversation cache when it holds enough of the tail. With
+    fresh_handling_mode a cached row gets handling_mode re-read from the
+    database: the call-center UI switches it directly, and routing on a stale
+    value would let the AI answer an escalated conversation.
+    """
+    entry = _conversation_cache.get(conversation_id) if settings.conversation_cache_enabled else None
+    if entry is not None and (entry["complete"] or len(entry["messages"]) >= limit):
+        if fresh_handling_mode:
+            row = await fetch_handling_mode(conversation_id)
+            if row is None:
+                invalidate_conversation(conversation_id)
+                entry = None
+            else:
+                entry["conversation"].update(row)
+    if entry is not None and (entry["complete"] or len(entry["messages"]) >= limit):
+        conversation = dict(entry["conversation"])
+        conversation["messages"] = entry["messages"][-limit:] if limit else []
+        return conversation
+
+    conversation = await fetch_conversation_recent(conversation_id, limit)
+    _cache_store(conversation, complete=len(conversation["messages"]) < limit)
+    return conversation
+
+
+MESSAGE_PAGE_DEFAULT_LIMIT = 50
+MESSAGE_PAGE_MAX_LIMIT = 200
+# Always selected so every row can produce a cursor
+MESSAGE_CURSOR_FIELDS = ("created_at", "id")
+_FIELD_NAME = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+def encode_message_cursor(message: Dict[str, Any]) -> str:
+    raw = f"{message['created_at']}|{message['id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_message_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    (created_at, id) of a cursor, normalized. Both values end up in a
+    PostgREST filter string, so anything that is not a timestamp and a UUID
+    is rejected with 400.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, message_id = base64.urlsafe_b64decode(padded).decode("utf-8").split("|", 1)
+        timestamp = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+        message_uuid = uuid.UUID(message_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid message cursor")
+    return timestamp.isoformat(), str(message_uuid)
+
+
+def parse_message_fields(fields: Optional[str]) -> str:
+    """Turn a comma-separated column list into a select clause; None selects all."""
+    if not fields:
+        return "*"
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    for name in names:
+        if not _FIELD_NAME.match(name):
+            raise HTTPException(status_code=400, detail=f"Invalid field: {name}")
+    for name in MESSAGE_CURSOR_FIELDS:
+        if name not in names:
+            names.append(name)
+    return ",".join(names)
+
+
+async def list_messages_page(
+    conversation_id: str,
+    limit: int = MESSAGE_PAGE_DEFAULT_LIMIT,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Keyset-paginated message listing ordered by (created_at, id).
+
+    Without a cursor the newest page is returned. `before` pages towards older
+    messages, `after` towards newer ones. Messages in a page are always in
+    ascending order; next_before/next_after are the cursors for the adjacent
+    pages and has_more tells whether the requested direction has more rows.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+    limit = max(1, min(limit, MESSAGE_PAGE_MAX_LIMIT))
+
+    client = await async_supabase()
+    query = (
+        client
+        .table("messages")
+        .select(parse_message_fields(fields))
+        .eq("conversation_id", conversation_id)
     )
-    data = ensure_data(res, "Failed to load conversation")
-    conversation = data[0]
-    
-    # If messages were fetched via join, sort them by created_at ascending
-    if "messages" in conversation and conversation["messages"]:
-        conversation["messages"] = sorted(
-            conversation["messages"],
-            key=lambda m: m.get("created_at", ""),
-            reverse=False  # ascending order
+    # Fetch one extra row to learn whether another page exists.
+    if after:
+        created_at, message_id = decode_message_cursor(after)
+        query = query.or_(
+            f'created_at.gt."{created_at}",and(created_at.eq."{created_at}",id.gt.{message_id})'
         )
+        with time_stage("db.list_messages"):
+            res = await query.order("created_at").order("id").limit(limit + 1).execute()
+        rows = res.data or []
+        has_more = len(rows) > limit
+        rows = rows[:limit]
     else:
-        # Fallback: fetch messages separately if join didn't work
-        messages_res = (
-            supabase()
+        if before:
+            created_at, message_id = decode_message_cursor(before)
+            query = query.or_(
+                f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{message_id})'
+            )
+        with time_stage("db.list_messages"):
+            res = await (
+                query
+                .order("created_at", desc=True)
+                .order("id", desc=True)
+                .limit(limit + 1)
+                .execute()
+            )
+        rows = res.data or []
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        rows.reverse()
+
+    return {
+        "messages": rows,
+        "has_more": has_more,
+        "next_before": encode_message_cursor(rows[0]) if rows else before,
+        "next_after": encode_message_cursor(rows[-1]) if rows else after,
+    }
+
+
+async def list_all_messages(conversation_id: str, fields: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Every message of a conversation in ascending order (the unpaginated listing)."""
+    client = await async_supabase()
+    with time_stage("db.list_messages"):
+        res = await (
+            client
             .table("messages")
-            .select("*")
+            .select(parse_message_fields(fields))
             .eq("conversation_id", conversation_id)
-            .order("created_at", desc=False)  # ascending order
+            .order("created_at")
+            .order("id")
             .execute()
         )
-        conversation["messages"] = messages_res.data or []
-    
-    return conversation
+    return res.data or []
 
 
-def update_conversation(conversation_id: str, fields: Dict[str, Any]) -> None:
+async def update_conversation(conversation_id: str, fields: Dict[str, Any]) -> None:
     """Update conversation fields."""
     # fields example: {"handling_mode": "human", "handoff_status": "queued", ...}
-    res = (
-        supabase()
-        .table("conversations")
-        .update(fields)
-        .eq("id", conversation_id)
-        .execute()
-    )
+    client = await async_supabase()
+    with time_stage("db.update_conversation"):
+        res = await (
+            client
+            .table("conversations")
+            .update(fields)
+            .eq("id", conversation_id)
+            .execute()
+        )
     if hasattr(res, "error") and res.error:
         raise HTTPException(status_code=500, detail=f"Failed to update conversation: {res.error}")
+    _cache_update_conversation(conversation_id, fields)
 
 
-def insert_message(payload: Dict[str, Any]) -> Dict[str, Any]:
+async def touch_conversation(conversation_id: str, last_message: str) -> None:
+    """
+    Record the newest message on the conversation row. Goes through the
+    write-behind queue when it is running so consecutive messages collapse
+    into one write; otherwise writes immediately, along with anything a
+    stopped flush loop left queued.
+    """
+    now = now_iso()
+    fields = {"last_message": last_message[:200], "last_message_time": now, "updated_at": now}
+    _cache_update_conversation(conversation_id, fields)
+    if not conversation_writer.enqueue(conversation_id, fields):
+        await update_conversation(conversation_id, fields)
+        if conversation_writer.pending_count():
+            await conversation_writer.flush()
+
+
+async def insert_message(payload: Dict[str, Any]) -> Dict[str, Any]:
     """Insert a message into the messages table."""
-    res = supabase().table("messages").insert(payload).execute()
+    client = await async_supabase()
+    with time_stage("db.insert_message"):
+        res = await client.table("messages").insert(payload).execute()
     data = ensure_data(res, "Failed to send message")
+    _cache_upsert_message(data[0])
     return data[0]
 
 
@@ -174,52 +694,155 @@ class HandoffDecision(BaseModel):
     reason: str = Field(..., description="Short reason for the decision")
 
 
-def should_handoff_to_human(
+async def should_handoff_to_human(
     llm: Any,
     conversation_history: List[Dict[str, Any]],
     recent_message: str,
 ) -> Tuple[bool, Optional[str]]:
+    # Tier 1: deterministic lexicon for clear-cut messages (no LLM call).
+    if settings.fast_router_enabled:
+        with time_stage("router.fast"):
+            fast_decision = fast_route(recent_message)
+        if fast_decision is not None:
+            get_app_logger().info(
+                "router:fast_path needs_human=%s human_score=%s agent_score=%s",
+                fast_decision.needs_human,
+                fast_decision.human_score,
+                fast_decision.agent_score,
+            )
+            return fast_decision.needs_human, fast_decision.reason
+
+    # Tier 2: LLM classifier for ambiguous messages.
     if llm is None:
         return False, None
 
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    from app.core.prompt_cache import assemble_prompt
+
     llm_with_structured_output = llm.with_structured_output(
         HandoffDecision,
         method="json_schema",
     )
+    # Only the prompt fields of a recent, token-budgeted window are sent.
+    _, recent_history = split_recent_window(
+        project_messages(conversation_history),
+        settings.router_history_token_budget,
+        settings.history_max_messages,
+    )
     payload = {
         "recent_message": recent_message,
-        "conversation_history": conversation_history,
+        "conversation_history": recent_history,
     }
-    messages = [
-        SystemMessage(content=HANDOFF_ROUTER_PROMPT),
-        HumanMessage(content=str(payload)),
-    ]
-    decision = llm_with_structured_output.invoke(messages)
+    messages = assemble_prompt(
+        [SystemMessage(content=HANDOFF_ROUTER_PROMPT)],
+        dynamic=[HumanMessage(content=dumps_compact(payload))],
+    )
+    with time_stage("router.llm"):
+        decision = await llm_with_structured_output.ainvoke(messages)
     return decision.decision == "human", decision.reason
 
 
-def build_handoff_summary(conversation_id: str) -> str:
-    """
-    Minimal: fetch last few messages and summarize.
-    You can replace this with an LLM summarizer later.
-    """
-    res = (
-        supabase()
-        .table("messages")
-        .select("sender_type,content,created_at")
-        .eq("conversation_id", conversation_id)
-        .order("created_at", desc=True)
-        .limit(8)
-        .execute()
-    )
-    msgs = res.data or []
-    msgs.reverse()
-
+def format_handoff_summary(msgs: List[Dict[str, Any]]) -> str:
+    """Render chronological messages the same way the handoff_to_human RPC does."""
     lines = []
     for m in msgs:
-        who = m.get("sender_type", "unknown")
+        who = m.get("sender_type") or "unknown"
         content = (m.get("content") or "").strip().replace("\n", " ")
         lines.append(f"- {who}: {content[:180]}")
 
     return "Handoff summary (last messages):\n" + "\n".join(lines)
 
+
+# PostgREST error code for "function not found in the schema cache"
+RPC_NOT_FOUND_CODE = "PGRST202"
+
+
+async def handoff_to_human_rpc(conversation_id: str, ack_message: str) -> Dict[str, Any]:
+    """
+    Hand the conversation to a human in one transactional round trip via the
+    handoff_to_human database function (supabase/migrations/020).
+    """
+    client = await async_supabase()
+    with time_stage("db.handoff_rpc"):
+        res = await client.rpc(
+            "handoff_to_human",
+            {
+                "p_conversation_id": conversation_id,
+                "p_ai_agent_id": AI_AGENT_ID,
+                "p_ack_message": ack_message,
+                "p_summary_limit": settings.handoff_summary_messages,
+            },
+        ).execute()
+    return ensure_data(res, "Failed to hand off conversation")
+
+
+async def handoff_to_human_local(conversation_id: str, ack_message: str) -> Dict[str, Any]:
+    """
+    Stand-in for the handoff_to_human RPC built from the table helpers. Same
+    writes and result shape, but several round trips and no transaction.
+    """
+    conv = await fetch_conversation_recent(conversation_id, settings.handoff_summary_messages)
+    previous_mode = conv.get("handling_mode")
+    summary_text = format_handoff_summary(conv.get("messages") or [])
+
+    await update_conversation(
+        conversation_id,
+        {"handling_mode": "human", "last_message": ack_message[:200], "updated_at": now_iso()},
+    )
+    summary_msg = await insert_message(
+        {
+            "conversation_id": conversation_id,
+            "sender_type": "ai",
+            "sender_customer_id": None,
+            "sender_agent_id": AI_AGENT_ID,
+            "content": summary_text,
+            "is_internal": True,
+        }
+    )
+    ack_msg = await insert_message(
+        {
+            "conversation_id": conversation_id,
+            "sender_type": "ai",
+            "sender_customer_id": None,
+            "sender_agent_id": AI_AGENT_ID,
+            "content": ack_message,
+            "is_internal": False,
+        }
+    )
+    return {
+        "conversation_id": conversation_id,
+        "previous_handling_mode": previous_mode,
+        "handling_mode": "human",
+        "summary_message_id": summary_msg.get("id"),
+        "ack_message_id": ack_msg.get("id"),
+    }
+
+
+async def handoff_conversation(conversation_id: str, ack_message: str) -> Dict[str, Any]:
+    """
+    Switch to human handling, write the internal summary and the customer
+    acknowledgement, and bump last_message/updated_at.
+    Uses the RPC when enabled; falls back to the local stand-in only when the
+    function has not been deployed (nothing was written in that case).
+    """
+    from postgrest.exceptions import APIError
+
+    # The handoff writes last_message itself; drop queued older values first.
+    await conversation_writer.discard_pending(conversation_id)
+    try:
+        if not settings.handoff_rpc_enabled:
+            return await handoff_to_human_local(conversation_id, ack_message)
+        try:
+            return await handoff_to_human_rpc(conversation_id, ack_message)
+        except APIError as exc:
+            if exc.code != RPC_NOT_FOUND_CODE:
+                raise
+            get_error_logger().warning(
+                "handoff:rpc_missing falling back to local handoff; apply migration 020 conversation_id=%s",
+                conversation_id,
+            )
+            return await handoff_to_human_local(conversation_id, ack_message)
+    finally:
+        # The RPC writes server-side; reload the conversation on next use.
+        invalidate_conversation(conversation_id)
@@ -0,0 +1,146 @@
+"""
+Cold-start benchmark for the API entry point.
+
+Each run starts a fresh interpreter (so nothing is cached in sys.modules) and
+measures:
+- import time of `app.main` (via -X importtime, cumulative microseconds)
+- wall time from interpreter start to the first GET /health response,
+  served in-process through httpx's ASGI transport with BOOT_MODE=lazy
+
+It reports the median over runs and the slowest modules by self time, and
+exits non-zero when the median import time exceeds --budget-ms, so it can
+guard against cold-start regressions in CI.
+
+Usage:
+    python -m app.scripts.bench_cold_start
+    python -m app.scripts.bench_cold_start --runs 10 --top 15
+    python -m app.scripts.bench_cold_start --budget-ms 1500 --json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+# Ensure backend directory is on sys.path so `app` package resolves
+BACKEND_DIR = Path(__file__).resolve().parent.parent.parent
+
+FIRST_HEALTH_SNIPPET = """
+import asyncio, time
+started = time.perf_counter()
+import httpx
+from app.main import app
+
+async def main():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        res = await client.get("/health")
+        res.raise_for_status()
+
+asyncio.run(main())
+print((time.perf_counter() - started) * 1000)
+"""
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["BOOT_MODE"] = "lazy"
+    env["PYTHONPATH"] = str(BACKEND_DIR) + os.pathsep + env.get("PYTHONPATH", "")
+    # Bytecode is cached after the first run on a real deployment too.
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def measure_import() -> tuple[float, dict[str, int]]:
+    """Return (cumulative ms for app.main, {module: self us})."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR,
+        env=_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total_us = 0
+    self_times: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [part.strip() for part in line[len("import time:"):].split("|")]
+        if not parts[0].isdigit():
+            continue  # header line
+        self_us, cumulative_us, module = int(parts[0]), int(parts[1]), parts[2]
+        self_times[module] = self_us
+        if module == "app.main":
+            total_us = cumulative_us
+    return total_us / 1000, self_times
+
+
+def measure_first_health() -> float:
+    proc = subprocess.run(
+        [sys.executable, "-c", FIRST_HEALTH_SNIPPET],
+        cwd=BACKEND_DIR,
+        env=_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark API cold start")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest modules to list")
+    parser.add_argument("--budget-ms", type=float, default=0, help="fail if median import exceeds this")
+    parser.add_argument("--json", action="store_true", help="print a JSON summary")
+    args = parser.parse_args()
+
+    # Warm-up run so .pyc files exist, as on a deployed function.
+    measure_import()
+
+    import_ms: list[float] = []
+    health_ms: list[float] = []
+    self_samples: dict[str, list[int]] = defaultdict(list)
+    for _ in range(args.runs):
+        total, self_times = measure_import()
+        import_ms.append(total)
+        for module, us in self_times.items():
+            self_samples[module].append(us)
+        health_ms.append(measure_first_health())
+
+    slowest = sorted(
+        ((module, statistics.median(samples) / 1000) for module, samples in self_samples.items()),
+        key=lambda item: item[1],
+        reverse=True,
+    )[: args.top]
+    summary = {
+        "runs": args.runs,
+        "import_app_main_ms": round(statistics.median(import_ms), 1),
+        "first_health_ms": round(statistics.median(health_ms), 1),
+        "slowest_modules_ms": {module: round(ms, 1) for module, ms in slowest},
+    }
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"runs:                 {args.runs}")
+        print(f"import app.main:      {summary['import_app_main_ms']:.1f} ms (median)")
+        print(f"first /health:        {summary['first_health_ms']:.1f} ms (median, from interpreter start)")
+        print("slowest modules (self time):")
+        for module, ms in slowest:
+            print(f"  {ms:8.1f} ms  {module}")
+
+    if args.budget_ms and summary["import_app_main_ms"] > args.budget_ms:
+        print(
+            f"cold start regression: {summary['import_app_main_ms']:.1f} ms > budget {args.budget_ms:.1f} ms",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""
+Local stand-ins for the external services, used by bench_load:
+
+- ScriptedChatModel: a chat model with configurable latency that answers the
+  router, the summarizer and the agent deterministically. Account questions
+  get one execute_sql round trip against the bench MCP server, everything
+  else a direct answer. Agent replies report prompt-cache hits like a
+  provider with automatic prefix caching (at message granularity).
+  Registered as LLM provider "bench".
+- InMemorySupabase: the subset of the async Supabase client API used by the
+  routes (table/select/insert/update/filters/or_/order/limit/execute), backed by
+  Python lists, with configurable per-call latency.
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import PrivateAttr
+
+from app.agents.history import estimate_tokens
+
+_ACCOUNT_QUERY_RE = re.compile(
+    r"\b(balance|balances|transactions?|spent|spend|statement|payments?|accounts?)\b", re.IGNORECASE
+)
+_HUMAN_QUERY_RE = re.compile(
+    r"\b(human|person|agent|representative|manager|fraud|stolen|complain|complaint)\b", re.IGNORECASE
+)
+_CUSTOMER_ID_RE = re.compile(r"Customer ID: (\S+)")
+_USER_QUERY_RE = re.compile(r"User query: (.*)")
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Deterministic chat model; each call sleeps latency_ms (+/- jitter)."""
+
+    latency_ms: float = 0.0
+    jitter: float = 0.2
+    # Hashes of prompt prefixes already "cached" by the simulated provider
+    _prefixes: set = PrivateAttr(default_factory=set)
+
+    @property
+    def _llm_type(self) -> str:
+        return "bench-scripted"
+
+    def _latency(self) -> float:
+        base = self.latency_ms / 1000
+        if base <= 0:
+            return 0.0
+        return max(0.0, base * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScriptedChatModel":
+        # The script knows the two MCP tools by name.
+        return self
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> RunnableLambda:
+        def respond(messages: Sequence[BaseMessage]) -> Any:
+            time.sleep(self._latency())
+            return self._structured(schema, messages)
+
+        async def arespond(messages: Sequence[BaseMessage]) -> Any:
+            await asyncio.sleep(self._latency())
+            return self._structured(schema, messages)
+
+        return RunnableLambda(respond, afunc=arespond)
+
+    def _structured(self, schema: Any, messages: Sequence[BaseMessage]) -> Any:
+        fields = getattr(schema, "model_fields", {})
+        text = str(messages[-1].content) if messages else ""
+        if "decision" in fields:
+            # Router payload: {"recent_message": ..., "conversation_history": [...]}
+            try:
+                recent = str(json.loads(text).get("recent_message", ""))
+            except (ValueError, AttributeError):
+                recent = text
+            decision = "human" if _HUMAN_QUERY_RE.search(recent) else "agent"
+            return schema(decision=decision, reason="scripted")
+        if "messages" in fields:
+            try:
+                rows = json.loads(text)
+            except ValueError:
+                rows = []
+            item_type = fields["messages"].annotation.__args__[0]
+            return schema(
+                messages=[
+                    item_type(
+                        timestamp=str(row.get("created_at") or ""),
+                        sender_type=row.get("sender_type") if row.get("sender_type") in ("customer", "ai") else "human",
+                        content=str(row.get("content") or "")[:160],
+                    )
+                    for row in rows
+                    if isinstance(row, dict)
+                ]
+            )
+        raise ValueError(f"ScriptedChatModel has no script for {schema!r}")
+
+    def _reply(self, messages: List[BaseMessage]) -> AIMessage:
+        last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+        human_text = str(messages[last_human].content) if last_human >= 0 else ""
+        query_match = _USER_QUERY_RE.search(human_text)
+        query = query_match.group(1) if query_match else human_text
+        customer_match = _CUSTOMER_ID_RE.search(human_text)
+        customer_id = customer_match.group(1) if customer_match else ""
+
+        # Tool results of this turn follow the query.
+        tool_results = [str(m.content) for m in messages[last_human + 1:] if isinstance(m, ToolMessage)]
+
+        if tool_results:
+            content = f"Here is what I found for your request: {tool_results[0][:200]}"
+            tool_calls = []
+        elif _ACCOUNT_QUERY_RE.search(query) and customer_id:
+            content = ""
+            tool_calls = [
+                {
+                    "name": "execute_sql",
+                    "args": {
+                        "query": (
+                            "select id, account_type, balance, currency from accounts "
+                            f"where customer_id = '{customer_id}'"
+                        )
+                    },
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                }
+            ]
+        else:
+            content = "Thanks for reaching out. Our branches are open 9am-5pm, Sunday to Thursday."
+            tool_calls = []
+
+        input_tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+        output_tokens = estimate_tokens(content) + 20 * len(tool_calls)
+        return AIMessage(
+            content=content,
+            tool_calls=tool_calls,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+                "input_token_details": {"cache_read": self._cached_tokens(messages)},
+            },
+        )
+
+    def _cached_tokens(self, messages: List[BaseMessage]) -> int:
+        """Tokens of the longest message prefix seen in an earlier call."""
+        if len(self._prefixes) > 100_000:
+            self._prefixes.clear()
+        digest = hashlib.sha256()
+        cached = tokens = 0
+        hit = True
+        for message in messages:
+            digest.update(f"{message.type}\x00{message.content}\x00{getattr(message, 'tool_calls', '')}".encode())
+            key = digest.hexdigest()
+            tokens += estimate_tokens(str(message.content))
+            if hit and key in self._prefixes:
+                cached = tokens
+            else:
+                hit = False
+                self._prefixes.add(key)
+        return cached
+
+    def _generate(self, messages: List[BaseMessage], stop: Any = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self._latency())
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    async def _agenerate(
+        self, messages: List[BaseMessage], stop: Any = None, run_manager: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        await asyncio.sleep(self._latency())
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+
+def register_bench_provider(latency_ms: float, jitter: float = 0.2) -> None:
+    """Make LLM_PROVIDER=bench build ScriptedChatModel for every task."""
+    from app.core.llm import register_provider
+
+    register_provider(
+        "bench",
+        lambda model, timeout, max_retries: ScriptedChatModel(latency_ms=latency_ms, jitter=jitter),
+        default_model="scripted",
+    )
+
+
+class _Result:
+    def __init__(self, data: Any) -> None:
+        self.data = data
+
+
+def _split_conditions(text: str) -> List[str]:
+    """Split a PostgREST logic list on the commas outside parentheses and quotes."""
+    parts: List[str] = []
+    depth, quoted, start = 0, False, 0
+    for index, char in enumerate(text):
+        if char == '"':
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(text[start:index])
+            start = index + 1
+    parts.append(text[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _parse_condition(text: str) -> Tuple[str, str, Any]:
+    """column.op.value or and(...)/or(...) as a (column, op, value) filter."""
+    for logic in ("and", "or"):
+        if text.startswith(f"{logic}(") and text.endswith(")"):
+            return ("", logic, [_parse_condition(part) for part in _split_conditions(text[len(logic) + 1:-1])])
+    column, op, value = text.split(".", 2)
+    if op not in ("eq", "gt", "lt"):
+        raise NotImplementedError(f"or_ operator {op!r} is not supported by the benchmark stub")
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        value = value[1:-1]
+    return (column, op, value)
+
+
+def _check(row: Dict[str, Any], condition: Tuple[str, str, Any]) -> bool:
+    column, op, value = condition
+    if op == "and":
+        return all(_check(row, part) for part in value)
+    if op == "or":
+        return any(_check(row, part) for part in value)
+    current = row.get(column)
+    if op == "eq":
+        return str(current) == str(value)
+    if op == "in":
+        return current in value
+    if op == "gt":
+        return current is not None and current > value
+    if op == "lt":
+        return current is not None and current < value
+    return True
+
+
+class _Query:
+    """Chainable PostgREST-style query over an InMemorySupabase table."""
+
+    def __init__(self, db: "InMemorySupabase", table: str) -> None:
+        self._db = db
+        self._table = table
+        self._op = "select"
+        self._columns = "*"
+        self._payload: Any = None
+        self._filters: List[Tuple[str, str, Any]] = []
+        self._orders: List[Tuple[str, bool]] = []
+        self._limit: Optional[int] = None
+
+    def select(self, columns: str = "*", **kwargs: Any) -> "_Query":
+        self._columns = columns
+        return self
+
+    def insert(self, payload: Any, **kwargs: Any) -> "_Query":
+        self._op, self._payload = "insert", payload
+        return self
+
+    def update(self, fields: Dict[str, Any], **kwargs: Any) -> "_Query":
+        self._op, self._payload = "update", fields
+        return self
+
+    def eq(self, column: str, value: Any) -> "_Query":
+        self._filters.append((column, "eq", value))
+        return self
+
+    def in_(self, column: str, values: Sequence[Any]) -> "_Query":
+        self._filters.append((column, "in", set(values)))
+        return self
+
+    def gt(self, column: str, value: Any) -> "_Query":
+        self._filters.append((column, "gt", value))
+        return self
+
+    def lt(self, column: str, value: Any) -> "_Query":
+        self._filters.append((column, "lt", value))
+        return self
+
+    def or_(self, filters: str, **kwargs: Any) -> "_Query":
+        self._filters.append(("", "or", [_parse_condition(part) for part in _split_conditions(filters)]))
+        return self
+
+    def order(self, column: str, desc: bool = False, **kwargs: Any) -> "_Query":
+        self._orders.append((column, desc))
+        return self
+
+    def limit(self, count: int, **kwargs: Any) -> "_Query":
+        self._limit = count
+        return self
+
+    def _matches(self, row: Dict[str, Any]) -> bool:
+        return all(_check(row, condition) for condition in self._filters)
+
+    def _project(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        columns = [c.strip() for c in self._columns.split(",") if c.strip()]
+        out: Dict[str, Any] = {}
+        for column in columns:
+            if column == "*":
+                out.update(copy.deepcopy(row))
+            elif ":" in column and column.endswith("(*)"):
+                # Embedded relation, e.g. messages:messages(*)
+                alias, related = column[:-3].split(":", 1)
+                out[alias] = [
+                    copy.deepcopy(r) for r in self._db.rows(related) if r.get("conversation_id") == row.get("id")
+                ]
+            else:
+                out[column] = copy.deepcopy(row.get(column))
+        return out
+
+    async def execute(self) -> _Result:
+        await self._db.delay()
+        rows = self._db.rows(self._table)
+        if self._op == "insert":
+            payloads = self._payload if isinstance(self._payload, list) else [self._payload]
+            inserted = [self._db.new_row(self._table, payload) for payload in payloads]
+            rows.extend(inserted)
+            return _Result(copy.deepcopy(inserted))
+        matched = [row for row in rows if self._matches(row)]
+        if self._op == "update":
+            for row in matched:
+                row.update(self._payload)
+            return _Result(copy.deepcopy(matched))
+        for column, desc in reversed(self._orders):
+            matched.sort(key=lambda row: str(row.get(column) or ""), reverse=desc)
+        if self._limit is not None:
+            matched = matched[: self._limit]
+        return _Result([self._project(row) for row in matched])
+
+
+class InMemorySupabase:
+    """In-memory stand-in for the async Supabase client."""
+
+    def __init__(self, latency_ms: float = 0.0) -> None:
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self._tables: Dict[str, List[Dict[str, Any]]] = {}
+        self._clock = datetime.now(timezone.utc)
+
+    def rows(self, table: str) -> List[Dict[str, Any]]:
+        return self._tables.setdefault(table, [])
+
+    async def delay(self) -> None:
+        self.calls += 1
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+    def new_row(self, table: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        # Strictly increasing timestamps keep (created_at, id) ordering stable.
+        now = max(datetime.now(timezone.utc), self._clock + timedelta(microseconds=1))
+        self._clock = now
+        row = {"id": str(uuid.uuid4()), "created_at": now.isoformat(), "updated_at": now.isoformat()}
+        if table == "conversations":
+            row["handling_mode"] = "ai"
+        row.update(payload)
+        return row
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
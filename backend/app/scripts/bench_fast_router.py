@@ -0,0 +1,93 @@
+"""
+Benchmark for the deterministic handoff fast path.
+
+Replays a labelled fixture set (one JSON object per line with "message" and
+"label" = "human" | "agent", where the label is the LLM router's decision)
+and reports:
+- the fraction of messages resolved without an LLM call
+- agreement with the labels on the messages the fast path resolved
+- fast-path latency per message
+
+Usage:
+    python -m app.scripts.bench_fast_router
+    python -m app.scripts.bench_fast_router --fixtures path/to/cases.jsonl
+    python -m app.scripts.bench_fast_router --live   # relabel with the live LLM router first
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+# Ensure backend directory is on sys.path so `app` package resolves
+BACKEND_DIR = Path(__file__).resolve().parent.parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from app.agents.fast_router import fast_route  # noqa: E402
+
+DEFAULT_FIXTURES = Path(__file__).resolve().parent / "fixtures" / "handoff_router_cases.jsonl"
+
+
+def load_cases(path: Path) -> list[dict]:
+    with path.open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def relabel_with_llm(cases: list[dict]) -> None:
+    """Replace fixture labels with live LLM router decisions."""
+    from app.core.config import settings
+    from app.core.llm import ROUTER_TASK, get_task_llm
+    from app.routes.utils import should_handoff_to_human
+
+    # Force tier 2 so the labels come from the LLM only.
+    settings.fast_router_enabled = False
+    for case in cases:
+        needs_human, _ = await should_handoff_to_human(get_task_llm(ROUTER_TASK), [], case["message"])
+        case["label"] = "human" if needs_human else "agent"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the handoff fast path")
+    parser.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES)
+    parser.add_argument("--repeat", type=int, default=1000, help="timing iterations per message")
+    parser.add_argument("--live", action="store_true", help="label fixtures with the live LLM router")
+    parser.add_argument("--verbose", action="store_true", help="print every disagreement and fallback")
+    args = parser.parse_args()
+
+    cases = load_cases(args.fixtures)
+    if args.live:
+        asyncio.run(relabel_with_llm(cases))
+
+    resolved = 0
+    agreed = 0
+    for case in cases:
+        decision = fast_route(case["message"])
+        if decision is None:
+            if args.verbose:
+                print(f"  fallback  {case['message']!r}")
+            continue
+        resolved += 1
+        predicted = "human" if decision.needs_human else "agent"
+        if predicted == case["label"]:
+            agreed += 1
+        elif args.verbose:
+            print(f"  mismatch  {case['message']!r} fast={predicted} label={case['label']}")
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for case in cases:
+            fast_route(case["message"])
+    per_message_us = (time.perf_counter() - started) / (args.repeat * len(cases)) * 1e6
+
+    total = len(cases)
+    print(f"messages:            {total}")
+    print(f"resolved without LLM: {resolved}/{total} ({resolved / total:.1%})")
+    if resolved:
+        print(f"agreement with LLM:   {agreed}/{resolved} ({agreed / resolved:.1%})")
+    print(f"fast-path latency:    {per_message_us:.1f} us/message")
+
+
+if __name__ == "__main__":
+    main()
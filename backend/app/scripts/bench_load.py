@@ -0,0 +1,378 @@
+"""
+Offline end-to-end load and latency benchmark for the chat API.
+
+Boots the FastAPI app from app.main in-process (lifespan included) with local
+stand-ins for every external service:
+- chat models: ScriptedChatModel with configurable latency (bench_fakes)
+- MCP: bench_mcp_server, execute_sql/list_tables over in-memory SQLite,
+  reached through the real MCP client and session pool (MCP_CONFIG_PATH)
+- Supabase REST: InMemorySupabase (bench_fakes)
+
+It replays synthetic customer conversations at the given concurrency and
+reports:
+- throughput (customer messages per second) and reply statuses
+- p50/p95/p99 of POST /messages and of every pipeline stage recorded with
+  time_stage (router, summarizer, agent LLM, MCP tools, DB calls)
+- process memory sampled over the run (RSS, plus the Python heap with
+  --tracemalloc) and its growth per 1k messages
+
+Settings can still be overridden through the environment (e.g.
+MAILBOX_DEBOUNCE_SECONDS, RESPONSE_CACHE_ENABLED, CHECKPOINTER_BACKEND).
+
+Usage:
+    python -m app.scripts.bench_load
+    python -m app.scripts.bench_load --conversations 200 --concurrency 50 --turns 4
+    python -m app.scripts.bench_load --llm-latency-ms 400 --mcp-latency-ms 80 --db-latency-ms 15 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from pathlib import Path
+
+# Ensure backend directory is on sys.path so `app` package resolves
+BACKEND_DIR = Path(__file__).resolve().parent.parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from app.scripts.load_test_messages import percentile  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "handoff_router_cases.jsonl"
+
+# Account questions take the execute_sql path of the scripted model; the rest
+# are answered directly (and may hit the response cache).
+SYNTHETIC_MESSAGES = [
+    "What is my current balance?",
+    "Show me my last transactions",
+    "How much did I spend this month?",
+    "Which accounts do I have with you?",
+    "What are your opening hours?",
+    "How do I reset my card PIN?",
+    "Where is the nearest branch?",
+    "What is the interest rate on savings accounts?",
+    "ok thanks",
+    "I have a question about my statement",
+]
+
+
+def load_messages() -> tuple[list[str], list[str]]:
+    """(agent messages, handoff messages) from the router fixtures plus the synthetic set."""
+    agent, human = list(SYNTHETIC_MESSAGES), []
+    if FIXTURES.exists():
+        with FIXTURES.open("r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    case = json.loads(line)
+                    (human if case["label"] == "human" else agent).append(case["message"])
+    return agent, human
+
+
+def configure_environment(args: argparse.Namespace) -> str:
+    """Point the app at the stand-ins. Must run before app modules are imported."""
+    mcp_env = {
+        "PATH": os.environ.get("PATH", ""),
+        "PYTHONPATH": str(BACKEND_DIR),
+        "BENCH_MCP_CUSTOMERS": str(args.customers),
+        "BENCH_MCP_LATENCY_MS": str(args.mcp_latency_ms),
+    }
+    config = {
+        "mcpServers": {
+            "supabase": {
+                "command": sys.executable,
+                "args": ["-m", "app.scripts.bench_mcp_server"],
+                "cwd": str(BACKEND_DIR),
+                "env": mcp_env,
+            }
+        }
+    }
+    fd, config_path = tempfile.mkstemp(prefix="bench-mcp-", suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+
+    forced = {
+        "MCP_CONFIG_PATH": config_path,
+        "LLM_PROVIDER": "bench",
+        "LLM_MODEL": "scripted",
+        "LLM_ROUTER_MODELS": "",
+        "LLM_SUMMARIZER_MODELS": "",
+        "LLM_AGENT_MODELS": "",
+        "BOOT_MODE": "eager",
+        "MESSAGES_ASYNC_MODE": "false",
+        # The stand-in has no realtime channel and no database functions.
+        "CONVERSATION_CACHE_SYNC": "off",
+        "HANDOFF_RPC_ENABLED": "false",
+    }
+    defaults = {
+        "SUPABASE_URL": "http://supabase.bench.invalid",
+        "SUPABASE_SERVICE_ROLE_KEY": "bench",
+        # App logs go to stdout; keep it readable (and --json parseable).
+        "LOG_LEVEL": "ERROR",
+        "CHECKPOINTER_BACKEND": "memory",
+    }
+    os.environ.update(forced)
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+    return config_path
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm", "r", encoding="utf-8") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is the peak, in KiB on Linux and bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize_ms(samples: list[float]) -> dict:
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "total_s": round(sum(samples), 3),
+    }
+
+
+class LoadRun:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.agent_messages, self.human_messages = load_messages()
+        self.request_seconds: list[float] = []
+        self.stage_seconds: dict[str, list[float]] = defaultdict(list)
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.memory: list[dict] = []
+        self.completed = 0
+        self.started = 0.0
+        self.tokens_at_start: dict = {}
+
+    def observe_stage(self, stage: str, outcome: str, seconds: float) -> None:
+        self.stage_seconds[stage].append(seconds)
+
+    def pick_message(self) -> str:
+        if self.human_messages and self.rng.random() < self.args.handoff_rate:
+            return self.rng.choice(self.human_messages)
+        return self.rng.choice(self.agent_messages)
+
+    async def run_conversation(self, client, index: int, record: bool) -> None:
+        customer_id = f"bench-customer-{index % self.args.customers}"
+        res = await client.post("/conversations", json={"customer_id": customer_id, "subject": "bench"})
+        res.raise_for_status()
+        conversation_id = res.json()["id"]
+
+        for _ in range(self.args.turns):
+            body = {
+                "conversation_id": conversation_id,
+                "sender_type": "customer",
+                "sender_customer_id": customer_id,
+                "content": self.pick_message(),
+            }
+            started = time.perf_counter()
+            try:
+                res = await client.post("/messages", json=body)
+                elapsed = time.perf_counter() - started
+                res.raise_for_status()
+                status = res.json()["status"]
+            except Exception as exc:
+                if record:
+                    self.errors[type(exc).__name__] += 1
+                continue
+            if record:
+                self.request_seconds.append(elapsed)
+                self.statuses[status] += 1
+                self.completed += 1
+            if status == "handoff":
+                break  # a human owns the conversation from here on
+            if self.args.think_ms:
+                await asyncio.sleep(self.args.think_ms / 1000)
+
+    def record_memory(self) -> None:
+        sample = {
+            "elapsed_s": round(time.perf_counter() - self.started, 2),
+            "messages": self.completed,
+            "rss_mb": round(rss_mb(), 1),
+        }
+        if tracemalloc.is_tracing():
+            sample["heap_mb"] = round(tracemalloc.get_traced_memory()[0] / (1024 * 1024), 1)
+        self.memory.append(sample)
+
+    async def sample_memory(self) -> None:
+        while True:
+            self.record_memory()
+            await asyncio.sleep(self.args.sample_interval)
+
+    async def drive(self, client) -> float:
+        for index in range(self.args.warmup):
+            await self.run_conversation(client, index, record=False)
+        self.stage_seconds.clear()
+
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def bounded(index: int) -> None:
+            async with semaphore:
+                await self.run_conversation(client, index, record=True)
+
+        self.tokens_at_start = llm_input_tokens()
+        self.started = time.perf_counter()
+        sampler = asyncio.create_task(self.sample_memory())
+        try:
+            await asyncio.gather(*(bounded(i) for i in range(self.args.conversations)))
+        finally:
+            wall = time.perf_counter() - self.started
+            sampler.cancel()
+            await asyncio.gather(sampler, return_exceptions=True)
+            self.record_memory()
+        return wall
+
+    def report(self, wall: float) -> dict:
+        memory = {}
+        if self.memory:
+            first, last = self.memory[0], self.memory[-1]
+            growth = last["rss_mb"] - first["rss_mb"]
+            memory = {
+                "rss_start_mb": first["rss_mb"],
+                "rss_end_mb": last["rss_mb"],
+                "rss_peak_mb": max(s["rss_mb"] for s in self.memory),
+                "rss_growth_mb_per_1k_messages": round(growth / max(1, self.completed) * 1000, 2),
+                "samples": self.memory,
+            }
+            if "heap_mb" in last:
+                memory["heap_end_mb"] = last["heap_mb"]
+        return {
+            "conversations": self.args.conversations,
+            "concurrency": self.args.concurrency,
+            "messages": self.completed,
+            "wall_s": round(wall, 2),
+            "throughput_msg_s": round(self.completed / wall, 2) if wall else 0.0,
+            "statuses": dict(self.statuses),
+            "errors": dict(self.errors),
+            "messages_endpoint": summarize_ms(self.request_seconds),
+            "stages": {
+                stage: summarize_ms(samples)
+                for stage, samples in sorted(
+                    self.stage_seconds.items(), key=lambda item: sum(item[1]), reverse=True
+                )
+            },
+            "llm_input_tokens": llm_input_tokens(self.tokens_at_start),
+            "memory": memory,
+        }
+
+
+def llm_input_tokens(baseline: dict | None = None) -> dict:
+    """Chat model input tokens per task and cache status, minus a baseline."""
+    from app.core.llm import TASKS
+    from app.core.metrics import LLM_INPUT_TOKENS
+
+    baseline = baseline or {}
+    return {
+        task: {
+            status: int(LLM_INPUT_TOKENS.value(task, status) - baseline.get(task, {}).get(status, 0))
+            for status in ("cached", "cache_write", "uncached")
+        }
+        for task in TASKS
+    }
+
+
+def print_report(summary: dict) -> None:
+    print(f"conversations:  {summary['conversations']} (concurrency {summary['concurrency']})")
+    print(f"messages:       {summary['messages']} in {summary['wall_s']:.2f}s")
+    print(f"throughput:     {summary['throughput_msg_s']:.2f} msg/s")
+    print(f"statuses:       {summary['statuses']}")
+    if summary["errors"]:
+        print(f"errors:         {summary['errors']}")
+    print(f"{'stage':<32} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'total s':>9}")
+    rows = [("POST /messages", summary["messages_endpoint"])] + list(summary["stages"].items())
+    for stage, stats in rows:
+        print(
+            f"{stage:<32} {stats['count']:>7} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+            f"{stats['p99_ms']:>9.2f} {stats['total_s']:>9.3f}"
+        )
+    memory = summary["memory"]
+    if memory:
+        print(
+            f"memory:         rss {memory['rss_start_mb']:.1f} -> {memory['rss_end_mb']:.1f} MB "
+            f"(peak {memory['rss_peak_mb']:.1f}, {memory['rss_growth_mb_per_1k_messages']:+.2f} MB / 1k messages)"
+        )
+        if "heap_end_mb" in memory:
+            print(f"python heap:    {memory['heap_end_mb']:.1f} MB at end")
+    for task, tokens in summary["llm_input_tokens"].items():
+        total = sum(tokens.values())
+        if total:
+            print(
+                f"llm input {task + ':':<11} {total} tokens, {tokens['cached'] / total:.0%} cached "
+                f"({tokens['cache_write']} cache writes, {tokens['uncached']} uncached)"
+            )
+
+
+async def run(args: argparse.Namespace) -> dict:
+    import httpx
+
+    from app.core.metrics import add_stage_observer, remove_stage_observer
+    from app.infra.supabase_client import set_async_supabase
+    from app.main import app
+    from app.scripts.bench_fakes import InMemorySupabase, register_bench_provider
+
+    register_bench_provider(args.llm_latency_ms, args.llm_jitter)
+    set_async_supabase(InMemorySupabase(latency_ms=args.db_latency_ms))
+
+    load = LoadRun(args)
+    add_stage_observer(load.observe_stage)
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://bench", timeout=args.timeout
+            ) as client:
+                wall = await load.drive(client)
+    finally:
+        remove_stage_observer(load.observe_stage)
+    return load.report(wall)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline load and latency benchmark for POST /messages")
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10, help="conversations in flight")
+    parser.add_argument("--turns", type=int, default=3, help="customer messages per conversation")
+    parser.add_argument("--customers", type=int, default=200, help="distinct seeded customers")
+    parser.add_argument("--handoff-rate", type=float, default=0.05, help="share of messages asking for a human")
+    parser.add_argument("--think-ms", type=float, default=0, help="pause between messages of a conversation")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="relative +/- jitter on LLM latency")
+    parser.add_argument("--mcp-latency-ms", type=float, default=50)
+    parser.add_argument("--db-latency-ms", type=float, default=10)
+    parser.add_argument("--warmup", type=int, default=2, help="unrecorded conversations before the run")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="memory sampling period (s)")
+    parser.add_argument("--tracemalloc", action="store_true", help="also track the Python heap (slower)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print a JSON summary")
+    args = parser.parse_args()
+
+    config_path = configure_environment(args)
+    if args.tracemalloc:
+        tracemalloc.start()
+    try:
+        summary = asyncio.run(run(args))
+    finally:
+        os.unlink(config_path)
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_report(summary)
+
+
+if __name__ == "__main__":
+    main()
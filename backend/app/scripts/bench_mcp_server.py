@@ -0,0 +1,108 @@
+"""
+Stand-in for the hosted Supabase MCP server, used by bench_load.
+
+Serves `execute_sql` and `list_tables` over stdio from an in-memory SQLite
+database seeded with synthetic customers, accounts and transactions, so the
+real MCP client, session pool and tool wrappers are exercised offline.
+
+Environment:
+    BENCH_MCP_CUSTOMERS   number of seeded customers (default 200); ids are
+                          bench-customer-0 .. bench-customer-<N-1>
+    BENCH_MCP_LATENCY_MS  added latency per tool call (default 0)
+
+Usage (normally started by bench_load through MCP_CONFIG_PATH):
+    python -m app.scripts.bench_mcp_server
+"""
+import asyncio
+import json
+import os
+import random
+import sqlite3
+
+from mcp.server.fastmcp import FastMCP
+
+SCHEMA = {
+    "customers": ["id", "full_name", "email", "created_at"],
+    "accounts": ["id", "customer_id", "account_type", "balance", "currency", "created_at"],
+    "transactions": ["id", "account_id", "amount", "description", "created_at"],
+}
+
+mcp = FastMCP("bench-supabase", log_level="WARNING")
+_db: sqlite3.Connection | None = None
+
+
+def customer_id(index: int) -> str:
+    return f"bench-customer-{index}"
+
+
+def build_database(customers: int, seed: int = 7) -> sqlite3.Connection:
+    rng = random.Random(seed)
+    db = sqlite3.connect(":memory:", check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    for table, columns in SCHEMA.items():
+        db.execute(f"create table {table} ({', '.join(columns)})")
+    db.execute("create index accounts_customer on accounts(customer_id)")
+    db.execute("create index transactions_account on transactions(account_id, created_at)")
+
+    for i in range(customers):
+        cid = customer_id(i)
+        db.execute(
+            "insert into customers values (?, ?, ?, ?)",
+            (cid, f"Customer {i}", f"customer{i}@example.com", "2024-01-01T00:00:00Z"),
+        )
+        for kind in ("current", "savings"):
+            account_id = f"{cid}-{kind}"
+            db.execute(
+                "insert into accounts values (?, ?, ?, ?, ?, ?)",
+                (account_id, cid, kind, round(rng.uniform(10, 50000), 2), "AED", "2024-01-01T00:00:00Z"),
+            )
+            for t in range(20):
+                db.execute(
+                    "insert into transactions values (?, ?, ?, ?, ?)",
+                    (
+                        f"{account_id}-t{t}",
+                        account_id,
+                        round(rng.uniform(-900, 900), 2),
+                        rng.choice(["Grocery", "Salary", "Fuel", "Restaurant", "Transfer", "Online shop"]),
+                        f"2025-{1 + t % 12:02d}-{1 + t:02d}T10:00:00Z",
+                    ),
+                )
+    db.commit()
+    db.execute("pragma query_only = on")
+    return db
+
+
+async def _delay() -> None:
+    latency_ms = float(os.getenv("BENCH_MCP_LATENCY_MS", "0") or 0)
+    if latency_ms > 0:
+        await asyncio.sleep(latency_ms / 1000)
+
+
+@mcp.tool()
+async def execute_sql(query: str) -> str:
+    """Execute a read-only SQL query against the database and return rows as JSON."""
+    await _delay()
+    try:
+        rows = _db.execute(query).fetchall()
+    except sqlite3.Error as exc:
+        return json.dumps({"error": str(exc)})
+    return json.dumps([dict(row) for row in rows])
+
+
+@mcp.tool()
+async def list_tables(schemas: list[str]) -> str:
+    """List tables and their columns in the given schemas."""
+    await _delay()
+    if "public" not in schemas:
+        return "[]"
+    return json.dumps(
+        [
+            {"schema": "public", "name": table, "columns": [{"name": column} for column in columns]}
+            for table, columns in SCHEMA.items()
+        ]
+    )
+
+
+if __name__ == "__main__":
+    _db = build_database(int(os.getenv("BENCH_MCP_CUSTOMERS", "200")))
+    mcp.run()
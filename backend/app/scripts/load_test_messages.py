@@ -0,0 +1,146 @@
+"""
+Load test for the /messages hot path.
+
+Opens one conversation per simulated customer against a running backend and
+sends messages from all of them concurrently. For each concurrency level it
+reports p50/p95/p99 latency so you can confirm the tail stays flat as the
+number of concurrent conversations grows (i.e. no request blocks the loop).
+
+Usage:
+    python -m app.scripts.load_test_messages --customer-id <uuid>
+    python -m app.scripts.load_test_messages --customer-id <uuid> --levels 1,10,50,100 --messages 5
+
+By default messages are sent as the demo human agent, which exercises only
+the database writes. Pass --sender-type customer to include the LLM pipeline.
+"""
+import argparse
+import asyncio
+import math
+import statistics
+import time
+
+import httpx
+
+
+DEFAULT_BASE_URL = "http://localhost:8000"
+DEFAULT_AGENT_ID = "e66fa391-28b5-44ec-b3a9-4397c2f2d225"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an unsorted list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+async def create_conversation(client: httpx.AsyncClient, customer_id: str) -> str:
+    res = await client.post(
+        "/conversations",
+        json={"customer_id": customer_id, "subject": "load test", "channel": "app"},
+    )
+    res.raise_for_status()
+    return res.json()["id"]
+
+
+async def run_conversation(
+    client: httpx.AsyncClient,
+    conversation_id: str,
+    customer_id: str,
+    sender_type: str,
+    messages: int,
+    latencies: list[float],
+    errors: list[str],
+) -> None:
+    for idx in range(messages):
+        body = {
+            "conversation_id": conversation_id,
+            "sender_type": sender_type,
+            "content": f"load test message {idx + 1}",
+        }
+        if sender_type == "customer":
+            body["sender_customer_id"] = customer_id
+        else:
+            body["sender_agent_id"] = DEFAULT_AGENT_ID
+
+        started = time.perf_counter()
+        try:
+            res = await client.post("/messages", json=body)
+            res.raise_for_status()
+        except Exception as exc:
+            errors.append(f"{type(exc).__name__}: {exc}")
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def run_level(args: argparse.Namespace, concurrency: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.base_url, limits=limits, timeout=args.timeout
+    ) as client:
+        conversation_ids = await asyncio.gather(
+            *(create_conversation(client, args.customer_id) for _ in range(concurrency))
+        )
+
+        latencies: list[float] = []
+        errors: list[str] = []
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(
+                run_conversation(
+                    client,
+                    conversation_id,
+                    args.customer_id,
+                    args.sender_type,
+                    args.messages,
+                    latencies,
+                    errors,
+                )
+                for conversation_id in conversation_ids
+            )
+        )
+        elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "mean": statistics.fmean(latencies) if latencies else 0.0,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test POST /messages")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--customer-id", required=True)
+    parser.add_argument("--levels", default="1,5,10,25,50")
+    parser.add_argument("--messages", type=int, default=5, help="messages per conversation")
+    parser.add_argument("--sender-type", choices=["agent", "customer"], default="agent")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",") if level.strip()]
+
+    print(f"{'conc':>6} {'reqs':>6} {'errs':>6} {'req/s':>8} {'p50ms':>9} {'p95ms':>9} {'p99ms':>9}")
+    baseline_p99 = None
+    for concurrency in levels:
+        result = await run_level(args, concurrency)
+        print(
+            f"{result['concurrency']:>6} {result['requests']:>6} {result['errors']:>6} "
+            f"{result['throughput']:>8.1f} {result['p50']:>9.1f} {result['p95']:>9.1f} "
+            f"{result['p99']:>9.1f}"
+        )
+        if baseline_p99 is None:
+            baseline_p99 = result["p99"]
+
+    if baseline_p99:
+        print(f"\np99 at concurrency {levels[-1]} vs {levels[0]}: {result['p99'] / baseline_p99:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,12 @@
+import os
+import sys
+from pathlib import Path
+
+# Settings require Supabase credentials at import time; unit tests never
+# reach the network, so placeholders are enough.
+os.environ.setdefault("SUPABASE_URL", "http://supabase.test.invalid")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
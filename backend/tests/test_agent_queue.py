@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.infra import agent_queue
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    monkeypatch.setattr(settings, "messages_async_mode", True)
+    monkeypatch.setattr(settings, "agent_workers", 2)
+    monkeypatch.setattr(settings, "mailbox_debounce_seconds", 0.05)
+    monkeypatch.setattr(settings, "mailbox_max_wait_seconds", 0.2)
+
+
+def test_jobs_behind_a_run_are_batched_and_idle_jobs_start_at_once(queue):
+    batches = []
+
+    async def handler(batch):
+        batches.append((asyncio.get_running_loop().time(), list(batch)))
+        await asyncio.sleep(0.03)
+
+    async def scenario():
+        agent_queue.start_agent_workers(handler)
+        started = asyncio.get_running_loop().time()
+        assert agent_queue.submit("c1", "one")
+        await asyncio.sleep(0.01)
+        assert agent_queue.submit("c1", "two")
+        assert agent_queue.submit("c1", "three")
+        await agent_queue.stop_agent_workers(drain_timeout=2)
+        return started
+
+    started = asyncio.run(scenario())
+    assert [batch for _, batch in batches] == [["one"], ["two", "three"]]
+    assert batches[0][0] - started < 0.04
+    assert batches[1][0] - started >= 0.055
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+
+from app.infra import checkpointer
+
+AsyncSqliteSaver = pytest.importorskip("langgraph.checkpoint.sqlite.aio").AsyncSqliteSaver
+
+
+async def _put(saver, thread_id, checkpoints=2):
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    for _ in range(checkpoints):
+        config = await saver.aput(config, empty_checkpoint(), {}, {})
+
+
+async def _threads(saver):
+    return {item.config["configurable"]["thread_id"] async for item in saver.alist(None)}
+
+
+def test_sqlite_latest_checkpoints_has_one_time_per_thread(tmp_path):
+    async def run():
+        async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "cp.sqlite")) as saver:
+            await saver.setup()
+            for thread_id in ("a", "b", "c"):
+                await _put(saver, thread_id)
+            return await checkpointer._sqlite_latest_checkpoints(saver)
+
+    latest = asyncio.run(run())
+    assert list(latest) == ["a", "b", "c"]
+    assert latest["a"] <= latest["b"] <= latest["c"]
+    assert abs(latest["c"] - time.time()) < 60
+
+
+def test_prune_drops_the_oldest_threads_beyond_the_limit(tmp_path):
+    async def run():
+        async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "cp.sqlite")) as saver:
+            await saver.setup()
+            for thread_id in ("a", "b", "c"):
+                await _put(saver, thread_id)
+            deleted = await checkpointer.prune_checkpoints(
+                saver, 3600, 2, checkpointer._sqlite_latest_checkpoints
+            )
+            return deleted, await _threads(saver)
+
+    assert asyncio.run(run()) == (1, {"b", "c"})
+
+
+def test_prune_drops_idle_threads(tmp_path, monkeypatch):
+    async def run():
+        async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "cp.sqlite")) as saver:
+            await saver.setup()
+            await _put(saver, "a")
+            # Two minutes later (checkpoint ids take their time from time_ns).
+            now = checkpointer.time.time_ns()
+            monkeypatch.setattr(checkpointer.time, "time_ns", lambda: now + 120 * 10**9)
+            monkeypatch.setattr(checkpointer.time, "time", lambda: now / 10**9 + 120)
+            await _put(saver, "b")
+            deleted = await checkpointer.prune_checkpoints(
+                saver, 60, 0, checkpointer._sqlite_latest_checkpoints
+            )
+            return deleted, await _threads(saver)
+
+    assert asyncio.run(run()) == (1, {"b"})
@@ -0,0 +1,59 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.core import llm
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Loaded by the agent runtime on first use, never by importing the app.
+DEFERRED_MODULES = (
+    "langchain_groq",
+    "langchain_anthropic",
+    "langgraph",
+    "langchain_mcp_adapters",
+    "uvicorn",
+    "app.infra.mcp_supabase",
+    "app.agents.banking_agent.graphbuilder",
+)
+
+
+def test_importing_the_app_defers_heavy_packages():
+    code = (
+        "import json, sys, app.main; "
+        f"print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "BOOT_MODE": "lazy"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert json.loads(out.stdout.strip().splitlines()[-1]) == []
+
+
+def test_model_chain_spec(monkeypatch):
+    monkeypatch.setattr(llm.settings, "llm_provider", "groq")
+    assert llm.parse_model_chain(" groq:model-a, anthropic:model-b ,") == [
+        ("groq", "model-a"),
+        ("anthropic", "model-b"),
+    ]
+    assert llm.parse_model_chain("model-c") == [("groq", "model-c")]
+    assert llm.parse_model_chain("anthropic:") == [("anthropic", llm.DEFAULT_MODELS["anthropic"])]
+    with pytest.raises(ValueError):
+        llm.parse_model_chain("nope:model")
+
+
+def test_build_llm_only_calls_the_chosen_provider(monkeypatch):
+    built = []
+    monkeypatch.setitem(llm.PROVIDERS, "fake", lambda model, timeout, retries: built.append(model) or model)
+    assert llm.build_llm("FAKE", "m1", 5, 0) == "m1"
+    assert built == ["m1"]
+    with pytest.raises(ValueError):
+        llm.build_llm("missing")
@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+from app.infra.supabase_client import set_async_supabase
+from app.routes import utils
+from app.scripts.bench_fakes import InMemorySupabase
+
+
+@pytest.fixture
+def db():
+    client = InMemorySupabase()
+    set_async_supabase(client)
+    utils._conversation_cache.clear()
+    yield client
+    utils._conversation_cache.clear()
+    set_async_supabase(None)
+
+
+def test_routing_sees_handling_mode_changed_behind_the_cache(db):
+    async def run():
+        conversation = db.new_row("conversations", {"customer_id": "c1"})
+        db.rows("conversations").append(conversation)
+        first = await utils.get_conversation_recent(conversation["id"], 10)
+        # Escalated by the call-center UI, bypassing the backend.
+        conversation["handling_mode"] = "human"
+        cached = await utils.get_conversation_recent(conversation["id"], 10)
+        fresh = await utils.get_conversation_recent(conversation["id"], 10, fresh_handling_mode=True)
+        return first, cached, fresh
+
+    first, cached, fresh = asyncio.run(run())
+    assert first["handling_mode"] == "ai"
+    assert cached["handling_mode"] == "ai"  # served from the cache
+    assert fresh["handling_mode"] == "human"
@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from app.core.config import Settings, settings
+from app.infra import conversation_writer
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    monkeypatch.setattr(settings, "conversation_write_behind", True)
+    monkeypatch.setattr(settings, "conversation_writer_flush_interval_seconds", 60)
+    written = []
+
+    async def write(conversation_id, fields):
+        written.append((conversation_id, dict(fields)))
+
+    yield write, written
+    conversation_writer._pending.clear()
+    conversation_writer._write = None
+    conversation_writer._flush_task = None
+
+
+def test_write_behind_defaults_off_on_vercel(monkeypatch):
+    monkeypatch.delenv("CONVERSATION_WRITE_BEHIND", raising=False)
+    monkeypatch.setenv("VERCEL", "1")
+    assert Settings().conversation_write_behind is False
+    monkeypatch.delenv("VERCEL")
+    assert Settings().conversation_write_behind is True
+
+
+def test_enqueue_coalesces_while_the_loop_runs(writes):
+    write, written = writes
+
+    async def run():
+        conversation_writer.start_conversation_writer(write)
+        assert conversation_writer.enqueue("c1", {"last_message": "a"})
+        assert conversation_writer.enqueue("c1", {"last_message": "b"})
+        await conversation_writer.stop_conversation_writer()
+
+    asyncio.run(run())
+    assert written == [("c1", {"last_message": "b"})]
+
+
+def test_enqueue_refuses_once_the_flush_loop_is_gone(writes):
+    write, written = writes
+
+    async def start():
+        conversation_writer.start_conversation_writer(write)
+        assert conversation_writer.enqueue("c1", {"last_message": "queued"})
+
+    # The loop that ran the flush task is closed (e.g. a serverless invocation).
+    asyncio.run(start())
+
+    async def later():
+        return conversation_writer.enqueue("c1", {"last_message": "direct"})
+
+    assert asyncio.run(later()) is False
+    assert conversation_writer.pending_count() == 0
+    assert written == []
+
+
+@pytest.fixture
+def turn(monkeypatch):
+    """process_customer_message on the in-memory client, recording conversation writes."""
+    from types import SimpleNamespace
+
+    from app.infra.supabase_client import set_async_supabase
+    from app.routes import chat, utils
+    from app.scripts.bench_fakes import InMemorySupabase
+
+    db = InMemorySupabase()
+    conversation = db.new_row("conversations", {"customer_id": "c1"})
+    db.rows("conversations").append(conversation)
+    set_async_supabase(db)
+    utils._conversation_cache.clear()
+    writes = []
+    update_conversation = utils.update_conversation
+
+    async def record(conversation_id, fields):
+        writes.append(dict(fields))
+        await update_conversation(conversation_id, fields)
+
+    async def invoke_agent(*args, **kwargs):
+        return "Your card is active."
+
+    async def route(llm, history, text):
+        return False, "agent"
+
+    monkeypatch.setattr(utils, "update_conversation", record)
+    monkeypatch.setattr(chat, "invoke_banking_agent", invoke_agent)
+    monkeypatch.setattr(chat, "should_handoff_to_human", route)
+    monkeypatch.setattr(chat, "cached_agent_reply", lambda text: None)
+    app = SimpleNamespace(state=SimpleNamespace(banking_agent_graph=None, router_llm=None))
+    body = chat.SendMessageRequest(
+        conversation_id=conversation["id"], sender_type="customer", sender_customer_id="c1", content="is my card ok"
+    )
+    yield chat, app, body, conversation, writes
+    utils._conversation_cache.clear()
+    set_async_supabase(None)
+
+
+def test_ai_turn_writes_the_conversation_once(turn):
+    chat, app, body, conversation, writes = turn
+
+    async def run():
+        inserted = await chat.persist_customer_message(body, touch=False)
+        return await chat.process_customer_message(app, body, inserted, touch_pending=True)
+
+    assert asyncio.run(run())["status"] == "ai"
+    assert len(writes) == 1
+    assert writes[0]["last_message"] == "Your card is active."
+    assert writes[0]["last_message_time"] == writes[0]["updated_at"]
+    assert conversation["last_message"] == "Your card is active."
+
+
+def test_turn_without_reply_still_records_the_customer_message(turn):
+    chat, app, body, conversation, writes = turn
+    conversation["handling_mode"] = "human"
+
+    async def run():
+        inserted = await chat.persist_customer_message(body, touch=False)
+        return await chat.process_customer_message(app, body, inserted, touch_pending=True)
+
+    assert asyncio.run(run())["status"] == "handoff"
+    assert [w["last_message"] for w in writes] == ["is my card ok"]
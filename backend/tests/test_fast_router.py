@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from app.agents.fast_router import fast_route
+from app.scripts.bench_fast_router import DEFAULT_FIXTURES
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "I want to talk to a human",
+        "Can I speak with a real person please?",
+        "Connect me to an agent now",
+        "Please transfer me to a representative",
+        "I need to speak to your manager",
+        "I'm fed up with this bank",
+    ],
+)
+def test_explicit_human_requests_hand_off(message):
+    decision = fast_route(message)
+    assert decision is not None and decision.needs_human
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "What is my balance?",
+        "Show me my last transactions",
+        "hello",
+        "thanks!",
+    ],
+)
+def test_plain_banking_questions_stay_with_agent(message):
+    decision = fast_route(message)
+    assert decision is not None and not decision.needs_human
+
+
+# Ordinary banking questions that once matched a human rule.
+@pytest.mark.parametrize(
+    "message",
+    [
+        "How do I transfer money to someone else?",
+        "What is the fee to transfer 100 dollars to a person abroad?",
+        "I never made it to the branch, what are the opening hours?",
+        "How can I set up a chargeback?",
+        "Is my account safe from fraud?",
+    ],
+)
+def test_banking_questions_are_never_handed_off(message):
+    decision = fast_route(message)
+    assert decision is None or not decision.needs_human
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "Is my account safe from fraud?",
+        "There is a fraudulent charge on my card",
+        "I don't need an agent, just tell me my balance",
+    ],
+)
+def test_mixed_or_negated_messages_defer_to_llm(message):
+    assert fast_route(message) is None
+
+
+def test_empty_message_defers_to_llm():
+    assert fast_route("   ") is None
+
+
+def test_fast_path_agrees_with_fixture_labels():
+    with DEFAULT_FIXTURES.open(encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+    for case in cases:
+        decision = fast_route(case["message"])
+        if decision is not None:
+            assert ("human" if decision.needs_human else "agent") == case["label"], case["message"]
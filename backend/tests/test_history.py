@@ -0,0 +1,117 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from app.agents.banking_agent.nodes import BankingNode, current_turn_messages
+from app.agents.history import (
+    estimate_tokens,
+    fold_into_digest,
+    project_messages,
+    split_recent_window,
+)
+
+
+def _row(i, content="hello"):
+    return {
+        "id": f"m{i}",
+        "conversation_id": "c1",
+        "sender_type": "customer" if i % 2 == 0 else "ai",
+        "content": content,
+        "created_at": f"2025-01-01T00:00:{i:02d}Z",
+        "metadata": {"big": "x" * 500},
+    }
+
+
+def _tool_round(i):
+    call_id = f"call_{i}"
+    return [
+        AIMessage(content="", tool_calls=[{"name": "execute_sql", "args": {"query": "select 1"}, "id": call_id}]),
+        ToolMessage(content="[" + "{}," * 200 + "{}]", tool_call_id=call_id, name="execute_sql"),
+    ]
+
+
+def test_project_messages_keeps_prompt_fields_only():
+    projected = project_messages([_row(1)])
+    assert projected == [{"sender_type": "ai", "content": "hello", "created_at": "2025-01-01T00:00:01Z"}]
+
+
+def test_recent_window_respects_item_limit():
+    older, recent = split_recent_window(project_messages([_row(i) for i in range(10)]), 0, 3)
+    assert [m["created_at"][-3:-1] for m in recent] == ["07", "08", "09"]
+    assert len(older) == 7
+
+
+def test_recent_window_respects_token_budget_but_keeps_newest():
+    rows = project_messages([_row(i, "x" * 400) for i in range(5)])
+    older, recent = split_recent_window(rows, 150, 0)
+    assert len(recent) == 1 and recent[0] is rows[-1]
+    assert older == rows[:-1]
+
+
+def test_digest_lines_are_truncated_and_bounded():
+    rows = project_messages([_row(i, "word " * 100) for i in range(50)])
+    digest = fold_into_digest("", rows, 200)
+    lines = digest.splitlines()
+    assert lines and all(len(line) < 200 for line in lines)
+    assert estimate_tokens(digest) <= 200
+    # Newest lines win.
+    assert lines[-1].startswith("[2025-01-01T00:00:49Z] ai:")
+
+
+def test_digest_appends_to_existing():
+    digest = fold_into_digest("[t0] customer: first", project_messages([_row(2)]), 1000)
+    assert digest.splitlines() == ["[t0] customer: first", "[2025-01-01T00:00:02Z] customer: hello"]
+
+
+def test_agent_prompt_gets_only_current_turn_tool_loop():
+    previous_turns = [*_tool_round(1), AIMessage(content="Your balance is 10"), *_tool_round(2), AIMessage(content="Done")]
+    current = _tool_round(3)
+    messages = previous_turns + current
+
+    assert current_turn_messages(messages, 0) == []
+    assert current_turn_messages(messages, 1) == current
+    # A larger counter never reaches past the previous turn's final answer.
+    assert current_turn_messages(messages, 5) == current
+
+
+def test_current_turn_never_starts_on_orphan_tool_results():
+    messages = [*_tool_round(1), *_tool_round(2)]
+    assert current_turn_messages(messages, 1) == messages[2:]
+    assert current_turn_messages(messages, 2) == messages
+
+
+class _RecordingLLM:
+    def __init__(self):
+        self.prompts = []
+
+    def bind_tools(self, tools):
+        return self
+
+    async def ainvoke(self, messages):
+        self.prompts.append(messages)
+        return AIMessage(content="ok")
+
+
+def test_agent_prompt_asks_before_the_tool_loop_and_extends_the_previous_step():
+    llm = _RecordingLLM()
+    node = BankingNode(llm, [])
+    state = {
+        "user_query": "what is my balance",
+        "customer_id": "c1",
+        "summarized_conversation_history": [],
+        "history_digest": "",
+        "messages": [],
+        "tool_iterations": 0,
+        "turn_tokens": 0,
+        "turn_started_at": 0.0,
+    }
+    config = {"configurable": {}}
+    asyncio.run(node.answer_user_query(state, config))
+    state.update(messages=_tool_round(1), tool_iterations=1)
+    asyncio.run(node.answer_user_query(state, config))
+
+    first, second = llm.prompts
+    assert [m.type for m in second] == ["system", "human", "ai", "tool"]
+    assert "User query: what is my balance" in second[1].content
+    # Each step's prompt starts with the whole previous prompt.
+    assert [m.content for m in second[: len(first)]] == [m.content for m in first]
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from app.agents import mailbox
+from app.core.config import settings
+
+
+@pytest.fixture
+def timing(monkeypatch):
+    monkeypatch.setattr(settings, "mailbox_debounce_seconds", 0.05)
+    monkeypatch.setattr(settings, "mailbox_max_wait_seconds", 0.2)
+
+
+def test_debounce_delay_waits_for_quiet_but_caps_at_max_wait(timing):
+    assert mailbox.debounce_delay(10.0, 10.0, now=10.0) == pytest.approx(0.05)
+    assert mailbox.debounce_delay(10.0, 10.03, now=10.04) == pytest.approx(0.04)
+    # Still growing, but the burst started max_wait ago.
+    assert mailbox.debounce_delay(10.0, 10.19, now=10.19) == pytest.approx(0.01)
+    assert mailbox.debounce_delay(10.0, 10.0, now=11.0) == 0.0
+
+
+def test_debounce_delay_without_max_wait(monkeypatch, timing):
+    monkeypatch.setattr(settings, "mailbox_max_wait_seconds", 0)
+    assert mailbox.debounce_delay(10.0, 10.5, now=10.5) == pytest.approx(0.05)
+
+
+def test_idle_conversation_runs_without_waiting(timing):
+    async def run(batch):
+        return batch
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await mailbox.submit("c1", "hi", run)
+        return result, loop.time() - started
+
+    result, elapsed = asyncio.run(scenario())
+    assert result == ["hi"]
+    assert elapsed < 0.04  # well below the 0.05 s debounce
+
+
+def test_burst_behind_a_run_is_answered_by_one_run(timing):
+    batches = []
+
+    async def run(batch):
+        batches.append(list(batch))
+        await asyncio.sleep(0.05)
+        return f"reply to {len(batch)}"
+
+    async def burst():
+        results = []
+        for text in ("hi", "my card", "is blocked"):
+            results.append(asyncio.create_task(mailbox.submit("c1", text, run)))
+            await asyncio.sleep(0.01)
+        return await asyncio.gather(*results)
+
+    results = asyncio.run(burst())
+    assert batches == [["hi"], ["my card", "is blocked"]]
+    assert results == ["reply to 1", mailbox.COALESCED, "reply to 2"]
+    assert mailbox.get_mailbox_metrics() == {"conversations": 0, "pending": 0}
+
+
+def test_batch_behind_a_run_waits_for_quiet(timing):
+    starts = []
+
+    async def run(batch):
+        starts.append((asyncio.get_running_loop().time(), list(batch)))
+        await asyncio.sleep(0.02)
+        return len(starts)
+
+    async def scenario():
+        first = asyncio.create_task(mailbox.submit("c1", "one", run))
+        await asyncio.sleep(0.01)  # the first batch is running now
+        second = asyncio.create_task(mailbox.submit("c1", "two", run))
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(scenario()) == [1, 2]
+    (first_start, first), (second_start, second) = starts
+    assert (first, second) == (["one"], ["two"])
+    # "two" arrived ~0.01 s after the first start and waited out the debounce.
+    assert second_start - first_start >= 0.055
+
+
+def test_run_error_reaches_the_newest_submitter(timing):
+    async def run(batch):
+        raise RuntimeError("agent down")
+
+    async def scenario():
+        return await mailbox.submit("c1", "hi", run)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scenario())
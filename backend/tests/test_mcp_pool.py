@@ -0,0 +1,81 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.infra import mcp_supabase
+from app.infra.mcp_supabase import MCPSessionPool
+
+
+class FakeSession:
+    def __init__(self, ping_delay: float = 0.0) -> None:
+        self.ping_delay = ping_delay
+        self.closed = False
+
+    async def send_ping(self) -> None:
+        await asyncio.sleep(self.ping_delay)
+
+
+class FakeClient:
+    def __init__(self, fail_on: int = -1, ping_delay: float = 0.0) -> None:
+        self.fail_on = fail_on
+        self.ping_delay = ping_delay
+        self.opened = 0
+        self.sessions = []
+
+    @asynccontextmanager
+    async def session(self, server_name):
+        index = self.opened
+        self.opened += 1
+        if index == self.fail_on:
+            raise ConnectionError("server unavailable")
+        session = FakeSession(self.ping_delay)
+        self.sessions.append(session)
+        try:
+            yield session
+        finally:
+            session.closed = True
+
+
+@pytest.fixture(autouse=True)
+def no_tools(monkeypatch):
+    async def load_mcp_tools(session):
+        return []
+
+    monkeypatch.setattr(mcp_supabase, "load_mcp_tools", load_mcp_tools)
+
+
+def _pool(client, size=3, ping_interval=0.0):
+    return MCPSessionPool(
+        client, "supabase", size=size, checkout_timeout=1.0, ping_interval=ping_interval, max_backoff=1.0
+    )
+
+
+def test_start_closes_opened_sessions_when_one_fails():
+    async def run():
+        client = FakeClient(fail_on=1)
+        pool = _pool(client)
+        with pytest.raises(ConnectionError):
+            await pool.start()
+        await asyncio.sleep(0.05)
+        return [session.closed for session in client.sessions]
+
+    closed = asyncio.run(run())
+    assert closed and all(closed)
+
+
+def test_health_check_keeps_other_sessions_available():
+    async def run():
+        client = FakeClient(ping_delay=0.5)
+        pool = _pool(client, ping_interval=0.01)
+        await pool.start()
+        try:
+            await asyncio.sleep(0.05)  # a slow ping is now in flight
+            started = asyncio.get_running_loop().time()
+            async with pool.checkout():
+                waited = asyncio.get_running_loop().time() - started
+        finally:
+            await pool.close()
+        return waited
+
+    assert asyncio.run(run()) < 0.1
@@ -0,0 +1,102 @@
+import asyncio
+import base64
+
+import pytest
+from fastapi import HTTPException
+
+from app.infra.supabase_client import set_async_supabase
+from app.routes import chat
+from app.routes.utils import (
+    decode_message_cursor,
+    encode_message_cursor,
+    list_messages_page,
+    parse_message_fields,
+)
+from app.scripts.bench_fakes import InMemorySupabase
+
+MESSAGE_ID = "0b6f1c3e-4a4b-4c57-9a53-2d1f0f3e8a10"
+
+
+def _raw_cursor(text):
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def test_cursor_round_trip():
+    cursor = encode_message_cursor({"created_at": "2024-05-01T10:00:00.123456+00:00", "id": MESSAGE_ID})
+    assert decode_message_cursor(cursor) == ("2024-05-01T10:00:00.123456+00:00", MESSAGE_ID)
+
+
+def test_cursor_timestamp_is_normalized():
+    created_at, _ = decode_message_cursor(_raw_cursor(f"2024-05-01T10:00:00Z|{MESSAGE_ID}"))
+    assert created_at == "2024-05-01T10:00:00+00:00"
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        _raw_cursor("no separator"),
+        _raw_cursor(f"|{MESSAGE_ID}"),
+        _raw_cursor("2024-05-01T10:00:00+00:00|"),
+        _raw_cursor(f'2024-05-01",id.gt.0|{MESSAGE_ID}'),
+        _raw_cursor("2024-05-01T10:00:00+00:00|1),or(id.gt.0"),
+    ],
+)
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_message_cursor(cursor)
+    assert excinfo.value.status_code == 400
+
+
+def test_message_fields_always_include_cursor_columns():
+    assert parse_message_fields("content, sender_type") == "content,sender_type,created_at,id"
+    with pytest.raises(HTTPException):
+        parse_message_fields("content,id.gt.0")
+
+
+def test_pages_walk_the_conversation_both_ways():
+    client = InMemorySupabase()
+    messages = [client.new_row("messages", {"conversation_id": "c1", "content": str(n)}) for n in range(5)]
+    client.rows("messages").extend(messages)
+    set_async_supabase(client)
+
+    async def run():
+        newest = await list_messages_page("c1", limit=2)
+        older = await list_messages_page("c1", limit=2, before=newest["next_before"])
+        oldest = await list_messages_page("c1", limit=2, before=older["next_before"])
+        newer = await list_messages_page("c1", limit=2, after=oldest["next_after"])
+        return newest, older, oldest, newer
+
+    try:
+        newest, older, oldest, newer = asyncio.run(run())
+    finally:
+        set_async_supabase(None)
+
+    def contents(page):
+        return [message["content"] for message in page["messages"]]
+
+    assert contents(newest) == ["3", "4"] and newest["has_more"]
+    assert contents(older) == ["1", "2"] and older["has_more"]
+    assert contents(oldest) == ["0"] and not oldest["has_more"]
+    assert contents(newer) == ["1", "2"] and newer["has_more"]
+
+
+def test_listing_without_paging_params_keeps_the_bare_list():
+    client = InMemorySupabase()
+    messages = [client.new_row("messages", {"conversation_id": "c1", "content": str(n)}) for n in range(60)]
+    client.rows("messages").extend(messages)
+    set_async_supabase(client)
+
+    async def run():
+        full = await chat.list_messages("c1", limit=None, before=None, after=None, fields=None)
+        page = await chat.list_messages("c1", limit=10, before=None, after=None, fields=None)
+        return full, page
+
+    try:
+        full, page = asyncio.run(run())
+    finally:
+        set_async_supabase(None)
+
+    assert isinstance(full, list)
+    assert [message["content"] for message in full] == [str(n) for n in range(60)]
+    assert [message["content"] for message in page["messages"]] == [str(n) for n in range(50, 60)]
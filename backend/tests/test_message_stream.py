@@ -0,0 +1,114 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from app.routes import chat
+
+
+class FakeGraph:
+    """Streams a reply token by token, slowly enough to disconnect mid-stream."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    async def astream_events(self, state, config=None, version=None):
+        for token in self.tokens:
+            await asyncio.sleep(0.01)
+            yield {
+                "event": "on_chat_model_stream",
+                "metadata": {"langgraph_node": "answer_user_query"},
+                "data": {"chunk": AIMessageChunk(content=token)},
+            }
+
+    async def aget_state(self, config):
+        return SimpleNamespace(values={"messages": [AIMessage(content="".join(self.tokens))]})
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    calls = {"persisted": [], "handoffs": []}
+    route = {"needs_human": False}
+
+    async def noop(*args, **kwargs):
+        return None
+
+    async def persist_customer_message(body, touch=True):
+        return {"id": "m1"}
+
+    async def load_conversation(body):
+        return {"handling_mode": "ai", "customer_id": "c1", "messages": []}
+
+    async def should_handoff(llm, history, text):
+        return route["needs_human"], "test"
+
+    async def persist_ai_reply(conversation_id, text):
+        calls["persisted"].append(text)
+        return {"id": "ai-1"}
+
+    async def hand_off(conversation_id, handling_mode):
+        calls["handoffs"].append(conversation_id)
+        return {"handling_mode": "human", "ack_message_id": "ack-1"}
+
+    monkeypatch.setattr(chat, "ensure_agent_runtime", noop)
+    monkeypatch.setattr(chat, "persist_customer_message", persist_customer_message)
+    monkeypatch.setattr(chat, "load_conversation_for_routing", load_conversation)
+    monkeypatch.setattr(chat, "should_handoff_to_human", should_handoff)
+    monkeypatch.setattr(chat, "persist_ai_reply", persist_ai_reply)
+    monkeypatch.setattr(chat, "hand_off_to_human", hand_off)
+    monkeypatch.setattr(chat, "cached_agent_reply", lambda text: None)
+    monkeypatch.setattr(chat, "store_response", lambda *args: False)
+
+    state = SimpleNamespace(banking_agent_graph=FakeGraph(["Hel", "lo", "!"]), router_llm=None)
+    request = SimpleNamespace(app=SimpleNamespace(state=state))
+    body = chat.SendMessageRequest(
+        conversation_id="conv-1", sender_type="customer", sender_customer_id="c1", content="hi"
+    )
+    return request, body, calls, route
+
+
+async def _frames(response):
+    return [frame async for frame in response.body_iterator]
+
+
+def test_reply_is_persisted_when_the_client_disconnects(stream):
+    request, body, calls, _ = stream
+
+    async def run():
+        response = await chat.send_message_stream(body, request)
+        frames = response.body_iterator
+        assert (await frames.__anext__()).startswith("event: message")
+        assert (await frames.__anext__()).startswith("event: token")
+        await frames.aclose()  # client went away
+        await asyncio.gather(*chat._stream_turns)
+
+    asyncio.run(run())
+    assert calls["persisted"] == ["Hello!"]
+
+
+def test_handoff_happens_before_the_stream_starts(stream):
+    request, body, calls, route = stream
+    route["needs_human"] = True
+
+    async def run():
+        response = await chat.send_message_stream(body, request)
+        # Not read at all: the handoff must already be done.
+        assert calls["handoffs"] == ["conv-1"]
+        return await _frames(response)
+
+    frames = asyncio.run(run())
+    assert frames[-1] == chat.format_sse("done", chat.handoff_response("m1", {"ack_message_id": "ack-1"}))
+
+
+def test_stream_and_post_return_the_same_handoff_payload(stream):
+    request, body, _, route = stream
+    route["needs_human"] = True
+    result = asyncio.run(chat.process_customer_message(request.app, body, {"id": "m1"}))
+    assert result == {
+        "status": "handoff",
+        "customer_message_id": "m1",
+        "ai_reply": chat.HANDOFF_ACK_MESSAGE,
+        "ai_message_id": "ack-1",
+    }
+    assert result == chat.handoff_response("m1", {"ack_message_id": "ack-1"})
@@ -0,0 +1,44 @@
+import pytest
+
+from app.agents import response_cache
+from app.core.config import settings
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch):
+    monkeypatch.setattr(settings, "response_cache_enabled", True)
+    response_cache.invalidate_response_cache()
+    yield
+    response_cache.invalidate_response_cache()
+
+
+def test_personal_question_is_not_shared_between_customers():
+    # Customer A's name came from the conversation summary, no tool call.
+    stored = response_cache.store_response("What is my name?", "Your name is Alice.", (), "cust-a")
+    assert stored is False
+    assert response_cache.lookup_response("What is my name?") is None
+    assert response_cache.lookup_response("whats my name") is None
+
+
+@pytest.mark.parametrize(
+    "question",
+    ["What's my account type?", "Can I open a second account?", "Tell me my limits", "Is this card mine?"],
+)
+def test_first_person_questions_are_not_cacheable(question):
+    assert not response_cache.is_cacheable_question(question)
+
+
+def test_generic_question_is_shared_and_matches_rephrasings():
+    assert response_cache.store_response("What are your opening hours?", "9 to 5.", (), "cust-a")
+    assert response_cache.lookup_response("what are the opening hours") == "9 to 5."
+    assert response_cache.lookup_response("Hello, what are your opening hours please?") == "9 to 5."
+
+
+def test_answers_from_customer_scoped_tools_are_not_stored():
+    assert not response_cache.store_response(
+        "What are the savings account rates?", "2% for you.", {"execute_sql"}, "cust-a"
+    )
+    assert not response_cache.store_response(
+        "What are the savings account rates?", "Rates for cust-a: 2%.", (), "cust-a"
+    )
+    assert response_cache.lookup_response("What are the savings account rates?") is None
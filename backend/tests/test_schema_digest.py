@@ -0,0 +1,84 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from langchain_core.tools import StructuredTool
+
+from app.core.config import settings
+from app.infra import mcp_supabase
+from app.routes.admin import router as admin_router
+
+
+@pytest.fixture
+def schema(monkeypatch):
+    """A list_tables tool whose result the test can change, installed as the MCP tools."""
+    tables = {"columns": ["id"], "calls": 0}
+
+    async def list_tables(schemas=None):
+        tables["calls"] += 1
+        return json.dumps([{"schema": "public", "name": "accounts", "columns": tables["columns"]}])
+
+    tool = StructuredTool.from_function(coroutine=list_tables, name="list_tables", description="List tables")
+    monkeypatch.setattr(mcp_supabase, "_tools", [tool])
+    monkeypatch.setattr(settings, "mcp_schema_cache_ttl_seconds", 60)
+    mcp_supabase.invalidate_schema_cache()
+    yield tables
+    mcp_supabase.invalidate_schema_cache()
+
+
+def test_digest_is_rebuilt_when_the_schema_cache_expires(schema, monkeypatch):
+    async def run():
+        first = await mcp_supabase.get_schema_digest()
+        schema["columns"] = ["id", "balance"]
+        cached = await mcp_supabase.get_schema_digest()
+        # The TTL passes without the agent ever calling list_tables itself.
+        now = mcp_supabase.time.monotonic()
+        monkeypatch.setattr(mcp_supabase.time, "monotonic", lambda: now + 61)
+        refreshed = await mcp_supabase.get_schema_digest()
+        return first, cached, refreshed
+
+    first, cached, refreshed = asyncio.run(run())
+    assert first == cached == "public.accounts(id)"
+    assert refreshed == "public.accounts(id, balance)"
+    assert schema["calls"] == 2
+
+
+def test_failed_refresh_keeps_the_previous_digest(schema, monkeypatch):
+    async def run():
+        first = await mcp_supabase.get_schema_digest()
+        mcp_supabase._schema_cache.clear()  # expired
+
+        async def broken(**kwargs):
+            raise ConnectionError("mcp down")
+
+        monkeypatch.setattr(mcp_supabase, "warm_schema_cache", broken)
+        return first, await mcp_supabase.get_schema_digest(), await mcp_supabase.get_schema_digest()
+
+    first, stale, again = asyncio.run(run())
+    assert first == stale == again == "public.accounts(id)"
+
+
+@pytest.fixture
+def admin():
+    app = FastAPI()
+    app.include_router(admin_router)
+    return TestClient(app)
+
+
+def test_admin_routes_are_hidden_without_a_token(admin, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", None)
+    assert admin.post("/admin/cache/invalidate").status_code == 404
+
+
+def test_admin_invalidates_the_schema_digest(admin, schema, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "secret")
+    asyncio.run(mcp_supabase.get_schema_digest())
+    assert mcp_supabase._schema_digest
+
+    assert admin.post("/admin/cache/invalidate", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    res = admin.post("/admin/cache/invalidate?cache=schema", headers={"Authorization": "Bearer secret"})
+    assert res.status_code == 200
+    assert res.json()["invalidated"] == ["schema"]
+    assert mcp_supabase._schema_digest == ""
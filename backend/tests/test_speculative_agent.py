@@ -0,0 +1,89 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.routes import chat
+
+
+@pytest.fixture
+def turn(monkeypatch):
+    """process_customer_message with a speculative agent that waits on route_gate."""
+    monkeypatch.setattr(settings, "speculative_pipeline", True)
+    runs = []
+
+    async def load_conversation(body):
+        return {"handling_mode": "ai", "customer_id": "c1", "messages": []}
+
+    async def invoke_agent(*args, route_gate=None, **kwargs):
+        run = {"cancelled": False}
+        runs.append(run)
+        try:
+            await route_gate
+            return "reply"
+        except asyncio.CancelledError:
+            run["cancelled"] = True
+            raise
+
+    async def persist_ai_reply(conversation_id, text):
+        return {"id": "ai-1"}
+
+    monkeypatch.setattr(chat, "load_conversation_for_routing", load_conversation)
+    monkeypatch.setattr(chat, "cached_agent_reply", lambda text: None)
+    monkeypatch.setattr(chat, "invoke_banking_agent", invoke_agent)
+    monkeypatch.setattr(chat, "persist_ai_reply", persist_ai_reply)
+    app = SimpleNamespace(state=SimpleNamespace(banking_agent_graph=object(), router_llm=None))
+    body = chat.SendMessageRequest(conversation_id="conv-1", sender_type="customer", content="hi")
+    return app, body, runs
+
+
+def _route_with(monkeypatch, route):
+    monkeypatch.setattr(chat, "should_handoff_to_human", route)
+
+
+def test_cancelled_turn_cancels_the_speculative_agent(monkeypatch, turn):
+    app, body, runs = turn
+    routing = asyncio.Event()
+
+    async def route(llm, history, text):
+        routing.set()
+        await asyncio.sleep(10)
+
+    _route_with(monkeypatch, route)
+
+    async def run():
+        task = asyncio.create_task(chat.process_customer_message(app, body, {"id": "m1"}))
+        await routing.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # Checked before asyncio.run() tears down leftover tasks.
+        return [dict(run) for run in runs]
+
+    assert asyncio.run(run()) == [{"cancelled": True}]
+
+
+def test_router_error_cancels_the_speculative_agent(monkeypatch, turn):
+    app, body, runs = turn
+
+    async def route(llm, history, text):
+        await asyncio.sleep(0)
+        raise RuntimeError("router down")
+
+    _route_with(monkeypatch, route)
+    with pytest.raises(RuntimeError):
+        asyncio.run(chat.process_customer_message(app, body, {"id": "m1"}))
+    assert runs == [{"cancelled": True}]
+
+
+def test_ai_path_keeps_the_speculative_agent(monkeypatch, turn):
+    app, body, runs = turn
+
+    async def route(llm, history, text):
+        return False, "agent"
+
+    _route_with(monkeypatch, route)
+    result = asyncio.run(chat.process_customer_message(app, body, {"id": "m1"}))
+    assert result["ai_reply"] == "reply"
+    assert runs == [{"cancelled": False}]
@@ -0,0 +1,96 @@
+-- Migration: single-call handoff to a human agent
+-- Switches handling_mode, writes the internal handoff summary and the
+-- customer acknowledgement, and bumps last_message/updated_at in one
+-- transaction so the backend needs one round trip and never leaves a
+-- half-applied handoff behind.
+
+CREATE OR REPLACE FUNCTION handoff_to_human(
+  p_conversation_id UUID,
+  p_ai_agent_id UUID,
+  p_ack_message TEXT,
+  p_summary_limit INTEGER DEFAULT 8
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_previous_mode TEXT;
+  v_summary TEXT;
+  v_summary_id UUID;
+  v_ack_id UUID;
+BEGIN
+  -- Lock the conversation so concurrent handoffs serialize
+  SELECT handling_mode
+  INTO v_previous_mode
+  FROM conversations
+  WHERE id = p_conversation_id
+  FOR UPDATE;
+
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'conversation % not found', p_conversation_id
+      USING ERRCODE = 'no_data_found';
+  END IF;
+
+  -- Same format as build_handoff_summary in the backend
+  SELECT
+    'Handoff summary (last messages):' || E'\n' || COALESCE(
+      string_agg(
+        '- ' || COALESCE(recent.sender_type, 'unknown') || ': '
+          || left(replace(btrim(COALESCE(recent.content, '')), E'\n', ' '), 180),
+        E'\n' ORDER BY recent.created_at ASC
+      ),
+      ''
+    )
+  INTO v_summary
+  FROM (
+    SELECT m.sender_type, m.content, m.created_at
+    FROM messages m
+    WHERE m.conversation_id = p_conversation_id
+    ORDER BY m.created_at DESC
+    LIMIT p_summary_limit
+  ) AS recent;
+
+  UPDATE conversations
+  SET
+    handling_mode = 'human',
+    last_message = left(p_ack_message, 200),
+    updated_at = NOW()
+  WHERE id = p_conversation_id;
+
+  INSERT INTO messages (
+    conversation_id,
+    sender_type,
+    sender_customer_id,
+    sender_agent_id,
+    content,
+    is_internal
+  )
+  VALUES (p_conversation_id, 'ai', NULL, p_ai_agent_id, v_summary, TRUE)
+  RETURNING id INTO v_summary_id;
+
+  -- Acknowledgement is inserted last so it is the newest visible message
+  INSERT INTO messages (
+    conversation_id,
+    sender_type,
+    sender_customer_id,
+    sender_agent_id,
+    content,
+    is_internal
+  )
+  VALUES (p_conversation_id, 'ai', NULL, p_ai_agent_id, p_ack_message, FALSE)
+  RETURNING id INTO v_ack_id;
+
+  RETURN jsonb_build_object(
+    'conversation_id', p_conversation_id,
+    'previous_handling_mode', v_previous_mode,
+    'handling_mode', 'human',
+    'summary_message_id', v_summary_id,
+    'ack_message_id', v_ack_id
+  );
+END;
+$$;
+
+-- Only the backend (service role) performs handoffs
+REVOKE ALL ON FUNCTION handoff_to_human(UUID, UUID, TEXT, INTEGER) FROM PUBLIC;
+REVOKE ALL ON FUNCTION handoff_to_human(UUID, UUID, TEXT, INTEGER) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION handoff_to_human(UUID, UUID, TEXT, INTEGER) TO service_role;
@@ -0,0 +1,6 @@
+-- Migration: index for keyset pagination of messages
+-- Serves list_messages_page and the "last N messages" loader, which filter by
+-- conversation_id and order by (created_at, id) in either direction.
+
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created_id
+  ON messages(conversation_id, created_at, id);
@@ -0,0 +1,27 @@
+-- Migration: publish conversations and messages through Supabase realtime
+-- The backend's conversation cache (CONVERSATION_CACHE_SYNC=realtime)
+-- subscribes to changes on both tables. Without them in the
+-- supabase_realtime publication the subscription still reports SUBSCRIBED
+-- but never receives an event, so handling_mode changes made by the
+-- call-center UI would only be seen after the cache TTL.
+
+DO $$
+DECLARE
+  v_table TEXT;
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_publication WHERE pubname = 'supabase_realtime') THEN
+    CREATE PUBLICATION supabase_realtime;
+  END IF;
+
+  FOREACH v_table IN ARRAY ARRAY['conversations', 'messages'] LOOP
+    IF NOT EXISTS (
+      SELECT 1
+      FROM pg_publication_tables
+      WHERE pubname = 'supabase_realtime'
+        AND schemaname = 'public'
+        AND tablename = v_table
+    ) THEN
+      EXECUTE format('ALTER PUBLICATION supabase_realtime ADD TABLE public.%I', v_table);
+    END IF;
+  END LOOP;
+END $$;